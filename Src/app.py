@@ -1,25 +1,53 @@
 import streamlit as st
-from PIL import Image
 import os
-import torch
 import time
-import numpy as np
-import matplotlib.pyplot as plt
-from torchvision import transforms
-from efficientnet_pytorch import EfficientNet
+import importlib.util
 from dotenv import load_dotenv
-from login_page import check_authentication, render_user_profile
 
-# Load environment variables
+# Load environment variables (before the local modules, which read their settings at import)
 load_dotenv()
 
-# Import chatbot
+from auth import DB_PATH
+from history import get_history_store, image_hash, model_version
+from login_page import check_authentication, render_user_profile
+# Heavy modules (torch, torchvision, efficientnet_pytorch, matplotlib, google.generativeai)
+# are imported lazily on the Analyze and Chat pages, never before login
+from model_specs import MODEL_SPECS, checkpoint_path
+from inference import load_cascade, load_embedding_index, load_single, load_tta_predictor, start_warmup
+from profiling import profiled_request, stage
+from ingest import UploadRejected, load_image
+from previews import preview, thumbnail
+from session_memory import CHAT_HISTORY_LIMIT, compress_image, decompress_image, enforce_budget
+from metrics import (FORWARD_SECONDS, PREDICTIONS_TOTAL, PREPROCESS_SECONDS, RENDER_SECONDS,
+                     observe_seconds, start_metrics_server)
+
+# Prometheus endpoint (started once per server process)
+start_metrics_server()
+
+# Chatbot availability (the module itself is imported on first use)
 try:
-    from chatbot import AlzheimerChatbot
-    CHATBOT_AVAILABLE = True
-except ImportError as e:
+    CHATBOT_AVAILABLE = importlib.util.find_spec("google.generativeai") is not None
+except ModuleNotFoundError:
     CHATBOT_AVAILABLE = False
-    print(f"Chatbot not available: {e}")
+if not CHATBOT_AVAILABLE:
+    print("Chatbot not available: google-generativeai is not installed")
+
+# Model selection
+# MODEL_NAME selects a registered checkpoint, e.g. "student" for the distilled CPU model
+MODEL_NAME = os.getenv("MODEL_NAME", "efficientnet")
+MODEL_PATH = checkpoint_path(MODEL_NAME)
+
+# Inference mode: "single" (MODEL_NAME only) or "cascade" (confidence-gated multi-model);
+# CASCADE_THRESHOLD is read by cascade.py, which is only imported when the cascade loads
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "single").lower()
+
+# Test-time augmentation: average several flipped/rotated views within a latency budget
+# (TTA_BUDGET_MS, read by tta.py)
+TTA_ENABLED = os.getenv("TTA_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Number of similar training cases shown next to a result (0 disables retrieval)
+SIMILAR_CASES_K = int(os.getenv("SIMILAR_CASES_K", 5))
+VOLUME_SLICES = int(os.getenv("VOLUME_SLICES", 32))
 
 # Color palette - Dark mode
 COLORS = {
@@ -45,6 +73,7 @@ ICONS = {
     'chart': '''<svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"><line x1="18" y1="20" x2="18" y2="10"/><line x1="12" y1="20" x2="12" y2="4"/><line x1="6" y1="20" x2="6" y2="14"/></svg>''',
     'help': '''<svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"><circle cx="12" cy="12" r="10"/><path d="M9.09 9a3 3 0 0 1 5.83 1c0 2-3 3-3 3"/><line x1="12" y1="17" x2="12.01" y2="17"/></svg>''',
     'home': '''<svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"><path d="m3 9 9-7 9 7v11a2 2 0 0 1-2 2H5a2 2 0 0 1-2-2z"/><polyline points="9 22 9 12 15 12 15 22"/></svg>''',
+    'clock': '''<svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"><circle cx="12" cy="12" r="10"/><polyline points="12 6 12 12 16 14"/></svg>''',
 }
 
 def icon(name, size=20, color=COLORS['accent']):
@@ -64,6 +93,14 @@ st.set_page_config(
 )
 check_authentication()  # ⬅️ CETTE LIGNE PROTÈGE TOUTE L'APPLICATION
 
+# Load the configured model(s) in the background while the user looks at the Home page
+if INFERENCE_MODE == "cascade":
+    start_warmup(load_cascade)
+elif TTA_ENABLED:
+    start_warmup(lambda: load_tta_predictor(MODEL_NAME))
+else:
+    start_warmup(lambda: load_single(MODEL_NAME, MODEL_PATH), lambda: load_embedding_index(MODEL_NAME))
+
 # Enhanced CSS with custom color palette - Force dark mode
 st.markdown(f"""
 <style>
@@ -256,11 +293,6 @@ st.markdown(f"""
 # Initialize session state
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
-if 'chatbot' not in st.session_state and CHATBOT_AVAILABLE:
-    try:
-        st.session_state.chatbot = AlzheimerChatbot()
-    except Exception as e:
-        st.session_state.chatbot = None
 if 'last_prediction' not in st.session_state:
     st.session_state.last_prediction = None
 if 'last_probabilities' not in st.session_state:
@@ -274,6 +306,9 @@ if 'show_chat' not in st.session_state:
 if 'chat_context_message' not in st.session_state:
     st.session_state.chat_context_message = None
 
+# Keep this session under its memory budget (caps chat history, drops recomputable results)
+enforce_budget(st.session_state, chatbot=st.session_state.get('chatbot'))
+
 # Sidebar
 with st.sidebar:
     st.markdown(f"""
@@ -289,39 +324,95 @@ with st.sidebar:
     render_user_profile()
     
     st.markdown("---")
-    page = st.radio("Navigation", ["Home", "Analyze", "Chat", "About"], label_visibility="collapsed")
+    page = st.radio("Navigation", ["Home", "Analyze", "History", "Chat", "About"], label_visibility="collapsed")
     
     st.markdown("---")
     st.markdown(f"""
     <div style="font-size: 0.8rem; color: #9CA3AF; padding: 0 10px;">
         <strong style="color: {COLORS['highlight']};">Model</strong><br/>
-        EfficientNet-B0<br/><br/>
+        {'Cascade ensemble' if INFERENCE_MODE == 'cascade' else MODEL_SPECS[MODEL_NAME]['display_name']}<br/><br/>
         <strong style="color: {COLORS['highlight']};">Classes</strong><br/>
         Non-demented, Very Mild,<br/>Mild, Moderate
     </div>
     """, unsafe_allow_html=True)
 
 
-# Load model
-MODEL_PATH = os.path.join('Src', 'alzheimer_efficientnet_model.pth')
+def get_chatbot():
+    """Create this session's chatbot on first use."""
+    if 'chatbot' not in st.session_state:
+        try:
+            from chatbot import AlzheimerChatbot
+            st.session_state.chatbot = AlzheimerChatbot(max_history=CHAT_HISTORY_LIMIT)
+            if st.session_state.last_prediction:
+                st.session_state.chatbot.set_prediction_context(
+                    st.session_state.last_prediction,
+                    st.session_state.last_probabilities
+                )
+        except Exception as e:
+            print(f"Chatbot not available: {e}")
+            st.session_state.chatbot = None
+    return st.session_state.chatbot
+
+def analyze_volume(uploaded_file, cascade=None, tta_predictor=None, single=None):
+    """Stream a NIfTI / DICOM series upload through the active model, a batch of slices at a time."""
+    import numpy as np
+    from models import build_transform
+    from volumes import model_predictor, open_volume, predict_volume
+
+    if cascade is not None:
+        model_name = 'efficientnet'
+        predict_batch = lambda batch: np.stack([cascade.predict(x.unsqueeze(0))[1] for x in batch])
+    elif tta_predictor is not None:
+        model_name = MODEL_NAME
+        predict_batch = lambda batch: np.stack([tta_predictor.predict(x.unsqueeze(0))[1] for x in batch])
+    else:
+        model_name = MODEL_NAME
+        hooks = [hook.pop_activation for hook in [single.grad_cam] if hook]
+        hooks += [hook.pop for hook in [single.embedding_hook] if hook]
+        predict_batch = model_predictor(single.model, single.lock, hooks)
+
+    with open_volume(uploaded_file, uploaded_file.name) as volume:
+        return predict_volume(volume, predict_batch, build_transform(model_name), VOLUME_SLICES)
 
-def preprocess(image):
-    transform = transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-    ])
+def record_analysis():
+    """Queue the current prediction for the signed-in user's analysis history."""
+    st.session_state.history_total = None  # recounted on the next History page view
+    if INFERENCE_MODE == "cascade":
+        version = "cascade"
+    else:
+        version = model_version(MODEL_NAME, MODEL_PATH) + ("+tta" if TTA_ENABLED else "")
+    get_history_store(DB_PATH).add(
+        st.session_state.user_data['id'],
+        st.session_state.upload_digest,
+        version,
+        st.session_state.last_prediction,
+        st.session_state.last_probabilities
+    )
+
+def preprocess(image, model_name=MODEL_NAME):
+    from models import build_transform
+    transform = build_transform(model_name)
     return transform(image).unsqueeze(0)
 
 def predict(image, model):
+    import torch
     with torch.no_grad():
         output = model(image)
         probabilities = torch.nn.functional.softmax(output, dim=1)[0]
         _, predicted = torch.max(output, 1)
     return predicted.item(), probabilities.numpy()
 
+def recompute_activation(image_bytes, single):
+    """Grad-CAM activation of a stored scan from one more forward pass (after enforce_budget evicted it)."""
+    preprocessed = preprocess(decompress_image(image_bytes), MODEL_NAME)
+    with single.lock:
+        predict(preprocessed, single.model)
+        if single.embedding_hook:
+            single.embedding_hook.pop()
+        return single.grad_cam.pop_activation()
+
 def create_prediction_chart(probabilities, labels):
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots(figsize=(8, 3.5))
     colors = ['#22C55E', COLORS['highlight'], COLORS['accent'], '#DC2626']
     bars = ax.barh(labels, probabilities, color=colors, height=0.5)
@@ -343,34 +434,72 @@ def create_prediction_chart(probabilities, labels):
 
 def render_chat_interface(context_message=None):
     """Render the chat interface."""
+    from explanations import explain, next_steps
+
+    chatbot = get_chatbot() if CHATBOT_AVAILABLE else None
     if not CHATBOT_AVAILABLE:
-        st.warning("Chatbot unavailable. Install: pip install google-generativeai python-dotenv")
-        return
-    
-    if not st.session_state.get('chatbot'):
-        st.error("Chatbot failed to initialize. Check your GEMINI_API_KEY in .env")
-        return
-    
-    chatbot = st.session_state.chatbot
-    
-    # Process context message
-    if context_message:
-        if context_message == "explain" and st.session_state.last_prediction:
-            with st.spinner("Generating explanation..."):
-                response = chatbot.explain_result()
-                st.session_state.chat_history.append({"role": "user", "content": "Please explain my result"})
-                st.session_state.chat_history.append({"role": "assistant", "content": response})
-        elif context_message == "next_steps" and st.session_state.last_prediction:
-            with st.spinner("Generating guidance..."):
-                response = chatbot.get_next_steps()
-                st.session_state.chat_history.append({"role": "user", "content": "What should I do next?"})
-                st.session_state.chat_history.append({"role": "assistant", "content": response})
+        st.info("AI assistant offline (pip install google-generativeai). Result explanations still work.")
+    elif not chatbot:
+        st.info("AI assistant offline (check GEMINI_API_KEY in .env). Result explanations still work.")
+    
+    # Process context message: rendered after the history below
+    pending = None
+    if context_message in ("explain", "next_steps") and st.session_state.last_prediction:
+        if context_message == "explain":
+            question = "Please explain my result"
+            response = explain(st.session_state.last_prediction, st.session_state.last_probabilities)
+            enhance = chatbot.explain_result if chatbot else None
+        else:
+            question = "What should I do next?"
+            response = next_steps(st.session_state.last_prediction)
+            enhance = chatbot.get_next_steps if chatbot else None
+        pending = (question, response, enhance)
     
     # Show context if available
     if st.session_state.last_prediction:
         st.info(f"Context: Last prediction was **{st.session_state.last_prediction}**")
     
     # Quick questions
+    if chatbot:
+        render_quick_questions(chatbot)
+    
+    # Chat messages
+    for msg in st.session_state.chat_history:
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+    
+    # The templated answer shows instantly; Gemini's version (or its fallback) streams into the same bubble
+    if pending:
+        question, response, enhance = pending
+        with st.chat_message("user"):
+            st.markdown(question)
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            placeholder.markdown(response)
+            if enhance:
+                response = enhance(on_chunk=lambda text: placeholder.markdown(text + " ▌"))
+                placeholder.markdown(response)
+        st.session_state.chat_history.append({"role": "user", "content": question})
+        st.session_state.chat_history.append({"role": "assistant", "content": response})
+    
+    # Chat input
+    if chatbot and (user_input := st.chat_input("Ask about Alzheimer's disease...")):
+        st.session_state.chat_history.append({"role": "user", "content": user_input})
+        with st.spinner("Thinking..."):
+            response = chatbot.get_response(user_input)
+            st.session_state.chat_history.append({"role": "assistant", "content": response})
+        st.rerun()
+    
+    # Clear button
+    if st.session_state.chat_history:
+        if st.button("Clear Chat", use_container_width=True):
+            st.session_state.chat_history = []
+            if chatbot:
+                chatbot.clear_history()
+            st.rerun()
+
+def render_quick_questions(chatbot):
+    """FAQ buttons that send a canned question to the chatbot."""
     st.markdown(f"""
     <div class="sub-header">
         {icon('help', 18)}
@@ -396,26 +525,6 @@ def render_chat_interface(context_message=None):
                 st.rerun()
     
     st.markdown("---")
-    
-    # Chat messages
-    for msg in st.session_state.chat_history:
-        with st.chat_message(msg["role"]):
-            st.markdown(msg["content"])
-    
-    # Chat input
-    if user_input := st.chat_input("Ask about Alzheimer's disease..."):
-        st.session_state.chat_history.append({"role": "user", "content": user_input})
-        with st.spinner("Thinking..."):
-            response = chatbot.get_response(user_input)
-            st.session_state.chat_history.append({"role": "assistant", "content": response})
-        st.rerun()
-    
-    # Clear button
-    if st.session_state.chat_history:
-        if st.button("Clear Chat", use_container_width=True):
-            st.session_state.chat_history = []
-            chatbot.clear_history()
-            st.rerun()
 
 # ============ HOME PAGE ============
 if page == "Home":
@@ -489,13 +598,26 @@ elif page == "Analyze":
     
     # Load model
     model_loaded = False
+    cascade = None
+    tta_predictor = None
+    single = None
+    grad_cam = None
+    embedding_index = None
     try:
-        model = EfficientNet.from_pretrained('efficientnet-b0', num_classes=4)
-        model.load_state_dict(torch.load(MODEL_PATH, map_location=torch.device('cpu')))
-        model.eval()
+        if INFERENCE_MODE == "cascade":
+            cascade = load_cascade()
+        elif TTA_ENABLED:
+            tta_predictor = load_tta_predictor(MODEL_NAME)
+        else:
+            single = load_single(MODEL_NAME, MODEL_PATH)
+            grad_cam = single.grad_cam
+            if SIMILAR_CASES_K > 0:
+                embedding_index = load_embedding_index(MODEL_NAME)
         model_loaded = True
     except FileNotFoundError:
         st.error(f"Model not found at {MODEL_PATH}")
+    except ValueError as e:
+        st.error(f"Cascade unavailable: {e}")
     
     col1, col2 = st.columns([1, 1])
     
@@ -507,7 +629,10 @@ elif page == "Analyze":
         </div>
         """, unsafe_allow_html=True)
         
-        uploaded_file = st.file_uploader("Choose MRI image", type=["jpg", "jpeg", "png"], label_visibility="collapsed")
+        uploaded_file = st.file_uploader(
+            "Choose MRI image or volume (NIfTI, zipped DICOM series)",
+            type=["jpg", "jpeg", "png", "nii", "gz", "zip"], label_visibility="collapsed"
+        )
         
         st.markdown(f"""
         <div class="sub-header" style="margin-top: 20px;">
@@ -525,8 +650,11 @@ elif page == "Analyze":
                 samples = [f for f in os.listdir(cat_path) if f.endswith(('.jpg', '.jpeg', '.png'))][:10]
                 if samples:
                     sample = st.selectbox("Image", samples, label_visibility="collapsed")
+                    st.image(thumbnail(os.path.join(cat_path, sample)))
                     if st.button("Use Sample", use_container_width=True):
-                        st.session_state.stored_image = Image.open(os.path.join(cat_path, sample)).convert('RGB')
+                        sample_path = os.path.join(cat_path, sample)
+                        st.session_state.stored_image = compress_image(load_image(sample_path))
+                        st.session_state.upload_digest = image_hash(sample_path)
                         st.session_state.analysis_complete = False
                         st.rerun()
     
@@ -534,13 +662,46 @@ elif page == "Analyze":
     if uploaded_file:
         file_id = f"{uploaded_file.name}_{uploaded_file.size}"
         if st.session_state.get('last_file_id') != file_id:
-            st.session_state.stored_image = Image.open(uploaded_file).convert('RGB')
             st.session_state.last_file_id = file_id
             st.session_state.analysis_complete = False
+            from volumes import VolumeError, is_volume
+            # The history identifies a scan by the file as uploaded, not by the recompressed session copy
+            st.session_state.upload_digest = image_hash(uploaded_file)
+            try:
+                if is_volume(uploaded_file.name) and model_loaded:
+                    with st.spinner("Analyzing volume slices..."):
+                        result = analyze_volume(uploaded_file, cascade, tta_predictor, single)
+                    labels = ["Mild Alzheimer's", "Moderate Alzheimer's", "Non-demented", "Very Mild Alzheimer's"]
+                    label_idx, probs = result['label_idx'], result['probabilities']
+                    # The middle analyzed slice stands in for the volume in the preview and chat context
+                    st.session_state.stored_image = compress_image(result['preview'])
+                    st.session_state.last_prediction = labels[label_idx]
+                    st.session_state.last_probabilities = {labels[i]: float(probs[i]) for i in range(len(labels))}
+                    st.session_state.last_label_idx = label_idx
+                    st.session_state.volume_summary = (len(result['slice_indices']), result['agreement'])
+                    st.session_state.last_activation = None
+                    st.session_state.similar_cases = None
+                    st.session_state.evicted_results = []
+                    st.session_state.answered_by = None
+                    st.session_state.tta_views = None
+                    st.session_state.analysis_complete = True
+                    PREDICTIONS_TOTAL.labels(labels[label_idx]).inc()
+                    record_analysis()
+                    if CHATBOT_AVAILABLE and st.session_state.get('chatbot'):
+                        st.session_state.chatbot.set_prediction_context(
+                            st.session_state.last_prediction,
+                            st.session_state.last_probabilities
+                        )
+                else:
+                    st.session_state.stored_image = compress_image(load_image(uploaded_file))
+            except (UploadRejected, VolumeError) as e:
+                st.session_state.stored_image = None
+                st.error(f"Upload rejected: {e}")
     
     # Display and analyze
     if st.session_state.stored_image is not None and model_loaded:
-        image = st.session_state.stored_image
+        # Stored as compressed PNG bytes; decoded only when preprocessing or drawing the overlay
+        image_bytes = st.session_state.stored_image
         
         with col2:
             st.markdown(f"""
@@ -549,7 +710,8 @@ elif page == "Analyze":
                 Preview
             </div>
             """, unsafe_allow_html=True)
-            st.image(image, use_container_width=True)
+            # Small cached JPEG instead of the stored scan, which would be re-sent on every rerun
+            st.image(preview(image_bytes), use_container_width=True)
         
         labels = ["Mild Alzheimer's", "Moderate Alzheimer's", "Non-demented", "Very Mild Alzheimer's"]
         
@@ -557,15 +719,39 @@ elif page == "Analyze":
             progress = st.progress(0)
             status = st.empty()
             
-            status.text("Preprocessing...")
-            progress.progress(30)
-            preprocessed = preprocess(image)
-            time.sleep(0.15)
-            
-            status.text("Analyzing...")
-            progress.progress(60)
-            label_idx, probs = predict(preprocessed, model)
-            time.sleep(0.15)
+            with profiled_request('analyze'):
+                status.text("Preprocessing...")
+                progress.progress(30)
+                with stage('preprocess'), observe_seconds(PREPROCESS_SECONDS):
+                    preprocessed = preprocess(decompress_image(image_bytes), 'efficientnet' if cascade is not None else MODEL_NAME)
+                time.sleep(0.15)
+                
+                status.text("Analyzing...")
+                progress.progress(60)
+                inference_mode = 'cascade' if cascade is not None else 'tta' if tta_predictor is not None else 'single'
+                activation = embedding = None
+                with stage('predict'), observe_seconds(FORWARD_SECONDS.labels(inference_mode)):
+                    if cascade is not None:
+                        label_idx, probs, answered_by = cascade.predict(preprocessed)
+                        st.session_state.answered_by = answered_by
+                    elif tta_predictor is not None:
+                        label_idx, probs, views = tta_predictor.predict(preprocessed)
+                        st.session_state.tta_views = views
+                    else:
+                        with single.lock:
+                            label_idx, probs = predict(preprocessed, single.model)
+                            # Activations from this same forward pass; the overlay itself is built on request
+                            activation = grad_cam.pop_activation() if grad_cam else None
+                            embedding = single.embedding_hook.pop() if single.embedding_hook else None
+                st.session_state.last_activation = activation
+                st.session_state.saliency_overlay = None
+                st.session_state.evicted_results = []
+                with stage('similar_cases'):
+                    st.session_state.similar_cases = (
+                        embedding_index.search(embedding[0], SIMILAR_CASES_K)
+                        if embedding is not None and embedding_index is not None else None
+                    )
+                time.sleep(0.15)
             
             progress.progress(100)
             status.empty()
@@ -573,7 +759,10 @@ elif page == "Analyze":
             st.session_state.last_prediction = labels[label_idx]
             st.session_state.last_probabilities = {labels[i]: float(probs[i]) for i in range(len(labels))}
             st.session_state.last_label_idx = label_idx
+            st.session_state.volume_summary = None
             st.session_state.analysis_complete = True
+            PREDICTIONS_TOTAL.labels(labels[label_idx]).inc()
+            record_analysis()
             
             if CHATBOT_AVAILABLE and st.session_state.get('chatbot'):
                 st.session_state.chatbot.set_prediction_context(
@@ -597,33 +786,76 @@ elif page == "Analyze":
             
             cached_probs = st.session_state.last_probabilities
             prob_values = [cached_probs[l] for l in labels]
-            fig = create_prediction_chart(prob_values, labels)
-            st.pyplot(fig)
+            with profiled_request('render'), stage('chart'), observe_seconds(RENDER_SECONDS):
+                fig = create_prediction_chart(prob_values, labels)
+                st.pyplot(fig)
+            if cascade is not None and st.session_state.get('answered_by'):
+                st.caption(f"Cascade answered by: {st.session_state.answered_by}")
+            if st.session_state.get('volume_summary'):
+                n_slices, agreement = st.session_state.volume_summary
+                st.caption(f"Volume: averaged over {n_slices} axial slices ({agreement:.0%} of slices agree)")
+            if tta_predictor is not None and st.session_state.get('tta_views'):
+                st.caption(f"Test-time augmentation: averaged over {st.session_state.tta_views} views")
+            
+            # Grad-CAM overlay, rendered lazily and cached with the prediction
+            activation_evicted = 'last_activation' in (st.session_state.get('evicted_results') or [])
+            if grad_cam is not None and (st.session_state.get('last_activation') is not None or activation_evicted):
+                if st.toggle("Show attention map (Grad-CAM)", key="show_saliency"):
+                    if st.session_state.saliency_overlay is None:
+                        from saliency import render_overlay
+                        spec = MODEL_SPECS[MODEL_NAME]
+                        # Evicted activations are recomputed for this render only; keeping them would exceed the budget again
+                        activation = st.session_state.get('last_activation')
+                        if activation is None:
+                            activation = recompute_activation(image_bytes, single)
+                        st.session_state.saliency_overlay = render_overlay(
+                            grad_cam, decompress_image(image_bytes), activation, label_idx,
+                            spec['resize'], spec['image_size']
+                        )
+                    overlay_png, overlay_ms = st.session_state.saliency_overlay
+                    st.image(preview(overlay_png), use_container_width=True)
+                    st.caption(f"Regions that most influenced the prediction (rendered in {overlay_ms:.0f} ms)")
+                    if activation_evicted:
+                        st.caption("This session is over its memory budget, so the attention map is recomputed "
+                                   "each time it is shown.")
             
-            # Action buttons
-            if CHATBOT_AVAILABLE:
+            # Closest reference scans from the training set
+            if st.session_state.get('similar_cases'):
                 st.markdown(f"""
                 <div class="sub-header" style="margin-top: 20px;">
-                    {icon('help', 18)}
-                    Understand Results
+                    {icon('search', 18)}
+                    Similar Cases
                 </div>
                 """, unsafe_allow_html=True)
-                
-                c1, c2, c3 = st.columns(3)
-                with c1:
-                    if st.button("Explain Result", use_container_width=True):
-                        st.session_state.show_chat = True
-                        st.session_state.chat_context_message = "explain"
-                        st.rerun()
-                with c2:
-                    if st.button("Next Steps", use_container_width=True):
-                        st.session_state.show_chat = True
-                        st.session_state.chat_context_message = "next_steps"
-                        st.rerun()
-                with c3:
-                    if st.button("Ask Question", use_container_width=True):
-                        st.session_state.show_chat = True
-                        st.rerun()
+                case_cols = st.columns(len(st.session_state.similar_cases))
+                for case_col, case in zip(case_cols, st.session_state.similar_cases):
+                    with case_col:
+                        st.image(thumbnail(case['path']), use_container_width=True)
+                        st.caption(f"{case['label']} · {case['score']:.2f}")
+            
+            # Action buttons (explanations and next steps also work offline)
+            st.markdown(f"""
+            <div class="sub-header" style="margin-top: 20px;">
+                {icon('help', 18)}
+                Understand Results
+            </div>
+            """, unsafe_allow_html=True)
+            
+            c1, c2, c3 = st.columns(3)
+            with c1:
+                if st.button("Explain Result", use_container_width=True):
+                    st.session_state.show_chat = True
+                    st.session_state.chat_context_message = "explain"
+                    st.rerun()
+            with c2:
+                if st.button("Next Steps", use_container_width=True):
+                    st.session_state.show_chat = True
+                    st.session_state.chat_context_message = "next_steps"
+                    st.rerun()
+            with c3:
+                if st.button("Ask Question", use_container_width=True):
+                    st.session_state.show_chat = True
+                    st.rerun()
             
             # Inline chat
             if st.session_state.show_chat:
@@ -653,6 +885,58 @@ elif page == "Chat":
     
     render_chat_interface()
 
+# ============ HISTORY PAGE ============
+elif page == "History":
+    st.markdown(f"""
+    <div class="main-header">
+        {icon('clock', 28)}
+        Analysis History
+    </div>
+    """, unsafe_allow_html=True)
+    
+    history = get_history_store(DB_PATH)
+    user_id = st.session_state.user_data['id']
+    
+    # The background writer flushes every second; only an explicit refresh forces the queue out
+    if st.button("Refresh", key="history_refresh"):
+        history.flush()
+        st.session_state.history_cursors = [None]
+        st.session_state.history_total = None
+    
+    # Keyset pagination: one (created_at, id) cursor per visited page
+    if 'history_cursors' not in st.session_state:
+        st.session_state.history_cursors = [None]
+    cursors = st.session_state.history_cursors
+    rows, next_cursor = history.page(user_id, cursors[-1])
+    
+    if not rows:
+        st.info("No analyses yet. Results from the Analyze page are saved here.")
+    else:
+        # Counted once per refresh or new analysis, not on every page turn
+        if st.session_state.get('history_total') is None:
+            st.session_state.history_total = history.count(user_id)
+        st.caption(f"Page {len(cursors)} · {st.session_state.history_total} analyses in total")
+        st.dataframe([
+            {
+                'Date': row['created_at'],
+                'Result': row['label'],
+                'Confidence': f"{row['probabilities'][row['label']]:.1%}",
+                'Model': row['model_version'],
+                'Image': row['image_hash'][:12],
+            }
+            for row in rows
+        ], use_container_width=True, hide_index=True)
+        
+        c1, c2 = st.columns(2)
+        with c1:
+            if len(cursors) > 1 and st.button("← Newer", use_container_width=True):
+                cursors.pop()
+                st.rerun()
+        with c2:
+            if next_cursor is not None and st.button("Older →", use_container_width=True):
+                cursors.append(next_cursor)
+                st.rerun()
+
 # ============ ABOUT PAGE ============
 elif page == "About":
     st.markdown(f"""
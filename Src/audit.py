@@ -0,0 +1,150 @@
+"""
+Append-only login/audit event log with a write-behind writer.
+Requests only enqueue events; a background thread (write_behind.py) flushes them
+in batched transactions and updates users.last_login in bulk, so logins never
+wait for SQLite's write lock. The database runs in WAL mode, so readers are not
+blocked by the writer, and triggers reject UPDATE/DELETE on the events table.
+
+Usage:
+    python Src/audit.py bench --logins 2000 --threads 16
+"""
+
+import argparse
+import sqlite3
+import time
+from datetime import datetime
+
+from write_behind import WriteBehindWriter, get_writer
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS login_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER REFERENCES users(id),
+        username TEXT NOT NULL,
+        event TEXT NOT NULL,
+        success INTEGER NOT NULL,
+        detail TEXT,
+        created_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_login_events_user_time ON login_events(user_id, created_at);
+    CREATE INDEX IF NOT EXISTS idx_login_events_time ON login_events(created_at);
+    CREATE TRIGGER IF NOT EXISTS login_events_no_update BEFORE UPDATE ON login_events
+        BEGIN SELECT RAISE(ABORT, 'login_events is append-only'); END;
+    CREATE TRIGGER IF NOT EXISTS login_events_no_delete BEFORE DELETE ON login_events
+        BEGIN SELECT RAISE(ABORT, 'login_events is append-only'); END;
+'''
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class EventLog(WriteBehindWriter):
+    """Queue of audit events drained by one background writer per database."""
+
+    schema = SCHEMA
+    name = 'audit'
+    operation = 'audit_flush'
+
+    def record(self, event, username, user_id=None, success=True, detail=None):
+        """Enqueue one event; returns its timestamp without touching the database."""
+        created_at = _now()
+        self._queue.put((user_id, username, event, int(success), detail, created_at))
+        return created_at
+
+    def _write_batch(self, conn, events):
+        # Latest successful login per user, applied once per batch
+        last_login = {}
+        for user_id, _, event, success, _, created_at in events:
+            if event == 'login' and success and user_id is not None:
+                last_login[user_id] = max(created_at, last_login.get(user_id, ''))
+        conn.executemany('''
+            INSERT INTO login_events (user_id, username, event, success, detail, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', events)
+        conn.executemany(
+            'UPDATE users SET last_login = ? WHERE id = ? AND (last_login IS NULL OR last_login < ?)',
+            [(ts, user_id, ts) for user_id, ts in last_login.items()]
+        )
+
+    def recent_events(self, user_id=None, limit=50):
+        """Most recent flushed events, newest first (optionally for one user)."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if user_id is None:
+                rows = conn.execute('''
+                    SELECT username, event, success, detail, created_at FROM login_events
+                    ORDER BY created_at DESC, id DESC LIMIT ?
+                ''', (limit,)).fetchall()
+            else:
+                rows = conn.execute('''
+                    SELECT username, event, success, detail, created_at FROM login_events
+                    WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?
+                ''', (user_id, limit)).fetchall()
+        finally:
+            conn.close()
+        keys = ('username', 'event', 'success', 'detail', 'created_at')
+        return [dict(zip(keys, row)) for row in rows]
+
+
+def get_event_log(db_path):
+    """Process-wide EventLog for a database (one writer thread per file)."""
+    return get_writer(EventLog, db_path)
+
+
+def benchmark(logins=2000, threads=16, db_path='audit_bench.db'):
+    """Compare per-login UPDATE + commit against queued events under concurrent logins."""
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, last_login TEXT)')
+    conn.executemany('INSERT INTO users VALUES (?, ?, NULL)', [(i, f'user{i}') for i in range(100)])
+    conn.commit()
+    conn.close()
+    log = EventLog(db_path)
+
+    def sync_login(i):
+        start = time.perf_counter()
+        c = sqlite3.connect(db_path, timeout=30)
+        c.execute('UPDATE users SET last_login = ? WHERE id = ?', (_now(), i % 100))
+        c.commit()
+        c.close()
+        return time.perf_counter() - start
+
+    def queued_login(i):
+        start = time.perf_counter()
+        log.record('login', f'user{i % 100}', i % 100)
+        return time.perf_counter() - start
+
+    print(f"{'strategy':<12}{'p50 ms':>9}{'p99 ms':>9}{'logins/s':>10}")
+    for name, fn in (('sync', sync_login), ('queued', queued_login)):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            latencies = sorted(ms * 1000 for ms in pool.map(fn, range(logins)))
+        elapsed = time.perf_counter() - start
+        p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+        print(f"{name:<12}{p50:>9.3f}{p99:>9.3f}{logins / elapsed:>10.0f}")
+
+    start = time.perf_counter()
+    log.close()
+    print(f"Final flush of the queued events: {(time.perf_counter() - start) * 1000:.1f} ms")
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark write-behind login events")
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('--logins', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+    benchmark(args.logins, args.threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,8 +6,13 @@ Gestion des utilisateurs : login, register, roles
 import sqlite3
 import hashlib
 import os
+import time
 from datetime import datetime
 
+from audit import get_event_log
+from metrics import DB_OPERATION_SECONDS, LOGIN_SECONDS, timed
+from sessions import get_session_store
+
 # CORRECTION : Chemin absolu de la base de données
 DB_PATH = 'users.db'  # Simplifié : dans le même dossier que le script
 
@@ -17,7 +22,10 @@ class AuthSystem:
     def __init__(self):
         """Initialise la base de données."""
         self.init_database()
+        # Journal des connexions (écriture différée, en lots, par un thread de fond)
+        self.events = get_event_log(DB_PATH)
     
+    @timed(DB_OPERATION_SECONDS.labels('init'))
     def init_database(self):
         """Crée la table users si elle n'existe pas."""
         try:
@@ -47,6 +55,7 @@ class AuthSystem:
         """Hache le mot de passe avec SHA-256."""
         return hashlib.sha256(password.encode()).hexdigest()
     
+    @timed(DB_OPERATION_SECONDS.labels('register'))
     def register_user(self, username, email, password, full_name, role="doctor"):
         """
         Enregistre un nouvel utilisateur.
@@ -94,6 +103,7 @@ class AuthSystem:
             conn.commit()
             conn.close()
             
+            self.events.record('register', username, cursor.lastrowid)
             print(f"✅ Utilisateur créé : {username}")
             return True, "Inscription réussie ! Vous pouvez vous connecter."
             
@@ -112,6 +122,27 @@ class AuthSystem:
         Returns:
             tuple: (success: bool, user_data: dict or message: str)
         """
+        start = time.perf_counter()
+        success, result = self._authenticate(username, password)
+        if success:
+            # last_login est mis à jour en lot par le journal, pas dans la requête
+            result['last_login'] = self.events.record('login', username, result['id'])
+        else:
+            self.events.record('login', username, success=False)
+        LOGIN_SECONDS.labels('success' if success else 'failure').observe(time.perf_counter() - start)
+        return success, result
+    
+    def logout_user(self, user_data):
+        """Enregistre la déconnexion dans le journal."""
+        self.events.record('logout', user_data['username'], user_data['id'])
+    
+    def get_login_history(self, user_id=None, limit=50):
+        """Retourne les derniers événements de connexion (déjà écrits), du plus récent au plus ancien."""
+        return self.events.recent_events(user_id, limit)
+    
+    @timed(DB_OPERATION_SECONDS.labels('login'))
+    def _authenticate(self, username, password):
+        """Vérifie les identifiants (lecture seule, aucune écriture dans la requête)."""
         try:
             conn = sqlite3.connect(DB_PATH)
             cursor = conn.cursor()
@@ -125,14 +156,9 @@ class AuthSystem:
             ''', (username, password_hash))
             
             user = cursor.fetchone()
+            conn.close()
             
             if user:
-                # Mettre à jour la dernière connexion
-                last_login = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                cursor.execute('UPDATE users SET last_login = ? WHERE id = ?', 
-                             (last_login, user[0]))
-                conn.commit()
-                conn.close()
                 
                 # Retourner les données de l'utilisateur
                 user_data = {
@@ -142,19 +168,18 @@ class AuthSystem:
                     'role': user[3],
                     'full_name': user[4],
                     'created_at': user[5],
-                    'last_login': last_login
                 }
                 
                 print(f"✅ Connexion réussie : {username}")
                 return True, user_data
             else:
-                conn.close()
                 return False, "Nom d'utilisateur ou mot de passe incorrect"
                 
         except Exception as e:
             print(f"❌ Erreur login : {e}")
             return False, f"Erreur lors de la connexion : {str(e)}"
     
+    @timed(DB_OPERATION_SECONDS.labels('stats'))
     def get_user_stats(self):
         """Retourne les statistiques des utilisateurs (pour admin)."""
         try:
@@ -181,8 +206,9 @@ class AuthSystem:
             print(f"❌ Erreur get_user_stats : {e}")
             return {'total': 0, 'doctors': 0, 'admins': 0}
     
-    def change_password(self, username, old_password, new_password):
-        """Change le mot de passe d'un utilisateur."""
+    @timed(DB_OPERATION_SECONDS.labels('change_password'))
+    def change_password(self, username, old_password, new_password, keep_token=None):
+        """Change le mot de passe d'un utilisateur et révoque ses autres sessions (sauf keep_token)."""
         if len(new_password) < 6:
             return False, "Le nouveau mot de passe doit contenir au moins 6 caractères"
         
@@ -196,7 +222,8 @@ class AuthSystem:
             cursor.execute('SELECT id FROM users WHERE username = ? AND password_hash = ?',
                          (username, old_hash))
             
-            if not cursor.fetchone():
+            row = cursor.fetchone()
+            if not row:
                 conn.close()
                 return False, "Ancien mot de passe incorrect"
             
@@ -208,6 +235,9 @@ class AuthSystem:
             conn.commit()
             conn.close()
             
+            # Les jetons et cookies émis avec l'ancien mot de passe ne sont plus valables
+            get_session_store(DB_PATH).revoke_user(row[0], keep_token)
+            
             return True, "Mot de passe changé avec succès"
             
         except Exception as e:
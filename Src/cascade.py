@@ -0,0 +1,194 @@
+"""
+Confidence-gated model cascade.
+The cheapest model answers when it is confident enough; uncertain scans are
+passed on to larger models whose probabilities are combined in a weighted ensemble.
+
+Report usage:
+    python Src/cascade.py --models efficientnet resnet50 deit --thresholds 0.7 0.8 0.9 0.95
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+import numpy as np
+import torch
+
+from models import MODEL_SPECS, NUM_CLASSES, TEACHERS, available_models, load_model
+
+DEFAULT_THRESHOLD = 0.85
+# Threshold the app serves with (INFERENCE_MODE=cascade)
+CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD", DEFAULT_THRESHOLD))
+REPORT_PATH = os.path.join('reports', 'cascade_report.csv')
+
+
+def _ensemble(probabilities, weights):
+    """Weighted average of probability vectors (works on [C] or [N, C] arrays)."""
+    total = sum(weights)
+    return sum(w * p for w, p in zip(weights, probabilities)) / total
+
+
+class CascadeClassifier:
+    """Run models cheapest-first and stop as soon as the prediction is confident."""
+
+    def __init__(self, models, threshold=DEFAULT_THRESHOLD, weights=None):
+        """
+        Args:
+            models: dict name -> eval-mode model, ordered from cheapest to most expensive
+            threshold: softmax confidence a stage needs to answer on its own
+            weights: dict name -> ensemble weight (defaults to 1.0 for every model)
+        """
+        if not models:
+            raise ValueError("CascadeClassifier needs at least one model")
+        sizes = {(MODEL_SPECS[n]['image_size'], MODEL_SPECS[n]['in_channels']) for n in models}
+        if len(sizes) > 1:
+            raise ValueError("All cascade models must share the same input size")
+        self.models = models
+        self.threshold = threshold
+        self.weights = {name: (weights or {}).get(name, 1.0) for name in models}
+
+    @classmethod
+    def from_checkpoints(cls, names=None, threshold=DEFAULT_THRESHOLD, weights=None):
+        """Load every available checkpoint (or the given names) into a cascade."""
+        names = names or [name for name in available_models() if name in TEACHERS]
+        return cls({name: load_model(name) for name in names}, threshold, weights)
+
+    def predict(self, image):
+        """
+        Classify a preprocessed [1, C, H, W] tensor.
+
+        Returns:
+            tuple: (label_idx, probabilities, answered_by) where answered_by is the
+            model name for the first stage, or 'ensemble' once several models were run
+        """
+        names, collected = [], []
+        with torch.no_grad():
+            for name, model in self.models.items():
+                output = model(image)
+                names.append(name)
+                collected.append(torch.nn.functional.softmax(output, dim=1)[0].numpy())
+                probs = _ensemble(collected, [self.weights[n] for n in names])
+                if probs.max() >= self.threshold:
+                    break
+        answered_by = names[0] if len(names) == 1 else 'ensemble'
+        return int(probs.argmax()), probs, answered_by
+
+
+def collect_outputs(names, limit=None):
+    """Run each model over the validation split one image at a time.
+
+    Returns:
+        tuple: (labels [N], {name: probabilities [N, C]}, {name: latencies in seconds [N]})
+    """
+    from data import load_splits
+
+    _, val_dataset = load_splits()
+    count = min(limit or len(val_dataset), len(val_dataset))
+    targets = val_dataset.dataset.targets
+    labels = np.array([targets[idx] for idx in val_dataset.indices[:count]])
+    probabilities, latencies = {}, {}
+
+    for name in names:
+        model = load_model(name)
+        probs = np.zeros((count, NUM_CLASSES), dtype=np.float32)
+        times = np.zeros(count, dtype=np.float64)
+        with torch.no_grad():
+            model(val_dataset[0][0].unsqueeze(0))  # warm-up
+            for i in range(count):
+                image = val_dataset[i][0].unsqueeze(0)
+                start = time.perf_counter()
+                output = model(image)
+                times[i] = time.perf_counter() - start
+                probs[i] = torch.nn.functional.softmax(output, dim=1)[0].numpy()
+        probabilities[name] = probs
+        latencies[name] = times
+        print(f"{MODEL_SPECS[name]['display_name']}: {times.mean() * 1000:.1f} ms/image")
+
+    return labels, probabilities, latencies
+
+
+def simulate(labels, probabilities, latencies, names, threshold, weights):
+    """Replay the cascade decision on cached outputs for one threshold."""
+    count = len(labels)
+    final = np.zeros_like(probabilities[names[0]])
+    cost = np.zeros(count)
+    pending = np.ones(count, dtype=bool)
+    stages_used = np.zeros(count, dtype=int)
+
+    for depth in range(1, len(names) + 1):
+        stage = names[:depth]
+        probs = _ensemble([probabilities[n] for n in stage], [weights[n] for n in stage])
+        cost[pending] += latencies[stage[-1]][pending]
+        stages_used[pending] = depth
+        confident = probs.max(axis=1) >= threshold
+        answer = pending & (confident | (depth == len(names)))
+        final[answer] = probs[answer]
+        pending &= ~answer
+
+    return {
+        'threshold': threshold,
+        'accuracy': float((final.argmax(axis=1) == labels).mean()),
+        'avg_latency_ms': float(cost.mean() * 1000),
+        'first_stage_rate': float((stages_used == 1).mean()),
+        'avg_models_run': float(stages_used.mean()),
+    }
+
+
+def build_report(names, thresholds, weights=None, limit=None, output=REPORT_PATH):
+    """Compare single models, the full ensemble and the cascade at each threshold."""
+    weights = {name: (weights or {}).get(name, 1.0) for name in names}
+    labels, probabilities, latencies = collect_outputs(names, limit)
+
+    rows = []
+    for name in names:
+        rows.append({
+            'mode': MODEL_SPECS[name]['display_name'],
+            'threshold': '',
+            'accuracy': float((probabilities[name].argmax(axis=1) == labels).mean()),
+            'avg_latency_ms': float(latencies[name].mean() * 1000),
+            'first_stage_rate': '',
+            'avg_models_run': 1.0,
+        })
+    ensemble = _ensemble([probabilities[n] for n in names], [weights[n] for n in names])
+    rows.append({
+        'mode': 'ensemble',
+        'threshold': '',
+        'accuracy': float((ensemble.argmax(axis=1) == labels).mean()),
+        'avg_latency_ms': float(sum(latencies[n].mean() for n in names) * 1000),
+        'first_stage_rate': '',
+        'avg_models_run': float(len(names)),
+    })
+    for threshold in thresholds:
+        rows.append({'mode': 'cascade', **simulate(labels, probabilities, latencies, names, threshold, weights)})
+
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"\n{'mode':<16}{'threshold':>10}{'accuracy':>10}{'latency ms':>12}{'stage-1 %':>11}{'models':>8}")
+    for row in rows:
+        stage1 = f"{row['first_stage_rate']:.1%}" if row['first_stage_rate'] != '' else '-'
+        print(f"{row['mode']:<16}{str(row['threshold']):>10}{row['accuracy']:>10.4f}"
+              f"{row['avg_latency_ms']:>12.1f}{stage1:>11}{row['avg_models_run']:>8.2f}")
+    print(f"\nReport written to {output}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency vs accuracy report for the model cascade")
+    parser.add_argument('--models', nargs='+', default=TEACHERS,
+                        help="Models in cascade order, cheapest first")
+    parser.add_argument('--thresholds', nargs='+', type=float, default=[0.6, 0.7, 0.8, 0.9, 0.95, 0.99])
+    parser.add_argument('--weights', type=json.loads, default=None,
+                        help='Ensemble weights as JSON, e.g. \'{"deit": 2.0}\'')
+    parser.add_argument('--limit', type=int, default=None, help="Only use the first N validation images")
+    parser.add_argument('--output', default=REPORT_PATH)
+    args = parser.parse_args()
+    build_report(args.models, args.thresholds, args.weights, args.limit, args.output)
+
+
+if __name__ == '__main__':
+    main()
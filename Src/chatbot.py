@@ -3,13 +3,28 @@ Alzheimer's Disease Chatbot Module
 Uses Google Gemini API to provide FAQ, result explanation, and guidance.
 """
 
+import hashlib
 import os
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+from explanations import explain, next_steps
+from metrics import LLM_ERRORS_TOTAL, LLM_REQUEST_SECONDS, observe_seconds
+from prompting import PromptBuilder, RollingSummary
+from singleflight import SingleFlight
+
 # Load environment variables
 load_dotenv()
 
+MODEL_NAME = 'gemini-2.0-flash-lite'
+# Seconds a coalesced request may take before waiting sessions give up on it
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 30))
+# Alternative Gemini REST endpoint, e.g. the local fake server used by Src/loadtest.py
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+# Shared by every session in the process so identical concurrent prompts make one call
+_in_flight = SingleFlight(LLM_TIMEOUT_SECONDS)
+
 # System prompt with Alzheimer's knowledge
 SYSTEM_PROMPT = """You are a helpful, empathetic AI assistant specialized in Alzheimer's disease education and support. 
 You are integrated into an MRI-based Alzheimer's detection application.
@@ -39,15 +54,27 @@ When explaining results, be supportive and provide context about what the classi
 class AlzheimerChatbot:
     """Chatbot for Alzheimer's disease education and result explanation."""
     
-    def __init__(self):
-        """Initialize the chatbot with Gemini API."""
+    def __init__(self, max_history: int = 20):
+        """Initialize the chatbot with Gemini API.
+        
+        Args:
+            max_history: Messages kept in chat_history (oldest are dropped)
+        """
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
         
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-lite')
+        if GEMINI_API_ENDPOINT:
+            genai.configure(api_key=api_key, transport="rest",
+                            client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+        else:
+            genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(MODEL_NAME)
         self.chat_history = []
+        self.max_history = max_history
+        # Static system prompt + cached context; older turns are folded into the summary
+        self.prompt_builder = PromptBuilder(SYSTEM_PROMPT)
+        self.summary = RollingSummary()
         self.last_prediction = None
         self.last_probabilities = None
     
@@ -62,53 +89,69 @@ class AlzheimerChatbot:
         self.last_probabilities = None
     
     def _build_context(self) -> str:
-        """Build context string including prediction if available."""
-        context = SYSTEM_PROMPT
-        
-        if self.last_prediction:
-            context += f"\n\n**Current User Context:**\nThe user has just received a prediction result: **{self.last_prediction}**"
-            if self.last_probabilities:
-                context += "\nProbability breakdown:"
-                for label, prob in self.last_probabilities.items():
-                    context += f"\n- {label}: {prob:.1%}"
+        """Build the prediction context section (cached until the prediction changes)."""
+        return self.prompt_builder.context_block(self.last_prediction, self.last_probabilities)
+    
+    def _remember(self, user_message: str, assistant_message: str):
+        """Append one exchange to the history, folding the oldest messages past max_history into the summary."""
+        self.chat_history.append({"role": "user", "content": user_message})
+        self.chat_history.append({"role": "assistant", "content": assistant_message})
+        self.trim_history(self.max_history)
+
+    def trim_history(self, limit: int):
+        """Keep at most `limit` messages; older ones are folded into the rolling summary, not lost."""
+        overflow = len(self.chat_history) - limit
+        if overflow > 0:
+            self.summary.fold(self.chat_history[:overflow])
+            del self.chat_history[:overflow]
+    
+    def _generate(self, prompt: str, method: str, on_chunk=None) -> str:
+        """Call Gemini, sharing the call with any session already waiting on the same prompt.
         
-        return context
+        Args:
+            on_chunk: Called with the text so far as it streams in (only the session
+                that makes the call streams; sessions sharing it get the final text)
+        """
+        key = (MODEL_NAME, hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+        return _in_flight.do(key, lambda: self._call_model(prompt, method, on_chunk), label=method)
+    
+    def _call_model(self, prompt: str, method: str, on_chunk=None) -> str:
+        """Call Gemini, recording latency and errors per chatbot method."""
+        request_options = {"timeout": LLM_TIMEOUT_SECONDS}
+        try:
+            with observe_seconds(LLM_REQUEST_SECONDS.labels(method)):
+                if on_chunk is None:
+                    return self.model.generate_content(prompt, request_options=request_options).text
+                chunks = []
+                for chunk in self.model.generate_content(prompt, stream=True, request_options=request_options):
+                    chunks.append(chunk.text)
+                    on_chunk(''.join(chunks))
+                return ''.join(chunks)
+        except Exception:
+            LLM_ERRORS_TOTAL.labels(method).inc()
+            raise
     
     def get_response(self, user_message: str) -> str:
         """Get a response from the chatbot."""
         try:
-            # Build the full prompt with context
-            context = self._build_context()
-            
-            # Add chat history for conversation continuity
-            history_text = ""
-            for msg in self.chat_history[-6:]:  # Keep last 6 messages for context
-                role = "User" if msg["role"] == "user" else "Assistant"
-                history_text += f"\n{role}: {msg['content']}"
-            
-            full_prompt = f"""{context}
-
-{f"Previous conversation:{history_text}" if history_text else ""}
-
-User: {user_message}
-
-Please provide a helpful, empathetic response:"""
+            # System prompt, context, summary of older turns and the recent turns that fit the token budget
+            full_prompt = self.prompt_builder.build(
+                self.chat_history, self.summary, user_message, self._build_context()
+            )
             
             # Get response from Gemini
-            response = self.model.generate_content(full_prompt)
-            assistant_message = response.text
+            assistant_message = self._generate(full_prompt, "chat")
             
             # Update chat history
-            self.chat_history.append({"role": "user", "content": user_message})
-            self.chat_history.append({"role": "assistant", "content": assistant_message})
+            self._remember(user_message, assistant_message)
             
             return assistant_message
             
         except Exception as e:
             return f"I apologize, but I encountered an error: {str(e)}. Please try again."
     
-    def explain_result(self) -> str:
-        """Generate an explanation of the current prediction result."""
+    def explain_result(self, on_chunk=None) -> str:
+        """Generate an explanation of the current prediction result (templated if Gemini fails)."""
         if not self.last_prediction:
             return "I don't have any prediction results to explain yet. Please upload an MRI scan first."
         
@@ -126,19 +169,18 @@ Please provide:
 Keep the response warm, supportive, and around 150-200 words."""
         
         try:
-            response = self.model.generate_content(prompt)
-            explanation = response.text
-            
-            # Add to chat history
-            self.chat_history.append({"role": "user", "content": "Can you explain my result?"})
-            self.chat_history.append({"role": "assistant", "content": explanation})
-            
-            return explanation
+            explanation = self._generate(prompt, "explain_result", on_chunk)
         except Exception as e:
-            return f"I apologize, but I couldn't generate an explanation: {str(e)}"
+            print(f"Falling back to the offline explanation: {e}")
+            explanation = explain(self.last_prediction, self.last_probabilities)
+        
+        # Add to chat history
+        self._remember("Can you explain my result?", explanation)
+        
+        return explanation
     
-    def get_next_steps(self) -> str:
-        """Provide guidance on next steps based on the prediction."""
+    def get_next_steps(self, on_chunk=None) -> str:
+        """Provide guidance on next steps based on the prediction (templated if Gemini fails)."""
         if not self.last_prediction:
             return "Please upload an MRI scan first to receive personalized guidance."
         
@@ -153,14 +195,15 @@ Include:
 Be supportive and practical. Keep response to about 150 words."""
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            return self._generate(prompt, "next_steps", on_chunk)
         except Exception as e:
-            return f"I apologize, but I couldn't generate next steps: {str(e)}"
+            print(f"Falling back to the offline next steps: {e}")
+            return next_steps(self.last_prediction)
     
     def clear_history(self):
         """Clear the conversation history."""
         self.chat_history = []
+        self.summary.clear()
     
     def get_faq_topics(self) -> list:
         """Return common FAQ topics for quick access."""
@@ -0,0 +1,172 @@
+"""
+Safetensors checkpoints that are memory-mapped instead of unpickled.
+`convert` rewrites each .pth state dict as a .safetensors file next to it,
+reading the .pth with weights_only=True so no pickled code is executed.
+Tensors loaded from a safetensors file are views of a copy-on-write
+mapping of the file, and load_model assigns them to the model directly,
+without copying them into freshly initialised parameters. Every server
+process on a host therefore shares one copy of the weights in the OS page
+cache. `report` measures cold-load time and per-process memory for both
+formats with several processes loading the same model at once.
+
+Usage:
+    python Src/checkpoints.py convert
+    python Src/checkpoints.py report --model efficientnet --processes 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+
+import torch
+
+try:
+    from safetensors.torch import load_file, save_file
+    SAFETENSORS_AVAILABLE = True
+except ImportError:
+    SAFETENSORS_AVAILABLE = False
+
+REPORT_PATH = 'reports/checkpoint_load.txt'
+
+from model_specs import (MODEL_SPECS, SAFETENSORS_SUFFIX, available_models, checkpoint_path,
+                         resolve_checkpoint, safetensors_path)
+
+
+def load_state_dict(path, device='cpu'):
+    """State dict from a .safetensors (memory-mapped) or .pth (torch.load, weights only) checkpoint."""
+    if path.endswith(SAFETENSORS_SUFFIX):
+        if not SAFETENSORS_AVAILABLE:
+            raise ImportError("safetensors is required to load " + path)
+        return load_file(path, device=device)
+    # weights_only: tensors and plain containers are restored, no pickled code is run
+    return torch.load(path, map_location=torch.device(device), weights_only=True)
+
+
+def convert(name, path=None):
+    """Write the safetensors version of a model's .pth checkpoint; returns its path."""
+    path = path or checkpoint_path(name)
+    state_dict = torch.load(path, map_location='cpu', weights_only=True)
+    # safetensors stores each tensor once, so tied or strided tensors get their own contiguous copy
+    tensors = {key: value.detach().clone().contiguous() for key, value in state_dict.items()}
+    output = safetensors_path(path)
+    save_file(tensors, output + '.tmp', metadata={'model': name, 'source': os.path.basename(path)})
+    # Atomic swap, so a running server never maps a half-written file
+    os.replace(output + '.tmp', output)
+    return output
+
+
+def memory_mb():
+    """RSS, PSS and private memory of this process in MB (PSS splits shared pages between processes)."""
+    values = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    except OSError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return {'rss': rss, 'pss': rss, 'private': rss}
+    return {'rss': values['Rss'], 'pss': values['Pss'],
+            'private': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)}
+
+
+def _evict_page_cache(path):
+    # Drop the file's clean pages so the first load reads from disk (no root needed)
+    if hasattr(os, 'posix_fadvise'):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def _worker(name, path, loaded, barrier, results):
+    from models import load_model
+
+    spec = MODEL_SPECS[name]
+    start = time.perf_counter()
+    model = load_model(name, path)
+    with torch.no_grad():
+        model(torch.zeros(1, spec['in_channels'], spec['image_size'], spec['image_size']))
+    load_ms = (time.perf_counter() - start) * 1000
+    loaded.set()
+    # Measure only once every process holds the model, so shared pages are counted as shared
+    barrier.wait()
+    results.put({'load_ms': load_ms, 'memory': memory_mb()})
+    barrier.wait()
+
+
+def measure(name, path, processes):
+    """Load one checkpoint in `processes` concurrent processes; the first load is cold."""
+    _evict_page_cache(path)
+    ctx = multiprocessing.get_context('spawn')
+    barrier, results = ctx.Barrier(processes), ctx.Queue()
+    workers = []
+    for i in range(processes):
+        loaded = ctx.Event()
+        worker = ctx.Process(target=_worker, args=(name, path, loaded, barrier, results))
+        worker.start()
+        workers.append(worker)
+        if i == 0:
+            loaded.wait()
+    rows = [results.get(timeout=600) for _ in workers]
+    for worker in workers:
+        worker.join()
+    rows.sort(key=lambda row: -row['load_ms'])
+    return rows
+
+
+def report(name, processes=4):
+    """Compare .pth and .safetensors loading of one model across concurrent processes; returns the table lines."""
+    pth = checkpoint_path(name)
+    converted = resolve_checkpoint(pth)
+    if not converted.endswith(SAFETENSORS_SUFFIX):
+        print(f"Converting {pth} first")
+        converted = convert(name)
+
+    lines = [f"{MODEL_SPECS[name]['display_name']}: {processes} processes loading the same checkpoint",
+             f"{'format':<13}{'size MB':>9}{'cold ms':>9}{'warm ms':>9}{'RSS MB':>9}{'PSS MB':>9}"
+             f"{'private MB':>12}{'total PSS MB':>14}"]
+    for label, path in (('pth', pth), ('safetensors', converted)):
+        rows = measure(name, path, processes)
+        cold = rows[0]['load_ms']
+        warm = sorted(row['load_ms'] for row in rows[1:])[len(rows[1:]) // 2] if len(rows) > 1 else cold
+        mean = {key: sum(row['memory'][key] for row in rows) / len(rows) for key in ('rss', 'pss', 'private')}
+        total_pss = sum(row['memory']['pss'] for row in rows)
+        lines.append(f"{label:<13}{os.path.getsize(path) / 1024 / 1024:>9.1f}{cold:>9.0f}{warm:>9.0f}"
+                     f"{mean['rss']:>9.0f}{mean['pss']:>9.0f}{mean['private']:>12.0f}{total_pss:>14.0f}")
+    print('\n'.join(lines) + '\n')
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert checkpoints to safetensors and measure loading")
+    parser.add_argument('command', choices=['convert', 'report'])
+    parser.add_argument('--model', nargs='+', default=None, help="Registered model names (default: all available)")
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+    if not SAFETENSORS_AVAILABLE:
+        raise SystemExit("❌ safetensors is not installed (pip install safetensors)")
+
+    names = args.model or available_models()
+    if args.command == 'convert':
+        for name in names:
+            output = convert(name)
+            print(f"✅ {name}: {output} ({os.path.getsize(output) / 1024 / 1024:.1f} MB)")
+    else:
+        lines = []
+        for name in names:
+            lines += report(name, args.processes) + ['']
+        lines.append("RSS, PSS and private memory are per process after loading and one forward pass; "
+                     "PSS divides shared pages between the processes that map them.")
+        os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+        with open(REPORT_PATH, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        print(f"📈 Report written to {REPORT_PATH}")
+
+
+if __name__ == '__main__':
+    main()
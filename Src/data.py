@@ -0,0 +1,67 @@
+"""
+Dataset helpers shared by the training and evaluation scripts.
+Splits come from the duplicate-aware manifest written by dedup.py; without a
+manifest they fall back to the notebook's 80/20 random split with a fixed seed.
+"""
+
+import os
+import torch
+from torch.utils.data import DataLoader, Subset, random_split
+from torchvision import datasets, transforms
+
+from dedup import MANIFEST_PATH, load_manifest
+from models import IMAGENET_MEAN, IMAGENET_STD, build_transform
+
+DATA_DIR = 'train'
+VAL_FRACTION = 0.2
+SPLIT_SEED = 42
+
+
+def train_transform(image_size=224):
+    """Augmentations used for training in the notebook."""
+    return transforms.Compose([
+        transforms.Resize((image_size, image_size)),
+        transforms.ToTensor(),
+        transforms.RandomHorizontalFlip(),
+        transforms.RandomRotation(10),
+        transforms.RandomVerticalFlip(),
+        transforms.RandomGrayscale(p=0.1),
+        transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD),
+    ])
+
+
+def load_splits(transform=None, data_dir=DATA_DIR, val_fraction=VAL_FRACTION, seed=SPLIT_SEED,
+                manifest_path=MANIFEST_PATH):
+    """Return (train_dataset, val_dataset) from the split manifest, or a seeded random split."""
+    dataset = datasets.ImageFolder(data_dir, transform=transform or build_transform('efficientnet'))
+
+    manifest = load_manifest(manifest_path)
+    if manifest is not None:
+        sides = {entry['path']: entry['split'] for entry in manifest['entries']}
+        train_idx, val_idx, missing = [], [], 0
+        for i, (path, _) in enumerate(dataset.samples):
+            side = sides.get(os.path.relpath(path, data_dir))
+            if side == 'val':
+                val_idx.append(i)
+            elif side == 'train':
+                train_idx.append(i)
+            else:
+                missing += 1
+        if missing:
+            print(f"⚠️ {missing} images are not in {manifest_path}; re-run dedup.py to include them")
+        return Subset(dataset, train_idx), Subset(dataset, val_idx)
+
+    print(f"⚠️ No split manifest at {manifest_path}, using a seeded random split")
+    val_size = int(len(dataset) * val_fraction)
+    train_size = len(dataset) - val_size
+    generator = torch.Generator().manual_seed(seed)
+    return random_split(dataset, [train_size, val_size], generator=generator)
+
+
+def make_loader(dataset, batch_size=32, shuffle=False, num_workers=0, sampler=None, generator=None):
+    """DataLoader with the notebook's default batch size (a sampler, e.g. DistributedSampler, replaces shuffle).
+
+    A generator seeds the loader's workers instead of the global RNG.
+    """
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle and sampler is None,
+                      num_workers=num_workers, sampler=sampler, generator=generator)
@@ -0,0 +1,254 @@
+"""
+Near-duplicate detection and leakage-free train/validation split manifest.
+Every image under train/ gets a 64-bit DCT perceptual hash (computed in a process
+pool and cached by file size/mtime). Near-duplicates are found with multi-index
+hashing: the hash is cut into (max_distance + 1) bands, so by the pigeonhole
+principle any pair within max_distance bits shares at least one identical band
+and only those bucket collisions are compared. Duplicate groups are then kept on
+the same side of a stratified split.
+
+Usage:
+    python Src/dedup.py --max-distance 1 --val-fraction 0.2
+"""
+
+import argparse
+import json
+import os
+import random
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from PIL import Image
+
+DATA_DIR = 'train'
+MANIFEST_PATH = os.path.join('splits', 'split_manifest.json')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+HASH_SIZE = 8
+DCT_SIZE = 32
+# Brain MRI slices hash closely, so at 2+ bits whole classes chain into one component
+MAX_DISTANCE = 1
+# Largest near-duplicate group accepted; a bigger one means chaining, not duplicates
+MAX_GROUP_SIZE = 200
+# Largest allowed gap between a class's validation share and --val-fraction
+SPLIT_TOLERANCE = 0.05
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis, so a 2D DCT is two matrix products."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    basis = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    basis[0] /= np.sqrt(2)
+    return basis
+
+
+_DCT = _dct_matrix(DCT_SIZE)
+
+
+def phash(path):
+    """64-bit perceptual hash: low-frequency DCT coefficients thresholded at their median."""
+    with Image.open(path) as image:
+        image.draft('L', (DCT_SIZE * 2, DCT_SIZE * 2))  # cheap JPEG downscale while decoding
+        pixels = np.asarray(image.convert('L').resize((DCT_SIZE, DCT_SIZE), Image.BILINEAR), dtype=np.float64)
+    coefficients = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].flatten()[1:]  # drop the DC term
+    bits = coefficients > np.median(coefficients)
+    return int(''.join('1' if b else '0' for b in bits), 2)
+
+
+def _hash_file(args):
+    relative_path, data_dir = args
+    return relative_path, phash(os.path.join(data_dir, relative_path))
+
+
+def scan_images(data_dir=DATA_DIR):
+    """List (relative_path, class_name, size, mtime) for every image, sorted for determinism."""
+    entries = []
+    for class_name in sorted(os.listdir(data_dir)):
+        class_dir = os.path.join(data_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                stat = os.stat(os.path.join(class_dir, filename))
+                entries.append((os.path.join(class_name, filename), class_name, stat.st_size, stat.st_mtime))
+    return entries
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Parsed manifest, or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compute_hashes(entries, data_dir=DATA_DIR, previous=None, workers=None):
+    """Hash new or modified files in a process pool; reuse hashes from a previous manifest."""
+    known = {}
+    if previous:
+        known = {e['path']: e for e in previous['entries']}
+
+    hashes, todo = {}, []
+    for relative_path, _, size, mtime in entries:
+        cached = known.get(relative_path)
+        if cached and cached['size'] == size and cached['mtime'] == mtime:
+            hashes[relative_path] = int(cached['hash'], 16)
+        else:
+            todo.append((relative_path, data_dir))
+
+    print(f"{len(hashes)} hashes reused, {len(todo)} to compute")
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for relative_path, value in pool.map(_hash_file, todo, chunksize=64):
+                hashes[relative_path] = value
+    return hashes
+
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def group_near_duplicates(hash_values, max_distance=MAX_DISTANCE):
+    """Group indices whose hashes are within max_distance bits, via multi-index band lookup.
+
+    Groups are connected components, so every near-duplicate pair shares a group and
+    therefore a side of the split.
+    """
+    bands = max_distance + 1
+    bounds = np.linspace(0, 64, bands + 1).astype(int)
+    union_find = _UnionFind(len(hash_values))
+
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        mask = (1 << (hi - lo)) - 1
+        buckets = defaultdict(list)
+        for i, value in enumerate(hash_values):
+            buckets[(value >> lo) & mask].append(i)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            for a_pos, a in enumerate(members):
+                for b in members[a_pos + 1:]:
+                    if union_find.find(a) != union_find.find(b) and \
+                            bin(hash_values[a] ^ hash_values[b]).count('1') <= max_distance:
+                        union_find.union(a, b)
+
+    return [union_find.find(i) for i in range(len(hash_values))]
+
+
+def stratified_group_split(groups, classes, val_fraction=0.2, seed=42):
+    """Assign whole duplicate groups to train or val, filling each class's val quota."""
+    members = defaultdict(list)
+    for i, group in enumerate(groups):
+        members[group].append(i)
+
+    by_class = defaultdict(list)
+    for group, indices in members.items():
+        # A group spanning several classes is assigned by majority; it is reported separately
+        majority = Counter(classes[i] for i in indices).most_common(1)[0][0]
+        by_class[majority].append(group)
+
+    rng = random.Random(seed)
+    split = {}
+    for class_name in sorted(by_class):
+        class_groups = sorted(by_class[class_name])
+        rng.shuffle(class_groups)
+        quota = round(sum(len(members[g]) for g in class_groups) * val_fraction)
+        assigned = 0
+        for group in class_groups:
+            # A group only goes to val if it fits in the remaining quota, so one large group cannot overshoot it
+            side = 'val' if assigned + len(members[group]) <= quota else 'train'
+            if side == 'val':
+                assigned += len(members[group])
+            for i in members[group]:
+                split[i] = side
+    return [split[i] for i in range(len(groups))]
+
+
+def build_manifest(data_dir=DATA_DIR, output=MANIFEST_PATH, max_distance=MAX_DISTANCE, val_fraction=0.2,
+                   seed=42, workers=None):
+    """Hash, group and split the dataset, then persist the manifest."""
+    entries = scan_images(data_dir)
+    hashes = compute_hashes(entries, data_dir, load_manifest(output), workers)
+    hash_values = [hashes[path] for path, _, _, _ in entries]
+    classes = [class_name for _, class_name, _, _ in entries]
+
+    groups = group_near_duplicates(hash_values, max_distance)
+    group_sizes = Counter(groups)
+    largest = max(group_sizes.values())
+    if largest > MAX_GROUP_SIZE:
+        raise ValueError(f"{largest} images chained into one near-duplicate group (limit {MAX_GROUP_SIZE}) "
+                         f"at --max-distance {max_distance}; use a lower distance")
+    splits = stratified_group_split(groups, classes, val_fraction, seed)
+
+    split_counts = Counter((c, s) for c, s in zip(classes, splits))
+    class_counts = Counter(classes)
+    for class_name, total in sorted(class_counts.items()):
+        fraction = split_counts[(class_name, 'val')] / total
+        if abs(fraction - val_fraction) > SPLIT_TOLERANCE:
+            raise ValueError(f"{class_name}: {fraction:.1%} of images ended up in val instead of {val_fraction:.0%}; "
+                             f"near-duplicate groups are too large (try a lower --max-distance)")
+
+    group_classes = defaultdict(set)
+    for group, class_name in zip(groups, classes):
+        group_classes[group].add(class_name)
+
+    manifest = {
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'data_dir': data_dir,
+        'max_distance': max_distance,
+        'val_fraction': val_fraction,
+        'seed': seed,
+        'entries': [{
+            'path': path,
+            'class': class_name,
+            'size': size,
+            'mtime': mtime,
+            'hash': f'{hashes[path]:016x}',
+            'group': group,
+            'split': side,
+        } for (path, class_name, size, mtime), group, side in zip(entries, groups, splits)],
+    }
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+    duplicate_groups = [g for g, n in group_sizes.items() if n > 1]
+    cross_class = [g for g in duplicate_groups if len(group_classes[g]) > 1]
+    print(f"{len(entries)} images, {len(duplicate_groups)} near-duplicate groups "
+          f"covering {sum(group_sizes[g] for g in duplicate_groups)} images, "
+          f"{len(cross_class)} groups spanning several classes")
+    for class_name in sorted(set(classes)):
+        print(f"  {class_name:<24} train {split_counts[(class_name, 'train')]:>5}  val {split_counts[(class_name, 'val')]:>5}")
+    print(f"Manifest written to {output}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect near-duplicates and write a leakage-free split manifest")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--output', default=MANIFEST_PATH)
+    parser.add_argument('--max-distance', type=int, default=MAX_DISTANCE,
+                        help="Max Hamming distance between near-duplicates")
+    parser.add_argument('--val-fraction', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=None, help="Hashing processes (default: all cores)")
+    args = parser.parse_args()
+    build_manifest(args.data_dir, args.output, args.max_distance, args.val_fraction, args.seed, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Knowledge distillation from the large teachers into the CPU-friendly student.
+Teacher logits over the training split are computed once and cached on disk, so
+student runs (and hyperparameter changes) never re-run the teachers. The cache is
+keyed by the teacher checkpoint's path, mtime and size, so a retrained teacher is
+re-run.
+
+Usage:
+    python Src/distill.py --teachers efficientnet deit --epochs 15
+"""
+
+import argparse
+import json
+import os
+import time
+import numpy as np
+import torch
+from torch import nn, optim
+from torch.utils.data import Dataset
+from torchvision import transforms
+
+from data import load_splits, make_loader
+from models import (IMAGENET_MEAN, IMAGENET_STD, MODEL_SPECS, build_model, build_transform,
+                    checkpoint_path, load_model)
+
+CACHE_DIR = 'cache'
+REPORT_PATH = os.path.join('reports', 'distill_report.json')
+STUDENT = 'student'
+
+
+class IndexedSubset(Dataset):
+    """Yield (image, label, position) so each sample can be matched to its cached logits."""
+
+    def __init__(self, subset):
+        self.subset = subset
+
+    def __len__(self):
+        return len(self.subset)
+
+    def __getitem__(self, position):
+        image, label = self.subset[position]
+        return image, label, position
+
+
+def student_train_transform():
+    """Notebook augmentations at the student's resolution and channel count."""
+    spec = MODEL_SPECS[STUDENT]
+    return transforms.Compose([
+        transforms.Resize((spec['image_size'], spec['image_size'])),
+        transforms.Grayscale(num_output_channels=spec['in_channels']),
+        transforms.RandomHorizontalFlip(),
+        transforms.RandomVerticalFlip(),
+        transforms.RandomRotation(10),
+        transforms.ToTensor(),
+        transforms.Normalize([sum(IMAGENET_MEAN) / 3], [sum(IMAGENET_STD) / 3]),
+    ])
+
+
+def _checkpoint_fingerprint(teacher):
+    """Path, modification time and size of a teacher's checkpoint, stored with its cached logits."""
+    path = checkpoint_path(teacher)
+    stat = os.stat(path)
+    return np.array([os.path.abspath(path), str(stat.st_mtime_ns), str(stat.st_size)])
+
+
+def teacher_logits(teacher, batch_size=64, num_workers=0):
+    """Return cached [N_train, C] logits for a teacher, computing them if needed.
+
+    The cache is reused only for the same training indices and the same teacher
+    checkpoint, so retraining a teacher invalidates its logits.
+    """
+    train_dataset, _ = load_splits(build_transform(teacher))
+    indices = np.asarray(train_dataset.indices)
+    fingerprint = _checkpoint_fingerprint(teacher)
+    cache_file = os.path.join(CACHE_DIR, f'teacher_logits_{teacher}.npz')
+
+    if os.path.exists(cache_file):
+        cached = np.load(cache_file)
+        if 'checkpoint' not in cached.files or not np.array_equal(cached['checkpoint'], fingerprint):
+            print(f"{teacher} checkpoint changed since {cache_file} was written, recomputing")
+        elif np.array_equal(cached['indices'], indices):
+            print(f"Using cached logits for {teacher}: {cache_file}")
+            return cached['logits']
+
+    print(f"Computing {teacher} logits over {len(indices)} training images...")
+    model = load_model(teacher)
+    outputs = []
+    with torch.no_grad():
+        for inputs, _ in make_loader(train_dataset, batch_size, num_workers=num_workers):
+            outputs.append(model(inputs).numpy())
+    logits = np.concatenate(outputs).astype(np.float32)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    np.savez(cache_file, logits=logits, indices=indices, checkpoint=fingerprint)
+    return logits
+
+
+def distillation_loss(student_logits, teacher_logits, labels, temperature, alpha):
+    """Hinton et al. soft-target KL term blended with the hard-label cross-entropy."""
+    soft = nn.functional.kl_div(
+        nn.functional.log_softmax(student_logits / temperature, dim=1),
+        nn.functional.softmax(teacher_logits / temperature, dim=1),
+        reduction='batchmean',
+    ) * temperature ** 2
+    hard = nn.functional.cross_entropy(student_logits, labels)
+    return alpha * soft + (1 - alpha) * hard
+
+
+def evaluate(model, dataset, batch_size=64):
+    """Top-1 accuracy over a dataset."""
+    model.eval()
+    correct = total = 0
+    with torch.no_grad():
+        for inputs, labels in make_loader(dataset, batch_size):
+            correct += (model(inputs).argmax(dim=1) == labels).sum().item()
+            total += labels.size(0)
+    return correct / total
+
+
+def measure_latency(model, name, runs=50):
+    """Median single-image CPU latency in milliseconds."""
+    spec = MODEL_SPECS[name]
+    image = torch.randn(1, spec['in_channels'], spec['image_size'], spec['image_size'])
+    timings = []
+    with torch.no_grad():
+        for _ in range(5):
+            model(image)
+        for _ in range(runs):
+            start = time.perf_counter()
+            model(image)
+            timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def train_student(teachers, epochs=15, lr=3e-3, batch_size=64, temperature=4.0, alpha=0.7,
+                  num_workers=0, output=None):
+    """Distill the averaged teacher logits into a fresh student and export its state_dict."""
+    soft_targets = torch.from_numpy(np.mean([teacher_logits(t, num_workers=num_workers) for t in teachers], axis=0))
+
+    train_dataset, _ = load_splits(student_train_transform())
+    _, val_dataset = load_splits(build_transform(STUDENT))
+    loader = make_loader(IndexedSubset(train_dataset), batch_size, shuffle=True, num_workers=num_workers)
+
+    student = build_model(STUDENT)
+    optimizer = optim.AdamW(student.parameters(), lr=lr, weight_decay=1e-4)
+    scheduler = optim.lr_scheduler.OneCycleLR(optimizer, max_lr=lr, epochs=epochs, steps_per_epoch=len(loader))
+
+    for epoch in range(epochs):
+        student.train()
+        running_loss = 0.0
+        for inputs, labels, positions in loader:
+            optimizer.zero_grad()
+            loss = distillation_loss(student(inputs), soft_targets[positions], labels, temperature, alpha)
+            loss.backward()
+            optimizer.step()
+            scheduler.step()
+            running_loss += loss.item()
+        accuracy = evaluate(student, val_dataset)
+        print(f"Epoch {epoch+1}, Loss: {running_loss/len(loader):.4f}, Validation Accuracy: {100 * accuracy:.2f}%")
+
+    output = output or checkpoint_path(STUDENT)
+    torch.save(student.state_dict(), output)
+    print(f"Student saved to {output}")
+    return output
+
+
+def compare(teachers, student_path=None, output=REPORT_PATH):
+    """Write a latency / accuracy / size comparison of the student against its teachers."""
+    rows = []
+    for name in teachers + [STUDENT]:
+        path = student_path if name == STUDENT and student_path else checkpoint_path(name)
+        model = load_model(name, path)
+        _, val_dataset = load_splits(build_transform(name))
+        rows.append({
+            'model': MODEL_SPECS[name]['display_name'],
+            'params_m': sum(p.numel() for p in model.parameters()) / 1e6,
+            'checkpoint_mb': os.path.getsize(path) / 1e6,
+            'latency_ms': measure_latency(model, name),
+            'val_accuracy': evaluate(model, val_dataset),
+        })
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(rows, f, indent=2)
+
+    print(f"\n{'model':<34}{'params (M)':>11}{'size (MB)':>11}{'latency ms':>12}{'accuracy':>10}")
+    for row in rows:
+        print(f"{row['model']:<34}{row['params_m']:>11.2f}{row['checkpoint_mb']:>11.1f}"
+              f"{row['latency_ms']:>12.1f}{row['val_accuracy']:>10.4f}")
+    print(f"\nReport written to {output}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the trained teachers into a small CPU student")
+    parser.add_argument('--teachers', nargs='+', default=['efficientnet', 'deit'])
+    parser.add_argument('--epochs', type=int, default=15)
+    parser.add_argument('--lr', type=float, default=3e-3)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--temperature', type=float, default=4.0)
+    parser.add_argument('--alpha', type=float, default=0.7, help="Weight of the soft-target loss")
+    parser.add_argument('--num-workers', type=int, default=0)
+    parser.add_argument('--output', default=None, help="Student checkpoint path")
+    parser.add_argument('--report-only', action='store_true', help="Skip training, only compare")
+    args = parser.parse_args()
+
+    student_path = args.output
+    if not args.report_only:
+        student_path = train_student(args.teachers, args.epochs, args.lr, args.batch_size,
+                                     args.temperature, args.alpha, args.num_workers, args.output)
+    compare(args.teachers, student_path)
+
+
+if __name__ == '__main__':
+    main()
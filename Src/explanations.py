@@ -0,0 +1,106 @@
+"""
+Offline result explanations and next steps.
+Rendered locally from fixed templates selected by predicted label and
+confidence band, so they appear instantly and work without a Gemini API key.
+The wording lives in the dictionaries below as plain data, so clinical
+reviewers can edit it without touching code.
+"""
+
+# Lower bound of each confidence band, checked from the top
+CONFIDENCE_BANDS = [(0.85, 'high'), (0.60, 'moderate'), (0.0, 'low')]
+# A runner-up class at or above this probability is mentioned explicitly
+RUNNER_UP_THRESHOLD = 0.20
+
+MEANINGS = {
+    "Non-demented": (
+        "The model did not find patterns in this scan that it associates with Alzheimer's disease. "
+        "This is reassuring, but a normal-looking scan does not rule out memory problems or other conditions."
+    ),
+    "Very Mild Alzheimer's": (
+        "The model found subtle patterns that it associates with the earliest stage of Alzheimer's disease. "
+        "Changes at this stage are often hard to tell apart from normal ageing, even for specialists."
+    ),
+    "Mild Alzheimer's": (
+        "The model found patterns that it associates with mild Alzheimer's disease, the stage where memory "
+        "and thinking difficulties usually become noticeable in everyday life."
+    ),
+    "Moderate Alzheimer's": (
+        "The model found patterns that it associates with moderate Alzheimer's disease, a stage where "
+        "memory loss and difficulty with daily activities are usually significant."
+    ),
+}
+
+CONFIDENCE_NOTES = {
+    'high': "The model is confident in this result ({confidence:.0%}).",
+    'moderate': "The model is moderately confident in this result ({confidence:.0%}), so it should be read with care.",
+    'low': ("The model is not confident in this result ({confidence:.0%}); the scan could reasonably "
+            "belong to another category."),
+}
+
+RUNNER_UP_NOTE = "It also gave {label} a {probability:.0%} probability."
+
+LIMITATIONS = (
+    "This is an AI estimate from a single MRI image, not a diagnosis. Diagnosing Alzheimer's disease "
+    "requires a clinical assessment, cognitive testing and often other investigations."
+)
+
+SUPPORT = "Whatever the result, you don't have to go through this alone, and a doctor can help you understand it."
+
+NEXT_STEPS = {
+    "Non-demented": [
+        "If you or your family have noticed memory changes, mention them to your GP anyway.",
+        "Keep up habits that support brain health: physical activity, sleep, social contact and managing blood pressure.",
+        "Consider a routine cognitive check-up if you have risk factors such as family history.",
+    ],
+    "Very Mild Alzheimer's": [
+        "Book an appointment with your GP and bring this result and a list of any changes you have noticed.",
+        "Ask about a referral to a memory clinic or neurologist for a full cognitive assessment.",
+        "Blood tests and other checks can rule out treatable causes of memory problems, such as vitamin B12 deficiency or thyroid problems.",
+        "Alzheimer's associations offer free information and helplines for you and your family.",
+    ],
+    "Mild Alzheimer's": [
+        "Make an appointment with your GP soon and ask for a referral to a memory clinic or neurologist.",
+        "Bring a family member or friend who can describe the changes they have noticed.",
+        "Ask about treatment options and clinical trials that may be appropriate at this stage.",
+        "Contact an Alzheimer's association for support groups and practical advice for caregivers.",
+    ],
+    "Moderate Alzheimer's": [
+        "Contact your GP or specialist promptly to discuss this result and the current level of support.",
+        "Ask about medication, care planning and services that help with daily activities.",
+        "Consider legal and financial planning while the person can still take part in decisions.",
+        "Reach out to caregiver support services and Alzheimer's associations for help and respite.",
+    ],
+}
+
+NO_RESULT = "I don't have any prediction results to explain yet. Please upload an MRI scan first."
+
+
+def confidence_band(confidence):
+    """Name of the band a top-class probability falls into."""
+    return next(name for lower, name in CONFIDENCE_BANDS if confidence >= lower)
+
+
+def explain(label, probabilities=None):
+    """Templated explanation of a prediction and its probability breakdown (markdown)."""
+    if label not in MEANINGS:
+        return NO_RESULT
+    probabilities = probabilities or {}
+    confidence = probabilities.get(label, 0.0)
+
+    parts = [f"**Your result: {label}**", MEANINGS[label]]
+    if probabilities:
+        note = CONFIDENCE_NOTES[confidence_band(confidence)].format(confidence=confidence)
+        others = sorted(((p, l) for l, p in probabilities.items() if l != label), reverse=True)
+        if others and others[0][0] >= RUNNER_UP_THRESHOLD:
+            note += ' ' + RUNNER_UP_NOTE.format(label=others[0][1], probability=others[0][0])
+        parts.append(note)
+    parts += [LIMITATIONS, "**Recommended next step:** " + NEXT_STEPS[label][0], SUPPORT]
+    return '\n\n'.join(parts)
+
+
+def next_steps(label):
+    """Templated next steps for a predicted label (markdown)."""
+    if label not in NEXT_STEPS:
+        return "Please upload an MRI scan first to receive personalized guidance."
+    steps = '\n'.join(f"{i}. {step}" for i, step in enumerate(NEXT_STEPS[label], 1))
+    return f"**Suggested next steps for a result of {label}:**\n\n{steps}\n\n{LIMITATIONS}"
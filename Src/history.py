@@ -0,0 +1,192 @@
+"""
+Per-user analysis history stored next to the users table.
+Each analysis records the user, time, image hash, model version, label and
+class probabilities. Inserts are queued and written in batches by a background
+thread, and pages are read with keyset pagination over a (user_id, created_at,
+id) index, so loading a page costs the same on page 1 as on page 10,000.
+
+Usage:
+    python Src/history.py bench --rows 300000 --users 50
+"""
+
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from metrics import DB_OPERATION_SECONDS, observe_seconds
+from write_behind import WriteBehindWriter, get_writer
+
+PAGE_SIZE = 20
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS analyses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        created_at TEXT NOT NULL,
+        image_hash TEXT NOT NULL,
+        model_version TEXT NOT NULL,
+        label TEXT NOT NULL,
+        probabilities TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_analyses_user_time ON analyses(user_id, created_at, id);
+    CREATE INDEX IF NOT EXISTS idx_analyses_time ON analyses(created_at);
+'''
+
+_COLUMNS = ('id', 'created_at', 'image_hash', 'model_version', 'label', 'probabilities')
+
+
+def image_hash(source):
+    """SHA-256 hex digest of an uploaded file as received (bytes, a path or a file-like object)."""
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray)):
+        digest.update(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    else:
+        position = source.tell()
+        source.seek(0)
+        for chunk in iter(lambda: source.read(1 << 20), b''):
+            digest.update(chunk)
+        source.seek(position)
+    return digest.hexdigest()
+
+
+def model_version(name, path=None):
+    """Model name plus checkpoint modification time, e.g. 'efficientnet@1712345678'."""
+    if path and os.path.exists(path):
+        return f"{name}@{int(os.path.getmtime(path))}"
+    return name
+
+
+class HistoryStore(WriteBehindWriter):
+    """Queued writer and keyset-paginated reader for the analyses table."""
+
+    schema = SCHEMA
+    name = 'history'
+    operation = 'history_insert'
+
+    def add(self, user_id, image_digest, version, label, probabilities):
+        """Queue one analysis for the next batched insert."""
+        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._queue.put((user_id, created_at, image_digest, version, label, json.dumps(probabilities)))
+
+    def _write_batch(self, conn, rows):
+        conn.executemany('''
+            INSERT INTO analyses (user_id, created_at, image_hash, model_version, label, probabilities)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+    def page(self, user_id, cursor=None, limit=PAGE_SIZE):
+        """One page of a user's analyses, newest first.
+
+        Args:
+            cursor: (created_at, id) of the last row of the previous page, or None for the first page
+
+        Returns:
+            tuple: (rows as dicts, cursor for the next page or None when there are no more)
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with observe_seconds(DB_OPERATION_SECONDS.labels('history_page')):
+                if cursor is None:
+                    rows = conn.execute('''
+                        SELECT id, created_at, image_hash, model_version, label, probabilities FROM analyses
+                        WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?
+                    ''', (user_id, limit + 1)).fetchall()
+                else:
+                    rows = conn.execute('''
+                        SELECT id, created_at, image_hash, model_version, label, probabilities FROM analyses
+                        WHERE user_id = ? AND (created_at, id) < (?, ?)
+                        ORDER BY created_at DESC, id DESC LIMIT ?
+                    ''', (user_id, cursor[0], cursor[1], limit + 1)).fetchall()
+        finally:
+            conn.close()
+
+        # One extra row tells us whether a next page exists without a COUNT(*)
+        has_more = len(rows) > limit
+        rows = [dict(zip(_COLUMNS, row)) for row in rows[:limit]]
+        for row in rows:
+            row['probabilities'] = json.loads(row['probabilities'])
+        next_cursor = (rows[-1]['created_at'], rows[-1]['id']) if has_more else None
+        return rows, next_cursor
+
+    def count(self, user_id):
+        """Number of stored analyses for a user (served from the user/time index)."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute('SELECT COUNT(*) FROM analyses WHERE user_id = ?', (user_id,)).fetchone()[0]
+        finally:
+            conn.close()
+
+
+def get_history_store(db_path):
+    """Process-wide HistoryStore for a database (one writer thread per file)."""
+    return get_writer(HistoryStore, db_path)
+
+
+def benchmark(rows=300000, users=50, pages=(1, 10, 100, 1000), db_path='history_bench.db'):
+    """Fill a scratch database and compare keyset pages against OFFSET pages at increasing depth."""
+    import random
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    store = HistoryStore(db_path)
+    labels = ["Mild Alzheimer's", "Moderate Alzheimer's", "Non-demented", "Very Mild Alzheimer's"]
+
+    start = time.perf_counter()
+    base = time.time() - rows * 60
+    for i in range(rows):
+        created_at = datetime.fromtimestamp(base + i * 60).strftime('%Y-%m-%d %H:%M:%S')
+        store._queue.put((random.randrange(users), created_at, f'{i:064x}', 'efficientnet@0',
+                          random.choice(labels), json.dumps({label: 0.25 for label in labels})))
+    store.flush()
+    print(f"Inserted {rows} analyses in {time.perf_counter() - start:.1f}s (batches of {store.batch_size})")
+
+    user_id = 0
+    conn = sqlite3.connect(db_path)
+    print(f"\n{'page':>6}{'keyset ms':>11}{'offset ms':>11}")
+    cursor = None
+    for page_number in range(1, max(pages) + 1):
+        start = time.perf_counter()
+        _, next_cursor = store.page(user_id, cursor)
+        keyset = (time.perf_counter() - start) * 1000
+        if page_number in pages:
+            start = time.perf_counter()
+            conn.execute('''
+                SELECT id, created_at, image_hash, model_version, label, probabilities FROM analyses
+                WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?
+            ''', (user_id, PAGE_SIZE, (page_number - 1) * PAGE_SIZE)).fetchall()
+            offset = (time.perf_counter() - start) * 1000
+            print(f"{page_number:>6}{keyset:>11.2f}{offset:>11.2f}")
+        if next_cursor is None:
+            print(f"(user {user_id} has only {page_number} pages)")
+            break
+        cursor = next_cursor
+    conn.close()
+
+    store.close()
+    atexit.unregister(store.close)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis history store")
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('--rows', type=int, default=300000)
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args()
+    benchmark(args.rows, args.users)
+
+
+if __name__ == '__main__':
+    main()
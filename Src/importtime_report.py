@@ -0,0 +1,107 @@
+"""
+Import-time report for the app's startup path.
+Runs `python -X importtime` in fresh subprocesses for the modules the app used to
+import before the login screen versus the ones it imports now (read from app.py's
+module-level imports), and writes the slowest top-level imports of each to
+reports/import_time.txt.
+
+Usage:
+    python Src/importtime_report.py
+"""
+
+import argparse
+import ast
+import os
+import re
+import subprocess
+import sys
+
+REPORT_PATH = os.path.join('reports', 'import_time.txt')
+
+# What `streamlit run Src/app.py` imported before showing the login page
+EAGER_MODULES = ['streamlit', 'dotenv', 'torch', 'torchvision', 'efficientnet_pytorch', 'timm',
+                 'matplotlib.pyplot', 'google.generativeai', 'login_page']
+APP_PATH = os.path.join(os.path.dirname(__file__), 'app.py')
+
+
+def app_startup_modules(path=APP_PATH):
+    """Modules app.py imports at module level, i.e. before the login page; the rest is deferred."""
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+# What it imports now, read from app.py so the list cannot fall behind it
+LAZY_MODULES = app_startup_modules()
+
+_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def _top_level_imports(code):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=os.path.dirname(__file__) or '.', capture_output=True, text=True)
+    top_level = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        # -X importtime indents nested imports by two spaces per level
+        if match and len(match.group(3)) == 1:
+            top_level.append((int(match.group(2)), match.group(4)))
+    return top_level
+
+
+def measure(modules):
+    """Return (total seconds, [(cumulative us, module)] for top-level imports, missing modules)."""
+    available, missing = [], []
+    for module in modules:
+        probe = subprocess.run([sys.executable, '-c', f'import {module}'], cwd=os.path.dirname(__file__) or '.',
+                               capture_output=True)
+        (available if probe.returncode == 0 else missing).append(module)
+
+    # Interpreter startup (site, encodings, ...) is the same for both and left out
+    startup = {module for _, module in _top_level_imports('pass')}
+    code = '; '.join(f'import {module}' for module in available) or 'pass'
+    top_level = sorted(((us, module) for us, module in _top_level_imports(code) if module not in startup),
+                       reverse=True)
+    return sum(us for us, _ in top_level) / 1e6, top_level, missing
+
+
+def build_report(output=REPORT_PATH, top=15):
+    """Compare eager and lazy startup imports and write a plain-text report."""
+    lines = []
+    totals = {}
+    for title, modules in (('Eager (previous startup)', EAGER_MODULES), ('Lazy (current startup)', LAZY_MODULES)):
+        total, top_level, missing = measure(modules)
+        totals[title] = total
+        lines.append(f"{title}: {total:.2f}s")
+        if missing:
+            lines.append(f"  not installed: {', '.join(missing)}")
+        for us, module in top_level[:top]:
+            lines.append(f"  {us / 1000:>9.1f} ms  {module}")
+        lines.append('')
+
+    eager, lazy = totals.values()
+    lines.append(f"Import time before the login page: {eager:.2f}s -> {lazy:.2f}s")
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    print('\n'.join(lines))
+    print(f"\nReport written to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure startup import time of the app")
+    parser.add_argument('--top', type=int, default=15, help="Top-level imports listed per configuration")
+    parser.add_argument('--output', default=REPORT_PATH)
+    args = parser.parse_args()
+    build_report(args.output, args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Process-wide inference service for the Streamlit app.
+The deep-learning stack (torch, torchvision, efficientnet_pytorch, timm) is only
+imported on first use, every model is loaded once per server process, and a
+background thread warms the configured model up right after login so neither
+the login screen nor the first analysis pays for it.
+"""
+
+import os
+import threading
+import time
+
+from metrics import MODEL_LOAD_SECONDS, observe_seconds
+from model_specs import MODEL_SPECS
+
+_cache = {}
+_key_locks = {}
+_cache_lock = threading.Lock()
+_warmup_lock = threading.Lock()
+_warmup_thread = None
+
+
+class SingleModel:
+    """One classifier plus its Grad-CAM and embedding hooks, shared by all sessions."""
+
+    def __init__(self, model, grad_cam, embedding_hook):
+        self.model = model
+        self.grad_cam = grad_cam
+        self.embedding_hook = embedding_hook
+        # The hooks keep the last forward pass's tensors, so predict + pop must not interleave
+        self.lock = threading.Lock()
+
+
+def _cached(key, factory):
+    # Callers of the same key wait for its in-flight load instead of loading twice; other keys
+    # load in parallel, since the global lock only guards the lookup and the per-key lock table
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        if key not in _cache:
+            _cache[key] = factory()
+        return _cache[key]
+
+
+def load_single(model_name, path=None):
+    """Load a registered model once, with its Grad-CAM and embedding hooks attached."""
+    def factory():
+        from models import load_model
+        from retrieval import EmbeddingHook
+        from saliency import GradCAM
+
+        with observe_seconds(MODEL_LOAD_SECONDS.labels(model_name)):
+            model = load_model(model_name, path)
+        try:
+            grad_cam = GradCAM(model)
+        except ValueError:
+            grad_cam = None
+        try:
+            embedding_hook = EmbeddingHook(model)
+        except ValueError:
+            embedding_hook = None
+        return SingleModel(model, grad_cam, embedding_hook)
+
+    return _cached(('single', model_name, path), factory)
+
+
+def load_cascade(threshold=None):
+    """Cascade over every available teacher checkpoint (at CASCADE_THRESHOLD by default)."""
+    if threshold is None:
+        from cascade import CASCADE_THRESHOLD as threshold
+
+    def factory():
+        from cascade import CascadeClassifier
+
+        with observe_seconds(MODEL_LOAD_SECONDS.labels('cascade')):
+            return CascadeClassifier.from_checkpoints(threshold=threshold)
+
+    return _cached(('cascade', threshold), factory)
+
+
+def load_tta_predictor(model_name, budget_ms=None):
+    """TTA predictor with its own model copy and latency estimates (TTA_BUDGET_MS by default)."""
+    if budget_ms is None:
+        from tta import TTA_BUDGET_MS as budget_ms
+
+    def factory():
+        import torch
+        from models import load_model
+        from tta import TTAPredictor
+
+        with observe_seconds(MODEL_LOAD_SECONDS.labels(model_name)):
+            predictor = TTAPredictor(load_model(model_name), budget_ms)
+        spec = MODEL_SPECS[model_name]
+        predictor.calibrate(torch.zeros(1, spec['in_channels'], spec['image_size'], spec['image_size']))
+        return predictor
+
+    return _cached(('tta', model_name, budget_ms), factory)
+
+
+def load_embedding_index(model_name):
+    """Memory-mapped similar-case index, or None if it has not been built."""
+    def factory():
+        from retrieval import EmbeddingIndex, index_paths
+
+        if not os.path.exists(index_paths(model_name)[0]):
+            return None
+        return EmbeddingIndex(model_name)
+
+    return _cached(('index', model_name), factory)
+
+
+def _warm_up(loaders):
+    start = time.perf_counter()
+    for load in loaders:
+        try:
+            load()
+        except Exception as e:
+            # The Analyze page reports load errors itself when the user gets there
+            print(f"Model warm-up skipped: {e}")
+    print(f"🔥 Inference warm-up finished in {time.perf_counter() - start:.1f}s")
+
+
+def start_warmup(*loaders):
+    """Run the given zero-argument loaders on a daemon thread, once per process."""
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is not None:
+            return
+        _warmup_thread = threading.Thread(target=_warm_up, args=(loaders,), name='model-warmup', daemon=True)
+        _warmup_thread.start()
@@ -0,0 +1,174 @@
+"""
+Size-capped image ingestion for uploads and samples.
+The header is read first and anything above the byte, pixel or decode-memory
+budget is rejected before its pixels are decoded. JPEGs are decoded in draft
+mode (libjpeg DCT scaling by 1/2, 1/4 or 1/8) close to the size the app keeps,
+instead of at full resolution. Formats without reduced decoding (PNG) are only
+decoded when their full buffer fits the decode budget, which is known from the
+header, and are downscaled immediately afterwards.
+
+Usage:
+    python Src/ingest.py --sizes 2000 4000 8000
+"""
+
+import argparse
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageMode
+
+from session_memory import IMAGE_MAX_SIDE
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("UPLOAD_MAX_MB", 20)) * 1024 * 1024)
+MAX_IMAGE_PIXELS = int(float(os.getenv("UPLOAD_MAX_MEGAPIXELS", 40)) * 1_000_000)
+# Largest pixel buffer we are willing to decode for one upload
+MAX_DECODE_BYTES = int(float(os.getenv("UPLOAD_MAX_DECODE_MB", 64)) * 1024 * 1024)
+
+
+class UploadRejected(ValueError):
+    """Raised when an upload is not a readable image or exceeds a budget."""
+
+
+def _byte_size(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    size = getattr(source, 'size', None)
+    if isinstance(size, int):
+        return size
+    position = source.tell()
+    source.seek(0, os.SEEK_END)
+    size = source.tell()
+    source.seek(position)
+    return size
+
+
+def check_upload_size(source, max_bytes=MAX_UPLOAD_BYTES):
+    """Raise UploadRejected if a path or file-like upload is over the byte budget."""
+    size = _byte_size(source)
+    if size > max_bytes:
+        raise UploadRejected(f"File is {size / 1024 / 1024:.1f} MB; the limit is {max_bytes / 1024 / 1024:.0f} MB")
+
+
+def _bytes_per_pixel(mode):
+    # Bands times bytes per band: I;16 is 2 bytes per pixel, I and F are 4
+    descriptor = ImageMode.getmode(mode)
+    return len(descriptor.bands) * int(descriptor.typestr[-1])
+
+
+def load_image(source, max_side=IMAGE_MAX_SIDE, max_bytes=MAX_UPLOAD_BYTES,
+               max_pixels=MAX_IMAGE_PIXELS, max_decode_bytes=MAX_DECODE_BYTES):
+    """Decode a path or file-like image to RGB with its longest side at most max_side.
+
+    Raises UploadRejected before decoding if the file, its pixel count or the
+    buffer needed to decode it is over budget.
+    """
+    check_upload_size(source, max_bytes)
+
+    try:
+        image = Image.open(source)  # reads the header only
+    except Image.DecompressionBombError as e:
+        raise UploadRejected(str(e)) from e
+    except (OSError, SyntaxError) as e:
+        raise UploadRejected(f"Not a readable image: {e}") from e
+
+    width, height = image.size
+    if width * height > max_pixels:
+        raise UploadRejected(f"Image is {width}x{height} ({width * height / 1e6:.0f} MP); "
+                             f"the limit is {max_pixels / 1e6:.0f} MP")
+
+    if image.format == 'JPEG':
+        # Grayscale scans stay single-channel while decoding
+        image.draft('L' if image.mode == 'L' else 'RGB', (max_side, max_side))
+
+    decode_bytes = image.size[0] * image.size[1] * _bytes_per_pixel(image.mode)
+    if decode_bytes > max_decode_bytes:
+        raise UploadRejected(f"Decoding this image needs {decode_bytes / 1024 / 1024:.0f} MB; "
+                             f"the limit is {max_decode_bytes / 1024 / 1024:.0f} MB")
+
+    try:
+        image.load()
+    except (OSError, SyntaxError) as e:
+        raise UploadRejected(f"Image data is corrupt or truncated: {e}") from e
+
+    if max(image.size) > max_side:
+        # Integer box reduction first (cheap, frees the full buffer), then an exact resample
+        factor = max(image.size) // max_side
+        if factor > 1:
+            image = image.reduce(factor)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    return image.convert('RGB')
+
+
+def _synthetic_upload(side, fmt):
+    import numpy as np
+
+    # Smooth gradient plus noise, roughly the compressibility of a real scan
+    ramp = np.linspace(0, 255, side, dtype=np.float32)
+    pixels = (ramp[None, :] * 0.5 + ramp[:, None] * 0.3 + np.random.rand(side, side) * 50).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).convert('RGB').save(buffer, format=fmt, quality=90)
+    return buffer.getvalue()
+
+
+def _measure(path, naive):
+    """Decode one file in a fresh process; returns (ms, peak RSS growth in MB)."""
+    import resource
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if naive:
+        Image.MAX_IMAGE_PIXELS = None
+        Image.open(path).convert('RGB')
+    else:
+        load_image(path, max_bytes=float('inf'), max_pixels=float('inf'), max_decode_bytes=float('inf'))
+    elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024
+
+
+def benchmark(sizes, formats=('JPEG', 'PNG'), workdir='cache'):
+    """Compare full-resolution decoding with load_image on large synthetic uploads."""
+    os.makedirs(workdir, exist_ok=True)
+    rows = []
+    for fmt in formats:
+        for side in sizes:
+            path = os.path.join(workdir, f'ingest_bench_{side}.{fmt.lower()}')
+            with open(path, 'wb') as f:
+                f.write(_synthetic_upload(side, fmt))
+            row = {'format': fmt, 'side': side, 'file_mb': os.path.getsize(path) / 1024 / 1024}
+            for key, naive in (('full', True), ('capped', False)):
+                # A new process per measurement so ru_maxrss reflects only this decode
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    row[f'{key}_ms'], row[f'{key}_peak_mb'] = pool.submit(_measure, path, naive).result()
+            os.remove(path)
+            rows.append(row)
+
+    print(f"\n{'format':<7}{'side':>6}{'file MB':>9}{'full ms':>10}{'full MB':>9}{'capped ms':>11}{'capped MB':>11}")
+    for row in rows:
+        print(f"{row['format']:<7}{row['side']:>6}{row['file_mb']:>9.1f}{row['full_ms']:>10.1f}{row['full_peak_mb']:>9.1f}"
+              f"{row['capped_ms']:>11.1f}{row['capped_peak_mb']:>11.1f}")
+
+    rejected = []
+    for side in sizes:
+        data = _synthetic_upload(side, 'PNG')
+        try:
+            load_image(io.BytesIO(data))
+        except UploadRejected as e:
+            rejected.append(f"{side}x{side} PNG: {e}")
+    if rejected:
+        print("\nRejected with the default budgets:")
+        print('\n'.join(f"  {line}" for line in rejected))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark capped image ingestion on large synthetic uploads")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1024, 4096, 8192], help="Image side lengths")
+    parser.add_argument('--formats', nargs='+', default=['JPEG', 'PNG'])
+    args = parser.parse_args()
+    benchmark(args.sizes, args.formats)
+
+
+if __name__ == '__main__':
+    main()
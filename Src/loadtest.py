@@ -0,0 +1,434 @@
+"""
+Offline load test of the login, analyze and chat flows.
+Simulated clinicians run in threads of one process, as Streamlit sessions do:
+each logs in (AuthSystem.login_user + a signed session), analyzes a scan
+(ingest, preprocess, predict, result chart, history) and asks the chatbot a few
+questions. The chatbot talks to a local fake Gemini REST server with a
+configurable latency, so nothing leaves the machine. Everything is written to a
+scratch database. Each concurrency level reports throughput, latency
+percentiles and error rates per flow, plus the process RSS over time and its
+growth, and the full results go to reports/loadtest.json.
+
+Usage:
+    python Src/loadtest.py --users 1 8 32 --duration 60
+    python Src/loadtest.py --users 64 --flows login chat --llm-latency-ms 1500
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+from model_specs import CLASS_NAMES, LABELS
+
+FLOWS = ('login', 'analyze', 'chat')
+QUESTIONS = [
+    "What are the early signs of Alzheimer's disease?",
+    "How is Alzheimer's diagnosed?",
+    "What does my result mean for my family?",
+    "Are there treatments that slow the disease down?",
+    "How reliable is an AI prediction from one MRI slice?",
+]
+FAKE_REPLY = ("This is a placeholder answer from the offline load-test server. It stands in for a Gemini "
+              "response of typical length so that prompt building, streaming and history handling do "
+              "the same amount of work as in production. ") * 3
+# get_response() turns LLM failures into this apology instead of raising
+CHAT_ERROR_PREFIX = "I apologize, but I encountered an error"
+
+
+def rss_mb():
+    """Current resident set size of this process in MB."""
+    if PSUTIL_AVAILABLE:
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+class FakeGemini:
+    """Local stand-in for the Gemini REST API (generateContent and streamGenerateContent)."""
+
+    def __init__(self, latency_ms=800, chunks=8, error_rate=0.0, port=0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                fake.requests += 1
+                if random.random() < fake.error_rate:
+                    self.send_error(500, "Simulated failure")
+                    return
+                stream = ':streamGenerateContent' in self.path
+                words = FAKE_REPLY.split(' ')
+                step = max(len(words) // fake.chunks, 1)
+                parts = [' '.join(words[i:i + step]) + ' ' for i in range(0, len(words), step)]
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                if not stream:
+                    time.sleep(fake.latency_ms / 1000)
+                    self.wfile.write(json.dumps(_response(''.join(parts))).encode())
+                    return
+                # A JSON array written element by element, which is what the REST client parses
+                self.wfile.write(b'[')
+                for i, part in enumerate(parts):
+                    time.sleep(fake.latency_ms / 1000 / len(parts))
+                    self.wfile.write((',' if i else '').encode() + json.dumps(_response(part)).encode())
+                    self.wfile.flush()
+                self.wfile.write(b']')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.latency_ms = latency_ms
+        self.chunks = chunks
+        self.error_rate = error_rate
+        self.requests = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, name='fake-gemini', daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _response(text):
+    return {'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'},
+                            'finishReason': 'STOP', 'index': 0}]}
+
+
+class Recorder:
+    """Thread-safe latency and error samples per flow."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {flow: [] for flow in FLOWS}
+        self.errors = {flow: 0 for flow in FLOWS}
+        self.last_error = {}
+
+    def record(self, flow, seconds, error=None):
+        with self._lock:
+            if error is None:
+                self.latencies[flow].append(seconds * 1000)
+            else:
+                self.errors[flow] += 1
+                self.last_error[flow] = error
+
+    def summary(self, elapsed):
+        rows = []
+        for flow in FLOWS:
+            ok = sorted(self.latencies[flow])
+            total = len(ok) + self.errors[flow]
+            if not total:
+                continue
+            rows.append({
+                'flow': flow, 'requests': total, 'errors': self.errors[flow],
+                'error_rate': self.errors[flow] / total, 'throughput': total / elapsed,
+                'p50_ms': percentile(ok, 0.50), 'p90_ms': percentile(ok, 0.90),
+                'p99_ms': percentile(ok, 0.99), 'max_ms': ok[-1] if ok else 0.0,
+                'last_error': self.last_error.get(flow),
+            })
+        return rows
+
+
+class MemorySampler:
+    """Background sampler of process RSS."""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self.samples.append((time.perf_counter() - self._start, rss_mb()))
+            if self._stop.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.samples.append((time.perf_counter() - self._start, rss_mb()))
+        return self.samples
+
+
+def growth_mb_per_min(samples):
+    """Least-squares slope of RSS over time, ignoring the first third (warm-up)."""
+    points = samples[len(samples) // 3:]
+    if len(points) < 2:
+        return 0.0
+    mean_t = sum(t for t, _ in points) / len(points)
+    mean_m = sum(m for _, m in points) / len(points)
+    var = sum((t - mean_t) ** 2 for t, _ in points)
+    if not var:
+        return 0.0
+    return sum((t - mean_t) * (m - mean_m) for t, m in points) / var * 60
+
+
+class Environment:
+    """Everything a simulated clinician needs, built once per load-test run."""
+
+    def __init__(self, workdir, flows, model_name, llm):
+        import auth
+        from history import HistoryStore
+        from sessions import SessionStore
+
+        # Scratch database: AuthSystem and its event log read auth.DB_PATH at call time
+        auth.DB_PATH = os.path.join(workdir, 'users.db')
+        self.auth = auth.AuthSystem()
+        self.sessions = SessionStore(db_path=auth.DB_PATH)
+        self.history = HistoryStore(auth.DB_PATH)
+        self.flows = list(flows)
+        self.model_name = model_name
+        self.single = None
+        self.images = sample_images()
+
+        if 'analyze' in self.flows:
+            try:
+                from inference import load_single
+                self.single = load_single(model_name)
+            except Exception as e:
+                print(f"⚠️ Analyze flow disabled, model '{model_name}' could not be loaded: {e}")
+                self.flows.remove('analyze')
+        if 'chat' in self.flows:
+            os.environ['GEMINI_API_ENDPOINT'] = llm.endpoint
+            os.environ.setdefault('GEMINI_API_KEY', 'offline-load-test')
+            try:
+                import chatbot
+                chatbot.GEMINI_API_ENDPOINT = llm.endpoint
+            except ImportError as e:
+                print(f"⚠️ Chat flow disabled: {e}")
+                self.flows.remove('chat')
+
+    def register(self, username, password):
+        ok, message = self.auth.register_user(username, f"{username}@loadtest.local", password, username)
+        if not ok:
+            raise RuntimeError(message)
+
+    def close(self):
+        self.history.close()
+        self.auth.events.close()
+
+
+def sample_images(per_class=5, sample_dir='train'):
+    """A few training images per class, or synthetic scans when the dataset is not present."""
+    paths = []
+    for name in CLASS_NAMES:
+        folder = os.path.join(sample_dir, name)
+        if os.path.isdir(folder):
+            files = sorted(f for f in os.listdir(folder) if f.endswith(('.jpg', '.jpeg', '.png')))
+            paths += [os.path.join(folder, f) for f in files[:per_class]]
+    if paths:
+        return paths
+    from PIL import Image, ImageDraw
+    images = []
+    for i in range(per_class):
+        image = Image.new('L', (176, 208))
+        ImageDraw.Draw(image).ellipse((20 + i, 20, 156 - i, 188), fill=90 + 20 * i)
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG')
+        images.append(buffer.getvalue())
+    return images
+
+
+def login_flow(env, username, password):
+    ok, user = env.auth.login_user(username, password)
+    if not ok:
+        raise RuntimeError(user)
+    token = env.sessions.issue(user)
+    if env.sessions.validate(token) is None:
+        raise RuntimeError("Fresh session token did not validate")
+    return user
+
+
+def analyze_flow(env, user, source):
+    """The Analyze page for one upload: ingest, preprocess, predict, chart, history."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import torch
+    from history import image_hash
+    from ingest import load_image
+    from models import build_transform
+    from session_memory import compress_image, decompress_image
+
+    image_bytes = compress_image(load_image(io.BytesIO(source) if isinstance(source, bytes) else source))
+    tensor = build_transform(env.model_name)(decompress_image(image_bytes)).unsqueeze(0)
+    single = env.single
+    with single.lock, torch.no_grad():
+        probs = torch.nn.functional.softmax(single.model(tensor), dim=1)[0].numpy()
+        if single.grad_cam:
+            single.grad_cam.pop_activation()
+        if single.embedding_hook:
+            single.embedding_hook.pop()
+    label_idx = int(probs.argmax())
+    probabilities = {LABELS[i]: float(p) for i, p in enumerate(probs)}
+
+    fig, ax = plt.subplots(figsize=(8, 3.5))
+    ax.barh(LABELS, probs, height=0.5)
+    fig.savefig(io.BytesIO(), format='png')
+    plt.close(fig)
+
+    env.history.add(user['id'], image_hash(image_bytes), env.model_name, LABELS[label_idx], probabilities)
+    return LABELS[label_idx], probabilities
+
+
+def chat_flow(bot, question):
+    reply = bot.get_response(question)
+    if reply.startswith(CHAT_ERROR_PREFIX):
+        raise RuntimeError(reply)
+
+
+def _timed(recorder, flow, fn, *args):
+    start = time.perf_counter()
+    try:
+        result = fn(*args)
+    except Exception as e:
+        recorder.record(flow, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+        return None
+    recorder.record(flow, time.perf_counter() - start)
+    return result
+
+
+def simulate_user(env, recorder, index, stop, questions, think_ms):
+    """One clinician: log in, analyze a scan, ask a few questions, repeat until stopped."""
+    rng = random.Random(index)
+    username, password = f"loadtest_{index}", f"password-{index}"
+    bot = None
+    if 'chat' in env.flows:
+        from chatbot import AlzheimerChatbot
+        bot = AlzheimerChatbot()
+
+    def think():
+        return stop.wait(rng.expovariate(1000 / think_ms) if think_ms else 0)
+
+    while not stop.is_set():
+        user = _timed(recorder, 'login', login_flow, env, username, password)
+        if user is None or think():
+            continue
+        if env.single is not None:
+            result = _timed(recorder, 'analyze', analyze_flow, env, user, rng.choice(env.images))
+            if result and bot:
+                bot.set_prediction_context(*result)
+            if think():
+                break
+        for _ in range(questions if bot else 0):
+            _timed(recorder, 'chat', chat_flow, bot, rng.choice(QUESTIONS))
+            if think():
+                break
+
+
+def run_level(env, users, duration, ramp_up, questions, think_ms):
+    """Run `users` simulated clinicians for `duration` seconds; returns the level's results."""
+    recorder = Recorder()
+    stop = threading.Event()
+    sampler = MemorySampler()
+    threads = []
+    start = time.perf_counter()
+    for i in range(users):
+        thread = threading.Thread(target=simulate_user, name=f'user-{i}', daemon=True,
+                                  args=(env, recorder, i, stop, questions, think_ms))
+        thread.start()
+        threads.append(thread)
+        time.sleep(ramp_up / users)
+    stop.wait(max(duration - (time.perf_counter() - start), 0))
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    samples = sampler.stop()
+    return {
+        'users': users, 'elapsed_s': elapsed, 'flows': recorder.summary(elapsed),
+        'rss_start_mb': samples[0][1], 'rss_end_mb': samples[-1][1],
+        'rss_peak_mb': max(m for _, m in samples), 'rss_growth_mb_per_min': growth_mb_per_min(samples),
+        'rss_samples': [(round(t, 2), round(m, 1)) for t, m in samples],
+    }
+
+
+def print_level(level):
+    print(f"\n{level['users']} concurrent users, {level['elapsed_s']:.0f}s")
+    print(f"{'flow':<9}{'requests':>10}{'errors':>8}{'err %':>7}{'req/s':>8}"
+          f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for row in level['flows']:
+        print(f"{row['flow']:<9}{row['requests']:>10}{row['errors']:>8}{row['error_rate']:>7.1%}"
+              f"{row['throughput']:>8.1f}{row['p50_ms']:>9.1f}{row['p90_ms']:>9.1f}"
+              f"{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+    for row in level['flows']:
+        if row['last_error']:
+            print(f"❌ last {row['flow']} error: {row['last_error'][:200]}")
+    print(f"RSS {level['rss_start_mb']:.0f} -> {level['rss_end_mb']:.0f} MB "
+          f"(peak {level['rss_peak_mb']:.0f} MB, {level['rss_growth_mb_per_min']:+.1f} MB/min after warm-up)")
+
+
+def run(users_levels, duration, flows=FLOWS, model_name='efficientnet', ramp_up=5.0, questions=3,
+        think_ms=500, llm_latency_ms=800, llm_error_rate=0.0, output='reports/loadtest.json'):
+    """Run every concurrency level against one scratch environment and write the report."""
+    workdir = tempfile.mkdtemp(prefix='loadtest_')
+    llm = FakeGemini(llm_latency_ms, error_rate=llm_error_rate)
+    try:
+        env = Environment(workdir, flows, model_name, llm)
+        for i in range(max(users_levels)):
+            env.register(f"loadtest_{i}", f"password-{i}")
+        print(f"✅ {max(users_levels)} test users in {workdir}, fake Gemini at {llm.endpoint}, "
+              f"flows: {', '.join(env.flows)}")
+
+        levels = []
+        for users in users_levels:
+            levels.append(run_level(env, users, duration, min(ramp_up, duration / 2), questions, think_ms))
+            print_level(levels[-1])
+        env.close()
+    finally:
+        llm.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'settings': {'duration_s': duration, 'flows': list(flows), 'model': model_name,
+                                'think_ms': think_ms, 'questions': questions,
+                                'llm_latency_ms': llm_latency_ms, 'llm_error_rate': llm_error_rate},
+                   'levels': levels}, f, indent=2)
+    print(f"\n📈 Report written to {output}")
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the login, analyze and chat flows")
+    parser.add_argument('--users', nargs='+', type=int, default=[1, 8, 32], help="Concurrency levels to run")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds per concurrency level")
+    parser.add_argument('--flows', nargs='+', choices=FLOWS, default=list(FLOWS))
+    parser.add_argument('--model', default=os.getenv("MODEL_NAME", "efficientnet"))
+    parser.add_argument('--ramp-up', type=float, default=5.0, help="Seconds over which users are started")
+    parser.add_argument('--questions', type=int, default=3, help="Chat questions per analysis")
+    parser.add_argument('--think-ms', type=float, default=500, help="Mean pause between a user's actions")
+    parser.add_argument('--llm-latency-ms', type=float, default=800, help="Fake Gemini response time")
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help="Fraction of fake Gemini calls that fail")
+    parser.add_argument('--output', default='reports/loadtest.json')
+    args = parser.parse_args()
+    run(args.users, args.duration, args.flows, args.model, args.ramp_up, args.questions,
+        args.think_ms, args.llm_latency_ms, args.llm_error_rate, args.output)
+
+
+if __name__ == '__main__':
+    main()
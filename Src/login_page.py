@@ -2,8 +2,16 @@
 Page de Login et Register pour l'application Alzheimer Detection
 """
 
+import json
+from http.cookies import SimpleCookie
+
 import streamlit as st
-from auth import AuthSystem
+import streamlit.components.v1 as components
+from auth import DB_PATH, AuthSystem
+from sessions import get_session_store
+
+# Cookie du jeton de session (jamais dans l'URL : historique, liens partagés, journaux, en-têtes Referer)
+SESSION_COOKIE = 'alz_session'
 
 # Couleurs du thème
 COLORS = {
@@ -150,6 +158,10 @@ def render_login_page():
                         # Stocker les données utilisateur dans la session
                         st.session_state.logged_in = True
                         st.session_state.user_data = result
+                        # Jeton signé dans un cookie : un rafraîchissement ne redemande pas le mot de passe
+                        token = get_session_store(DB_PATH).issue(result)
+                        st.session_state.session_token = token
+                        st.session_state.cookie_pending = True
                         st.success(f"✅ Bienvenue, {result['full_name']} !")
                         st.balloons()
                         # Forcer le rechargement
@@ -232,14 +244,80 @@ def render_user_profile():
         """, unsafe_allow_html=True)
         
         if st.sidebar.button("🚪 Déconnexion", use_container_width=True):
-            # Nettoyer la session
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
+            logout()
             st.rerun()
 
 
+def logout():
+    """Révoque la session côté serveur et efface les données de l'utilisateur."""
+    user = st.session_state.get('user_data')
+    token = st.session_state.get('session_token')
+    if token:
+        get_session_store(DB_PATH).revoke(token)
+    if user:
+        AuthSystem().logout_user(user)
+    # Le cookie est effacé au prochain affichage de la page de connexion
+    st.session_state.clear_cookie = True
+    # Données de l'utilisateur (analyses, chat, jeton) ; les préférences d'affichage sont conservées
+    for key in list(st.session_state.keys()):
+        if key not in PRESERVED_KEYS:
+            del st.session_state[key]
+
+
+# Clés d'interface conservées à la déconnexion
+PRESERVED_KEYS = ('auth_tab', 'clear_cookie')
+
+
+def _read_cookie():
+    """Jeton du cookie de session envoyé par le navigateur à l'ouverture de la page, sinon None."""
+    context = getattr(st, 'context', None)
+    if context is not None and hasattr(context, 'cookies'):
+        return context.cookies.get(SESSION_COOKIE)
+    try:
+        # Streamlit < 1.37 : en-têtes de la connexion websocket de cette session
+        from streamlit.web.server.websocket_headers import _get_websocket_headers
+        headers = _get_websocket_headers() or {}
+    except ImportError:
+        return None
+    morsel = SimpleCookie(headers.get('Cookie', '')).get(SESSION_COOKIE)
+    return morsel.value if morsel else None
+
+
+def _write_cookie(token, max_age):
+    """Pose (ou efface avec max_age=0) le cookie de session dans le navigateur."""
+    value = json.dumps(f"{SESSION_COOKIE}={token}; path=/; max-age={int(max_age)}; SameSite=Strict")
+    components.html(f"""<script>
+        const secure = window.parent.location.protocol === 'https:' ? '; Secure' : '';
+        window.parent.document.cookie = {value} + secure;
+    </script>""", height=0)
+
+
 def check_authentication():
-    """Vérifie si l'utilisateur est connecté."""
+    """Vérifie si l'utilisateur est connecté (jeton de session validé à chaque chargement)."""
+    store = get_session_store(DB_PATH)
+    if 'session' in st.query_params:
+        # Anciens liens contenant le jeton : il n'est plus accepté depuis l'URL
+        del st.query_params['session']
+    cookie_token = _read_cookie()
+    token = st.session_state.get('session_token') or cookie_token
+    user = store.validate(token) if token else None
+    
+    if user:
+        # Rafraîchissement de la page ou nouvel onglet : session restaurée sans mot de passe
+        st.session_state.logged_in = True
+        st.session_state.user_data = user
+        st.session_state.session_token = token
+        if st.session_state.pop('cookie_pending', False):
+            _write_cookie(token, store.ttl)
+    elif st.session_state.get('logged_in', False):
+        # Session expirée ou révoquée (éventuellement par un autre processus)
+        logout()
+    elif cookie_token:
+        # Cookie d'une session expirée ou révoquée
+        st.session_state.clear_cookie = True
+    
     if not st.session_state.get('logged_in', False):
+        if st.session_state.pop('clear_cookie', False):
+            _write_cookie('', 0)
         render_login_page()
         st.stop()
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""
+Prometheus metrics for inference, authentication and chatbot latency.
+Metrics are served on a local HTTP endpoint (METRICS_PORT, default 9464) so
+latency regressions can be scraped and alerted on.
+If prometheus-client is not installed every metric becomes a no-op.
+"""
+
+import functools
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import Counter, Histogram, start_http_server
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9464))
+
+# Buckets tuned for CPU inference (tens of ms) up to LLM calls (several seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _NoOpMetric:
+    """Stand-in used when prometheus-client is missing."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    @contextmanager
+    def time(self):
+        yield
+
+
+def _histogram(name, documentation, labelnames=()):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoOpMetric()
+    return Histogram(name, documentation, labelnames, buckets=LATENCY_BUCKETS)
+
+
+def _counter(name, documentation, labelnames=()):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoOpMetric()
+    return Counter(name, documentation, labelnames)
+
+
+# Inference
+PREPROCESS_SECONDS = _histogram('alzheimer_preprocess_seconds', 'Image preprocessing latency')
+FORWARD_SECONDS = _histogram('alzheimer_forward_seconds', 'Model forward pass latency', ['mode'])
+RENDER_SECONDS = _histogram('alzheimer_render_seconds', 'Result chart rendering latency')
+MODEL_LOAD_SECONDS = _histogram('alzheimer_model_load_seconds', 'Model checkpoint load time', ['model'])
+PREDICTIONS_TOTAL = _counter('alzheimer_predictions_total', 'Predictions per class', ['label'])
+
+# Authentication
+LOGIN_SECONDS = _histogram('alzheimer_login_seconds', 'End-to-end login latency', ['outcome'])
+DB_OPERATION_SECONDS = _histogram('alzheimer_db_operation_seconds', 'SQLite operation time', ['operation'])
+
+# Chatbot
+LLM_REQUEST_SECONDS = _histogram('alzheimer_llm_request_seconds', 'LLM call latency', ['method'])
+LLM_ERRORS_TOTAL = _counter('alzheimer_llm_errors_total', 'Failed LLM calls', ['method'])
+# Coalescing ratio = follower / (leader + follower)
+LLM_COALESCED_TOTAL = _counter('alzheimer_llm_coalesced_total',
+                               'Chatbot requests by single-flight role (leader, follower, timeout)', ['method', 'role'])
+
+# Sessions
+SESSION_EVICTIONS_TOTAL = _counter('alzheimer_session_evictions_total',
+                                   'Session state dropped to stay under the per-session budget', ['key'])
+
+# Browser payload
+IMAGE_PAYLOAD_BYTES_TOTAL = _counter('alzheimer_image_payload_bytes_total',
+                                     'Image bytes sent to the browser by st.image', ['kind'])
+
+_server_started = False
+
+
+def start_metrics_server(port=METRICS_PORT):
+    """Start the /metrics HTTP endpoint once per process; safe to call on every rerun."""
+    global _server_started
+    if _server_started or not (METRICS_ENABLED and PROMETHEUS_AVAILABLE):
+        return
+    try:
+        start_http_server(port)
+        print(f"📈 Metrics served on http://localhost:{port}/metrics")
+    except OSError as e:
+        # Another worker process on this host already owns the port
+        print(f"Metrics endpoint not started on port {port}: {e}")
+    _server_started = True
+
+
+def timed(histogram):
+    """Decorator recording a function's duration in a histogram (or labelled child)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with observe_seconds(histogram):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def observe_seconds(histogram):
+    """Time a block with perf_counter and record it, including when it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start)
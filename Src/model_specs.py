@@ -0,0 +1,94 @@
+"""
+Static description of the registered models (no torch import).
+Kept separate from models.py so the app can read names, labels and checkpoint
+paths before the heavy deep-learning stack is loaded.
+"""
+
+import os
+
+# ImageFolder sorts class folders alphabetically, so indices follow this order
+CLASS_NAMES = ["Mild_Impairment", "Moderate Impairment", "No Impairment", "Very Mild Impairment"]
+LABELS = ["Mild Alzheimer's", "Moderate Alzheimer's", "Non-demented", "Very Mild Alzheimer's"]
+NUM_CLASSES = len(LABELS)
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+CHECKPOINT_DIR = 'Src'
+# Memory-mapped conversions written by `python Src/checkpoints.py convert` next to each .pth
+SAFETENSORS_SUFFIX = '.safetensors'
+
+# Teachers ordered from cheapest to most expensive; the distilled student comes last
+MODEL_SPECS = {
+    'efficientnet': {
+        'checkpoint': 'alzheimer_efficientnet_model.pth',
+        'display_name': 'EfficientNet-B0',
+        'num_outputs': NUM_CLASSES,
+        'resize': 256,
+        'image_size': 224,
+        'in_channels': 3,
+    },
+    'resnet50': {
+        'checkpoint': 'alzheimer_cnn_model.pth',
+        'display_name': 'ResNet-50',
+        'num_outputs': NUM_CLASSES,
+        'resize': 256,
+        'image_size': 224,
+        'in_channels': 3,
+    },
+    'deit': {
+        'checkpoint': 'alzheimer_vit_model.pth',
+        'display_name': 'DeiT-Base',
+        # The notebook fine-tuned DeiT without replacing its 1000-way ImageNet head
+        'num_outputs': 1000,
+        'resize': 256,
+        'image_size': 224,
+        'in_channels': 3,
+    },
+    'efficientnet_pruned': {
+        'checkpoint': 'alzheimer_efficientnet_pruned.pth',
+        'display_name': 'EfficientNet-B0 (channel-pruned)',
+        'num_outputs': NUM_CLASSES,
+        'resize': 256,
+        'image_size': 224,
+        'in_channels': 3,
+        # Written by pruning.py; layer widths are read from the checkpoint
+        'pruned_from': 'efficientnet',
+    },
+    'student': {
+        'checkpoint': 'alzheimer_student_model.pth',
+        'display_name': 'Student CNN (128px, grayscale)',
+        'num_outputs': NUM_CLASSES,
+        'resize': 146,
+        'image_size': 128,
+        'in_channels': 1,
+    },
+}
+
+TEACHERS = ['efficientnet', 'resnet50', 'deit']
+
+
+def checkpoint_path(name):
+    """Return the default checkpoint path for a registered model."""
+    return os.path.join(CHECKPOINT_DIR, MODEL_SPECS[name]['checkpoint'])
+
+
+def safetensors_path(path):
+    """Path of the converted safetensors file for a .pth checkpoint."""
+    return os.path.splitext(path)[0] + SAFETENSORS_SUFFIX
+
+
+def resolve_checkpoint(path):
+    """The file to load for a checkpoint: its safetensors conversion if present and up to date."""
+    converted = safetensors_path(path)
+    if path.endswith(SAFETENSORS_SUFFIX) or not os.path.exists(converted):
+        return path
+    if os.path.exists(path) and os.path.getmtime(path) > os.path.getmtime(converted):
+        # Retrained since the conversion
+        return path
+    return converted
+
+
+def available_models():
+    """Names of registered models whose checkpoint exists on disk."""
+    return [name for name in MODEL_SPECS if os.path.exists(resolve_checkpoint(checkpoint_path(name)))]
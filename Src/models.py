@@ -0,0 +1,167 @@
+"""
+Model registry for the Alzheimer's detection app.
+Builds the architectures trained in the notebook and loads their checkpoints.
+Static metadata lives in model_specs.py and is re-exported here.
+"""
+
+import torch
+from torch import nn
+from torchvision import models, transforms
+from efficientnet_pytorch import EfficientNet
+
+from checkpoints import load_state_dict
+from model_specs import (CHECKPOINT_DIR, CLASS_NAMES, IMAGENET_MEAN, IMAGENET_STD, LABELS, MODEL_SPECS,
+                         NUM_CLASSES, SAFETENSORS_SUFFIX, TEACHERS, available_models, checkpoint_path,
+                         resolve_checkpoint)
+
+
+class ClassSubset(nn.Module):
+    """Keep only the first `num_classes` logits of a model with a wider head."""
+
+    def __init__(self, model, num_classes=NUM_CLASSES):
+        super().__init__()
+        self.model = model
+        self.num_classes = num_classes
+
+    def forward(self, x):
+        return self.model(x)[:, :self.num_classes]
+
+
+class StudentNet(nn.Module):
+    """Small depthwise-separable CNN distilled from the large models for CPU serving."""
+
+    def __init__(self, in_channels=1, width=16, num_classes=NUM_CLASSES):
+        super().__init__()
+
+        def separable(c_in, c_out, stride):
+            return nn.Sequential(
+                nn.Conv2d(c_in, c_in, 3, stride=stride, padding=1, groups=c_in, bias=False),
+                nn.BatchNorm2d(c_in),
+                nn.ReLU(inplace=True),
+                nn.Conv2d(c_in, c_out, 1, bias=False),
+                nn.BatchNorm2d(c_out),
+                nn.ReLU(inplace=True),
+            )
+
+        self.features = nn.Sequential(
+            nn.Conv2d(in_channels, width, 3, stride=2, padding=1, bias=False),
+            nn.BatchNorm2d(width),
+            nn.ReLU(inplace=True),
+            separable(width, width * 2, 2),
+            separable(width * 2, width * 4, 2),
+            separable(width * 4, width * 8, 2),
+            separable(width * 8, width * 8, 1),
+        )
+        self.pool = nn.AdaptiveAvgPool2d(1)
+        self.classifier = nn.Sequential(nn.Dropout(0.2), nn.Linear(width * 8, num_classes))
+
+    def forward(self, x):
+        x = self.pool(self.features(x)).flatten(1)
+        return self.classifier(x)
+
+
+def _build_efficientnet():
+    # from_name avoids downloading ImageNet weights that the checkpoint overwrites anyway
+    return EfficientNet.from_name('efficientnet-b0', num_classes=NUM_CLASSES)
+
+
+def _build_resnet50():
+    model = models.resnet50(weights=None)
+    model.fc = nn.Linear(model.fc.in_features, NUM_CLASSES)
+    return model
+
+
+def _build_deit():
+    import timm
+    return timm.create_model('deit_base_patch16_224', pretrained=False,
+                             num_classes=MODEL_SPECS['deit']['num_outputs'])
+
+
+_BUILDERS = {
+    'efficientnet': _build_efficientnet,
+    'resnet50': _build_resnet50,
+    'deit': _build_deit,
+    'efficientnet_pruned': _build_efficientnet,
+    'student': lambda: StudentNet(in_channels=1, width=16),
+}
+
+
+def build_model(name):
+    """Untrained instance of a registered architecture."""
+    return _BUILDERS[name]()
+
+
+def build_transform(name='efficientnet'):
+    """Evaluation transform matching the input size of a registered model."""
+    spec = MODEL_SPECS[name]
+    steps = [transforms.Resize(spec['resize']), transforms.CenterCrop(spec['image_size'])]
+    if spec['in_channels'] == 1:
+        steps.append(transforms.Grayscale(num_output_channels=1))
+        mean, std = [sum(IMAGENET_MEAN) / 3], [sum(IMAGENET_STD) / 3]
+    else:
+        mean, std = IMAGENET_MEAN, IMAGENET_STD
+    steps += [transforms.ToTensor(), transforms.Normalize(mean=mean, std=std)]
+    return transforms.Compose(steps)
+
+
+def set_tensor(module, name, value):
+    """Replace a parameter or buffer, keeping its kind (used to resize layers of pruned models)."""
+    if isinstance(getattr(module, name), nn.Parameter):
+        setattr(module, name, nn.Parameter(value, requires_grad=getattr(module, name).requires_grad))
+    else:
+        module.register_buffer(name, value)
+
+
+def sync_shape(module):
+    """Update a layer's size attributes after its weight tensor changed shape."""
+    shape = module.weight.shape
+    if isinstance(module, nn.Conv2d):
+        if module.groups > 1 and module.groups == module.in_channels:
+            module.groups = module.in_channels = shape[0]
+        else:
+            module.in_channels = shape[1] * module.groups
+        module.out_channels = shape[0]
+    elif isinstance(module, nn.BatchNorm2d):
+        module.num_features = shape[0]
+    elif isinstance(module, nn.Linear):
+        module.out_features, module.in_features = shape
+
+
+def match_shapes(model, state_dict):
+    """Resize a freshly built model's layers to the tensor shapes of a pruned checkpoint."""
+    for prefix, module in model.named_modules():
+        if not isinstance(module, (nn.Conv2d, nn.BatchNorm2d, nn.Linear)):
+            continue
+        weight = state_dict.get(f'{prefix}.weight')
+        if weight is None or weight.shape == module.weight.shape:
+            continue
+        for name in ('weight', 'bias', 'running_mean', 'running_var'):
+            current, saved = getattr(module, name, None), state_dict.get(f'{prefix}.{name}')
+            if current is not None and saved is not None:
+                set_tensor(module, name, torch.empty(saved.shape, dtype=current.dtype, device=current.device))
+        sync_shape(module)
+    return model
+
+
+def load_model(name, path=None, device='cpu'):
+    """Build a registered architecture, load its weights and switch to eval mode.
+
+    Without an explicit path, an up-to-date safetensors conversion of the default
+    checkpoint is preferred: its memory-mapped tensors become the model's
+    parameters without being copied.
+    """
+    spec = MODEL_SPECS[name]
+    path = path or resolve_checkpoint(checkpoint_path(name))
+    state_dict = load_state_dict(path, device)
+    mapped = path.endswith(SAFETENSORS_SUFFIX)
+    # Memory-mapped weights are assigned, so the model is built on the meta device (no random initialisation)
+    with torch.device('meta' if mapped else 'cpu'):
+        model = build_model(name)
+    if spec.get('pruned_from'):
+        match_shapes(model, state_dict)
+    model.load_state_dict(state_dict, assign=mapped)
+    if spec['num_outputs'] != NUM_CLASSES:
+        model = ClassSubset(model)
+    model.to(device)
+    model.eval()
+    return model
@@ -0,0 +1,171 @@
+"""
+Cached, size-capped previews for images shown in the browser.
+Streamlit re-sends every st.image payload on each rerun, so the Analyze page
+shows a small JPEG preview instead of the stored scan. A preview is encoded once
+per image, keyed by the SHA-256 of its bytes, and kept in a process-wide LRU
+cache under a byte budget, so every later rerun, and every session showing the
+same sample or similar case, reuses it.
+
+Usage:
+    python Src/previews.py bench
+"""
+
+import argparse
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+from history import image_hash
+from metrics import IMAGE_PAYLOAD_BYTES_TOTAL
+
+# Longest side of the Analyze page preview (the column is about this wide)
+PREVIEW_MAX_SIDE = int(os.getenv("PREVIEW_MAX_SIDE", 384))
+THUMBNAIL_MAX_SIDE = 160
+PREVIEW_QUALITY = int(os.getenv("PREVIEW_QUALITY", 80))
+PREVIEW_CACHE_BYTES = int(os.getenv("PREVIEW_CACHE_MB", 32)) * 1024 * 1024
+
+
+def encode_preview(data, max_side=PREVIEW_MAX_SIDE, quality=PREVIEW_QUALITY):
+    """Downscale encoded image bytes to max_side and re-encode them as JPEG.
+
+    Returns the original bytes when they are already smaller than the preview.
+    """
+    image = Image.open(io.BytesIO(data))
+    image.draft(image.mode, (max_side, max_side))
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    preview = buffer.getvalue()
+    return preview if len(preview) < len(data) else data
+
+
+class PreviewCache:
+    """LRU cache of encoded previews keyed by (content hash, max side), bounded in bytes."""
+
+    def __init__(self, budget_bytes=PREVIEW_CACHE_BYTES):
+        self.budget_bytes = budget_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # (path, mtime, size) -> content hash, so files are not re-read and re-hashed on each rerun
+        self._file_digests = {}
+        self._lock = threading.Lock()
+
+    def get(self, data, max_side=PREVIEW_MAX_SIDE, digest=None):
+        """Preview of encoded image bytes, encoded on the first request only."""
+        key = (digest or image_hash(data), max_side)
+        with self._lock:
+            preview = self._entries.get(key)
+            if preview is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return preview
+            self.misses += 1
+        preview = encode_preview(data, max_side)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = preview
+                self.size_bytes += len(preview)
+                while self.size_bytes > self.budget_bytes and len(self._entries) > 1:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.size_bytes -= len(evicted)
+        return preview
+
+    def get_file(self, path, max_side=THUMBNAIL_MAX_SIDE):
+        """Preview of an image file (samples, similar cases)."""
+        stat = os.stat(path)
+        file_key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._file_digests.get(file_key)
+            if digest is not None and (digest, max_side) in self._entries:
+                self._entries.move_to_end((digest, max_side))
+                self.hits += 1
+                return self._entries[(digest, max_side)]
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = image_hash(data)
+        with self._lock:
+            self._file_digests[file_key] = digest
+        return self.get(data, max_side, digest)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = PreviewCache()
+
+
+def preview(data, max_side=PREVIEW_MAX_SIDE):
+    """Cached preview of the stored scan; counts the bytes sent to the browser."""
+    result = _cache.get(data, max_side)
+    IMAGE_PAYLOAD_BYTES_TOTAL.labels('preview').inc(len(result))
+    return result
+
+
+def thumbnail(path, max_side=THUMBNAIL_MAX_SIDE):
+    """Cached thumbnail of an image file; counts the bytes sent to the browser."""
+    result = _cache.get_file(path, max_side)
+    IMAGE_PAYLOAD_BYTES_TOTAL.labels('thumbnail').inc(len(result))
+    return result
+
+
+def benchmark(sample_dir='train', per_class=10, reruns=20):
+    """Per-rerun payload and time: stored image vs cached preview, sample files vs thumbnails."""
+    from model_specs import CLASS_NAMES
+    from session_memory import compress_image
+
+    paths = []
+    for name in CLASS_NAMES:
+        folder = os.path.join(sample_dir, name)
+        if os.path.isdir(folder):
+            paths += [os.path.join(folder, f) for f in sorted(os.listdir(folder))[:per_class]]
+    if not paths:
+        print(f"❌ No sample images found in {sample_dir}/")
+        return
+    # A large upload as well, stored the way the app stores it
+    large = Image.radial_gradient('L').resize((2048, 2048))
+
+    cache = PreviewCache()
+    stored = [compress_image(Image.open(p)) for p in paths] + [compress_image(large)]
+    rows = []
+    for name, items, fn, raw_size in (
+        ('analyze preview', stored, lambda data: cache.get(data), len),
+        ('sample thumbnail', paths, lambda path: cache.get_file(path), os.path.getsize),
+    ):
+        raw = sum(raw_size(item) for item in items) / len(items)
+        start = time.perf_counter()
+        sent = sum(len(fn(item)) for item in items) / len(items)
+        cold = (time.perf_counter() - start) * 1000 / len(items)
+        start = time.perf_counter()
+        for _ in range(reruns):
+            for item in items:
+                fn(item)
+        warm = (time.perf_counter() - start) * 1000 / len(items) / reruns
+        rows.append((name, raw, sent, cold, warm))
+
+    print(f"{len(paths)} samples + one 2048x2048 upload, {reruns} reruns each\n")
+    print(f"{'image':<18}{'before KB':>11}{'after KB':>10}{'saved':>8}{'first ms':>10}{'rerun ms':>10}")
+    for name, raw, sent, cold, warm in rows:
+        print(f"{name:<18}{raw / 1024:>11.1f}{sent / 1024:>10.1f}{1 - sent / raw:>8.0%}{cold:>10.2f}{warm:>10.3f}")
+    print(f"\nCache: {len(cache)} previews, {cache.size_bytes / 1024:.0f} KB, "
+          f"{cache.hits} hits / {cache.misses} misses")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure preview payload sizes and cache reuse")
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('--samples', type=int, default=10, help="Sample images per class")
+    parser.add_argument('--reruns', type=int, default=20)
+    args = parser.parse_args()
+    benchmark(per_class=args.samples, reruns=args.reruns)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Opt-in profiling hooks for the inference and training hot paths.
+
+Controlled by environment variables (read once at import):
+    PROFILING=off|timer|torch   off (default): hooks are no-ops
+                                timer: per-stage wall-clock summaries
+                                torch: torch.profiler Chrome traces + per-operator tables
+    PROFILE_SAMPLE_RATE=0.05    fraction of requests / training steps that are recorded
+    PROFILE_DIR=profiles        where traces and summaries are written
+
+Usage:
+    with profiled_request('analyze'):
+        with stage('preprocess'):
+            ...
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+MODE = os.getenv("PROFILING", "off").lower()
+ENABLED = MODE in ("timer", "torch")
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.05))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+_NULL = nullcontext()
+_local = threading.local()
+
+
+def _output_path(name, suffix):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    return os.path.join(PROFILE_DIR, f"{name}_{stamp}_{os.getpid()}{suffix}")
+
+
+@contextmanager
+def _timer_request(name):
+    _local.stages = []
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        total = (time.perf_counter() - start) * 1000
+        summary = {'request': name, 'total_ms': total, 'stages': _local.stages}
+        _local.stages = None
+        with open(_output_path(name, '.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+@contextmanager
+def _torch_request(name):
+    from torch.profiler import ProfilerActivity, profile
+
+    with profile(activities=[ProfilerActivity.CPU], record_shapes=True, profile_memory=True) as prof:
+        _local.stages = []
+        try:
+            yield
+        finally:
+            _local.stages = None
+    prof.export_chrome_trace(_output_path(name, '.trace.json'))
+    with open(_output_path(name, '.ops.txt'), 'w') as f:
+        f.write(prof.key_averages().table(sort_by='self_cpu_time_total', row_limit=40))
+
+
+def profiled_request(name, force=False):
+    """Record one request or training step if profiling is on and it is sampled."""
+    if not ENABLED or getattr(_local, 'stages', None) is not None:
+        return _NULL
+    if not force and random.random() >= SAMPLE_RATE:
+        return _NULL
+    return _torch_request(name) if MODE == "torch" else _timer_request(name)
+
+
+@contextmanager
+def _timed_stage(name):
+    stages = _local.stages
+    start = time.perf_counter()
+    try:
+        if MODE == "torch":
+            from torch.profiler import record_function
+            with record_function(name):
+                yield
+        else:
+            yield
+    finally:
+        stages.append({'stage': name, 'ms': (time.perf_counter() - start) * 1000})
+
+
+def stage(name):
+    """Label a stage inside a sampled request; a shared no-op otherwise."""
+    if not ENABLED or getattr(_local, 'stages', None) is None:
+        return _NULL
+    return _timed_stage(name)
@@ -0,0 +1,161 @@
+"""
+Token-budgeted prompt construction for the chatbot.
+The system prompt is a static prefix built and counted once per process; the
+prediction context is cached until the prediction changes; recent turns are
+kept verbatim newest-first while they fit the budget, and older turns are
+folded into a short rolling summary instead of being resent in full.
+Token counts use tiktoken's cl100k_base encoding as an estimate of the
+model's tokenizer (a 4-characters-per-token estimate if tiktoken is missing).
+"""
+
+import os
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 1500))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", 250))
+
+RESPONSE_INSTRUCTION = "Please provide a helpful, empathetic response:"
+
+_encoding = None
+
+
+def _encoder():
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+@lru_cache(maxsize=2048)
+def count_tokens(text):
+    """Estimated token count of a string (cached, since history messages are recounted every turn)."""
+    if not TIKTOKEN_AVAILABLE:
+        return (len(text) + 3) // 4
+    return len(_encoder().encode(text))
+
+
+def truncate_tokens(text, limit):
+    """Cut text to at most `limit` tokens."""
+    if count_tokens(text) <= limit:
+        return text
+    if not TIKTOKEN_AVAILABLE:
+        return text[:limit * 4]
+    return _encoder().decode(_encoder().encode(text)[:limit])
+
+
+def _first_sentence(text, max_chars=160):
+    text = ' '.join(text.split())
+    match = re.match(r'(.+?[.!?])(\s|$)', text)
+    sentence = match.group(1) if match else text
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars - 3].rstrip() + '...'
+
+
+class RollingSummary:
+    """Compact record of turns that no longer fit in the prompt.
+
+    Each folded exchange becomes one line, so folding is incremental and needs
+    no extra model call; the oldest lines are dropped once the summary exceeds
+    its own token budget.
+    """
+
+    def __init__(self, budget=SUMMARY_TOKEN_BUDGET):
+        self.budget = budget
+        self.lines = []
+        self._text = None
+
+    def fold(self, messages):
+        """Append one summary line per message (user questions and the gist of each answer)."""
+        for msg in messages:
+            prefix = "User asked" if msg["role"] == "user" else "Assistant explained"
+            self.lines.append(f"- {prefix}: {_first_sentence(msg['content'])}")
+        while self.lines and count_tokens('\n'.join(self.lines)) > self.budget:
+            self.lines.pop(0)
+        self._text = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = '\n'.join(self.lines)
+        return self._text
+
+    def drop_oldest(self):
+        """Forget the oldest line; used when a session is over its memory budget."""
+        if self.lines:
+            self.lines.pop(0)
+            self._text = None
+
+    def clear(self):
+        self.lines = []
+        self._text = None
+
+
+def _format_message(msg):
+    role = "User" if msg["role"] == "user" else "Assistant"
+    return f"{role}: {msg['content']}"
+
+
+class PromptBuilder:
+    """Build chat prompts that stay within a token budget."""
+
+    def __init__(self, system_prompt, budget=PROMPT_TOKEN_BUDGET):
+        self.budget = budget
+        self.prefix = system_prompt
+        self.prefix_tokens = count_tokens(system_prompt)
+        self._context_key = None
+        self._context = ''
+
+    def context_block(self, prediction, probabilities):
+        """Prediction context section, rebuilt only when the prediction changes."""
+        key = (prediction, tuple((probabilities or {}).items()))
+        if key != self._context_key:
+            self._context_key = key
+            if not prediction:
+                self._context = ''
+            else:
+                lines = [f"**Current User Context:**\nThe user has just received a prediction result: **{prediction}**"]
+                if probabilities:
+                    lines.append("Probability breakdown:")
+                    lines.extend(f"- {label}: {prob:.1%}" for label, prob in probabilities.items())
+                self._context = '\n'.join(lines)
+        return self._context
+
+    def compact(self, history, summary, user_message, context=''):
+        """Fold the oldest messages of `history` into `summary` (in place) until the prompt fits."""
+        available = self.budget - self._fixed_tokens(user_message, context) - summary.budget
+        kept, used = 0, 0
+        for msg in reversed(history):
+            cost = count_tokens(_format_message(msg)) + 1
+            if used + cost > available:
+                break
+            used += cost
+            kept += 1
+        overflow = len(history) - kept
+        if overflow > 0:
+            summary.fold(history[:overflow])
+            del history[:overflow]
+
+    def _fixed_tokens(self, user_message, context):
+        return (self.prefix_tokens + count_tokens(context) + count_tokens(user_message)
+                + count_tokens(RESPONSE_INSTRUCTION) + 16)
+
+    def build(self, history, summary, user_message, context=''):
+        """Assemble the prompt from its sections in one join."""
+        user_message = truncate_tokens(user_message, self.budget // 4)
+        self.compact(history, summary, user_message, context)
+        sections = [self.prefix]
+        if context:
+            sections.append(context)
+        if summary.lines:
+            sections.append(f"Summary of earlier conversation:\n{summary.text}")
+        if history:
+            sections.append("Previous conversation:\n" + '\n'.join(_format_message(m) for m in history))
+        sections.append(f"User: {user_message}")
+        sections.append(RESPONSE_INSTRUCTION)
+        return '\n\n'.join(sections)
@@ -0,0 +1,221 @@
+"""
+Structured channel pruning for the EfficientNet-B0 checkpoint.
+Channel importance is the first-order Taylor estimate |sum(activation * gradient)|,
+accumulated over batches of the training split. Two places are pruned: the expanded
+(hidden) channels of every MBConv block, which are shared by the expand, depthwise,
+squeeze-excitation and project convolutions, and the 1280 channels of the head
+convolution. Low-importance channels are sliced out of the weight tensors, so the
+result is a smaller dense network rather than a masked one. After a short
+fine-tune it is exported as the 'efficientnet_pruned' checkpoint. The block
+input/output widths on the residual path are left unchanged.
+
+Usage:
+    python Src/pruning.py sweep --levels 0.25 0.5 0.75 --epochs 2
+    python Src/pruning.py export --sparsity 0.5 --epochs 3
+"""
+
+import argparse
+import copy
+import io
+import json
+import os
+import torch
+from torch import nn, optim
+
+from data import load_splits, make_loader, train_transform
+from distill import evaluate, measure_latency
+from models import MODEL_SPECS, build_transform, checkpoint_path, load_model, set_tensor, sync_shape
+from train import train_one_epoch
+
+BASE = 'efficientnet'
+PRUNED = 'efficientnet_pruned'
+REPORT_PATH = os.path.join('reports', 'pruning_report.json')
+# Kept channel counts are rounded to a multiple of this, which suits CPU convolution kernels
+ROUND_TO = 8
+
+
+def channel_importance(model, dataset, batches=20, batch_size=32):
+    """Taylor importance per prunable channel, keyed by '_blocks.<i>' and 'head'."""
+    layers = {f'_blocks.{i}': block._bn1 for i, block in enumerate(model._blocks)
+              if block._block_args.expand_ratio != 1}
+    layers['head'] = model._bn1
+    scores = {key: torch.zeros(layer.num_features) for key, layer in layers.items()}
+
+    def hook(key):
+        def forward_hook(module, inputs, output):
+            def grad_hook(grad):
+                scores[key] += (output.detach() * grad).sum(dim=(2, 3)).abs().sum(dim=0)
+            output.register_hook(grad_hook)
+        return forward_hook
+
+    handles = [layer.register_forward_hook(hook(key)) for key, layer in layers.items()]
+    model.eval()
+    criterion = nn.CrossEntropyLoss()
+    try:
+        for step, (inputs, labels) in enumerate(make_loader(dataset, batch_size, shuffle=True)):
+            if step == batches:
+                break
+            model.zero_grad()
+            criterion(model(inputs), labels).backward()
+    finally:
+        for handle in handles:
+            handle.remove()
+    model.zero_grad()
+    return scores
+
+
+def _keep(scores, sparsity):
+    count = len(scores)
+    keep = int(round(count * (1 - sparsity) / ROUND_TO)) * ROUND_TO
+    keep = min(max(keep, ROUND_TO), count)
+    return scores.argsort(descending=True)[:keep].sort().values
+
+
+def _slice(module, index, dim=0):
+    for name in ('weight', 'bias', 'running_mean', 'running_var'):
+        tensor = getattr(module, name, None)
+        # Per-channel vectors (bias, BN statistics) belong to the output axis
+        if tensor is None or (tensor.dim() == 1 and dim != 0):
+            continue
+        set_tensor(module, name, tensor.detach().index_select(dim, index).clone())
+    sync_shape(module)
+
+
+def prune(model, importance, sparsity):
+    """Physically remove the lowest-importance channels from an EfficientNet in place."""
+    for i, block in enumerate(model._blocks):
+        key = f'_blocks.{i}'
+        if key not in importance:
+            continue
+        index = _keep(importance[key], sparsity)
+        _slice(block._expand_conv, index)
+        _slice(block._bn0, index)
+        _slice(block._depthwise_conv, index)
+        _slice(block._bn1, index)
+        if block.has_se:
+            _slice(block._se_reduce, index, dim=1)
+            _slice(block._se_expand, index)
+        _slice(block._project_conv, index, dim=1)
+
+    index = _keep(importance['head'], sparsity)
+    _slice(model._conv_head, index)
+    _slice(model._bn1, index)
+    set_tensor(model._fc, 'weight', model._fc.weight.detach()[:, index].clone())
+    sync_shape(model._fc)
+    return model
+
+
+def count_macs(model, name=BASE):
+    """Multiply-accumulates of one forward pass over conv and linear layers."""
+    spec = MODEL_SPECS[name]
+    total = 0
+
+    def hook(module, inputs, output):
+        nonlocal total
+        if isinstance(module, nn.Conv2d):
+            kernel = module.weight.shape[1] * module.weight.shape[2] * module.weight.shape[3]
+            total += output.numel() * kernel
+        else:
+            total += module.weight.numel() * output.shape[0]
+
+    handles = [m.register_forward_hook(hook) for m in model.modules() if isinstance(m, (nn.Conv2d, nn.Linear))]
+    with torch.no_grad():
+        model(torch.zeros(1, spec['in_channels'], spec['image_size'], spec['image_size']))
+    for handle in handles:
+        handle.remove()
+    return total
+
+
+def fine_tune(model, epochs=2, lr=1e-4, batch_size=32, num_workers=0):
+    """Short recovery training of a pruned model on the training split."""
+    if epochs <= 0:
+        return model
+    train_dataset, _ = load_splits(train_transform(MODEL_SPECS[BASE]['image_size']))
+    loader = make_loader(train_dataset, batch_size, shuffle=True, num_workers=num_workers)
+    for param in model.parameters():
+        param.requires_grad = True
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+    criterion = nn.CrossEntropyLoss()
+    for epoch in range(epochs):
+        loss = train_one_epoch(model, loader, criterion, optimizer, torch.device('cpu'))
+        print(f"  fine-tune epoch {epoch + 1}, Loss: {loss:.4f}")
+    model.eval()
+    return model
+
+
+def _profile(model, val_dataset):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return {
+        'params_m': sum(p.numel() for p in model.parameters()) / 1e6,
+        'gmacs': count_macs(model) / 1e9,
+        'checkpoint_mb': buffer.tell() / 1e6,
+        'latency_ms': measure_latency(model, BASE),
+        'val_accuracy': evaluate(model, val_dataset),
+    }
+
+
+def sweep(levels, epochs=2, lr=1e-4, batches=20, num_workers=0, output=REPORT_PATH):
+    """Prune the checkpoint at each sparsity level, fine-tune, and report size, latency and accuracy."""
+    base = load_model(BASE)
+    train_dataset, val_dataset = load_splits(build_transform(BASE))
+    print(f"Gathering channel importance over {batches} training batches...")
+    importance = channel_importance(base, train_dataset, batches)
+
+    rows = [{'sparsity': 0.0, **_profile(base, val_dataset), 'accuracy_before_tuning': None}]
+    for sparsity in levels:
+        print(f"Sparsity {sparsity:.0%}")
+        model = prune(copy.deepcopy(base), importance, sparsity)
+        before = evaluate(model, val_dataset)
+        fine_tune(model, epochs, lr, num_workers=num_workers)
+        rows.append({'sparsity': sparsity, **_profile(model, val_dataset), 'accuracy_before_tuning': before})
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(rows, f, indent=2)
+
+    print(f"\n{'sparsity':>9}{'params (M)':>12}{'GMACs':>8}{'size (MB)':>11}{'latency ms':>12}"
+          f"{'acc pruned':>12}{'acc tuned':>11}")
+    for row in rows:
+        before = f"{row['accuracy_before_tuning']:.4f}" if row['accuracy_before_tuning'] is not None else '-'
+        print(f"{row['sparsity']:>9.0%}{row['params_m']:>12.2f}{row['gmacs']:>8.3f}{row['checkpoint_mb']:>11.1f}"
+              f"{row['latency_ms']:>12.1f}{before:>12}{row['val_accuracy']:>11.4f}")
+    print(f"\nReport written to {output}")
+    return rows
+
+
+def export(sparsity, epochs=3, lr=1e-4, batches=20, num_workers=0, output=None):
+    """Prune, fine-tune and save the dense pruned model where the app loads 'efficientnet_pruned' from."""
+    model = load_model(BASE)
+    train_dataset, val_dataset = load_splits(build_transform(BASE))
+    prune(model, channel_importance(model, train_dataset, batches), sparsity)
+    fine_tune(model, epochs, lr, num_workers=num_workers)
+
+    output = output or checkpoint_path(PRUNED)
+    torch.save(model.state_dict(), output)
+    reloaded = load_model(PRUNED, output)
+    print(f"Pruned model saved to {output}: {sum(p.numel() for p in reloaded.parameters()) / 1e6:.2f}M parameters, "
+          f"validation accuracy {100 * evaluate(reloaded, val_dataset):.2f}%")
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Structured channel pruning of the EfficientNet checkpoint")
+    parser.add_argument('command', choices=['sweep', 'export'])
+    parser.add_argument('--levels', nargs='+', type=float, default=[0.25, 0.5, 0.625, 0.75],
+                        help="Fractions of prunable channels to remove (sweep)")
+    parser.add_argument('--sparsity', type=float, default=0.5, help="Fraction of prunable channels to remove (export)")
+    parser.add_argument('--epochs', type=int, default=2, help="Fine-tuning epochs after pruning")
+    parser.add_argument('--lr', type=float, default=1e-4)
+    parser.add_argument('--batches', type=int, default=20, help="Training batches used to score channels")
+    parser.add_argument('--num-workers', type=int, default=0)
+    parser.add_argument('--output', default=None, help="Checkpoint path (export)")
+    args = parser.parse_args()
+    if args.command == 'sweep':
+        sweep(args.levels, args.epochs, args.lr, args.batches, args.num_workers)
+    else:
+        export(args.sparsity, args.epochs, args.lr, args.batches, args.num_workers, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Similar-case retrieval over the training set.
+Penultimate-layer features (the input of the classifier head) are L2-normalized
+and stored as a float16 matrix that is memory-mapped at query time and searched
+with a chunked, vectorized cosine-similarity scan.
+
+Usage:
+    python Src/retrieval.py build --model efficientnet
+    python Src/retrieval.py bench --model efficientnet --queries 200
+"""
+
+import argparse
+import json
+import os
+import time
+import numpy as np
+import torch
+from torchvision import datasets
+
+from models import CLASS_NAMES, LABELS, StudentNet, build_transform
+
+INDEX_DIR = 'cache'
+CHUNK_ROWS = 4096  # rows converted to float32 at a time while scanning
+
+
+def head_linear(model):
+    """The final linear layer whose input is the penultimate embedding, or None."""
+    if hasattr(model, '_fc'):  # EfficientNet
+        return model._fc
+    if isinstance(model, StudentNet):
+        return model.classifier[-1]
+    if hasattr(model, 'fc'):  # ResNet
+        return model.fc
+    return None
+
+
+class EmbeddingHook:
+    """Record the classifier-head input during a normal forward pass."""
+
+    def __init__(self, model):
+        layer = head_linear(model)
+        if layer is None:
+            raise ValueError(f"No classifier head found on {type(model).__name__}")
+        self._features = None
+        self._handle = layer.register_forward_hook(self._hook)
+
+    def _hook(self, module, inputs, output):
+        self._features = inputs[0]
+
+    def pop(self):
+        """Return the last captured [N, D] embeddings, L2-normalized, and release them."""
+        if self._features is None:
+            return None
+        features = torch.nn.functional.normalize(self._features.detach().float(), dim=1).numpy()
+        self._features = None
+        return features
+
+    def remove(self):
+        self._handle.remove()
+
+
+def index_paths(model_name):
+    """(embeddings .npy, metadata .json) paths for a model's index."""
+    base = os.path.join(INDEX_DIR, f'embeddings_{model_name}')
+    return base + '.npy', base + '.json'
+
+
+def build_index(model_name='efficientnet', data_dir='train', batch_size=64, num_workers=0):
+    """Embed every training image and write the float16 matrix plus its metadata."""
+    from data import make_loader
+    from models import load_model
+
+    dataset = datasets.ImageFolder(data_dir, transform=build_transform(model_name))
+    model = load_model(model_name)
+    hook = EmbeddingHook(model)
+
+    embeddings_path, metadata_path = index_paths(model_name)
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    start = time.perf_counter()
+    matrix = None
+    row = 0
+    with torch.no_grad():
+        for inputs, _ in make_loader(dataset, batch_size, num_workers=num_workers):
+            model(inputs)
+            features = hook.pop()
+            if matrix is None:
+                # Written straight to disk so the full float32 matrix never sits in memory
+                matrix = np.lib.format.open_memmap(embeddings_path, mode='w+', dtype=np.float16,
+                                                   shape=(len(dataset), features.shape[1]))
+            matrix[row:row + len(features)] = features.astype(np.float16)
+            row += len(features)
+    matrix.flush()
+    hook.remove()
+
+    metadata = {
+        'model': model_name,
+        'classes': dataset.classes,
+        'paths': [path for path, _ in dataset.samples],
+        'labels': [label for _, label in dataset.samples],
+    }
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f)
+    print(f"Indexed {len(dataset)} images ({os.path.getsize(embeddings_path) / 1e6:.1f} MB) "
+          f"in {time.perf_counter() - start:.1f}s -> {embeddings_path}")
+
+
+class EmbeddingIndex:
+    """Memory-mapped float16 embeddings searched by cosine similarity."""
+
+    def __init__(self, model_name='efficientnet'):
+        embeddings_path, metadata_path = index_paths(model_name)
+        self.embeddings = np.load(embeddings_path, mmap_mode='r')
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+        self.paths = metadata['paths']
+        self.labels = np.asarray(metadata['labels'])
+        self.classes = metadata['classes']
+
+    def __len__(self):
+        return len(self.paths)
+
+    def search(self, query, k=5):
+        """
+        Find the k most similar training images to an L2-normalized [D] embedding.
+
+        Returns:
+            list of dict: path, class_name, label, score (cosine similarity), best first
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), CHUNK_ROWS):
+            chunk = np.asarray(self.embeddings[start:start + CHUNK_ROWS], dtype=np.float32)
+            scores[start:start + len(chunk)] = chunk @ query
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{
+            'path': self.paths[i],
+            'class_name': self.classes[self.labels[i]],
+            'label': LABELS[CLASS_NAMES.index(self.classes[self.labels[i]])],
+            'score': float(scores[i]),
+        } for i in top]
+
+
+def benchmark(model_name='efficientnet', queries=200, k=5):
+    """Time nearest-neighbor queries using stored embeddings as queries."""
+    index = EmbeddingIndex(model_name)
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(index), size=min(queries, len(index)), replace=False)
+    query_vectors = np.asarray(index.embeddings[picks], dtype=np.float32)
+
+    index.search(query_vectors[0], k)  # warm the page cache
+    timings = []
+    same_class = 0
+    for i, query in zip(picks, query_vectors):
+        start = time.perf_counter()
+        results = index.search(query, k + 1)
+        timings.append(time.perf_counter() - start)
+        neighbors = [r for r in results if r['path'] != index.paths[i]][:k]
+        same_class += sum(r['class_name'] == index.classes[index.labels[i]] for r in neighbors)
+
+    timings = np.array(timings) * 1000
+    print(f"Index: {len(index)} x {index.embeddings.shape[1]} float16 "
+          f"({index.embeddings.nbytes / 1e6:.1f} MB, memory-mapped)")
+    print(f"Query latency: p50 {np.percentile(timings, 50):.2f} ms, "
+          f"p95 {np.percentile(timings, 95):.2f} ms, max {timings.max():.2f} ms")
+    print(f"Top-{k} neighbors sharing the query's class: {same_class / (len(picks) * k):.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or benchmark the similar-case embedding index")
+    parser.add_argument('command', choices=['build', 'bench'])
+    parser.add_argument('--model', default='efficientnet')
+    parser.add_argument('--data-dir', default='train')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--num-workers', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_index(args.model, args.data_dir, num_workers=args.num_workers)
+    else:
+        benchmark(args.model, args.queries, args.k)
+
+
+if __name__ == '__main__':
+    main()
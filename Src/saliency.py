@@ -0,0 +1,142 @@
+"""
+Grad-CAM saliency for the served classifiers.
+For the last conv block followed by global average pooling and a linear head,
+the Grad-CAM channel weights are exactly the head weights divided by H*W, so the
+map is computed from activations captured during the prediction forward pass:
+no backward pass and no second inference.
+
+Benchmark usage:
+    python Src/saliency.py "train/No Impairment/NoImpairment (1).jpg" --runs 20
+"""
+
+import argparse
+import io
+import time
+import numpy as np
+import torch
+from matplotlib import colormaps
+from PIL import Image
+from torchvision import transforms
+
+from models import ClassSubset, StudentNet
+
+
+def _target_layer(model):
+    """Return (module, activation_fn, head_weight) for a supported architecture, else None."""
+    if isinstance(model, ClassSubset):
+        return None
+    if hasattr(model, '_bn1') and hasattr(model, '_fc'):  # EfficientNet: swish(bn1(conv_head))
+        return model._bn1, lambda x: x * torch.sigmoid(x), model._fc.weight
+    if isinstance(model, StudentNet):
+        return model.features, lambda x: x, model.classifier[-1].weight
+    if hasattr(model, 'layer4') and hasattr(model, 'fc'):  # ResNet
+        return model.layer4, lambda x: x, model.fc.weight
+    return None
+
+
+class GradCAM:
+    """Capture last-block activations during predict() and turn them into heatmaps on demand."""
+
+    def __init__(self, model):
+        target = _target_layer(model)
+        if target is None:
+            raise ValueError(f"Grad-CAM is not supported for {type(model).__name__}")
+        module, self._activation_fn, self._weight = target
+        self._activation = None
+        self._handle = module.register_forward_hook(self._hook)
+
+    def _hook(self, module, inputs, output):
+        # Only keep a reference; the heavy work is deferred until a heatmap is requested
+        self._activation = output
+
+    def pop_activation(self):
+        """Return the last captured [C, H, W] activation as compact float16 numpy and release it."""
+        if self._activation is None:
+            return None
+        activation = self._activation_fn(self._activation[0].detach()).to(torch.float16).numpy()
+        self._activation = None
+        return activation
+
+    def heatmap(self, activation, class_idx):
+        """Normalized [H, W] Grad-CAM map for one class."""
+        weights = self._weight[class_idx].detach().numpy().astype(np.float32)
+        cam = np.tensordot(weights, activation.astype(np.float32), axes=1)
+        cam = np.maximum(cam, 0)
+        peak = cam.max()
+        return cam / peak if peak > 0 else cam
+
+    def remove(self):
+        """Detach the forward hook."""
+        self._handle.remove()
+
+
+def model_view(image, resize=256, image_size=224):
+    """The exact crop the model sees, so the overlay lines up with the heatmap."""
+    return transforms.CenterCrop(image_size)(transforms.Resize(resize)(image.convert('RGB')))
+
+
+def overlay(image, heatmap, alpha=0.45):
+    """Blend a jet-colored heatmap over the image and return PNG bytes."""
+    colored = colormaps['jet'](heatmap)[..., :3]
+    heat = Image.fromarray((colored * 255).astype(np.uint8)).resize(image.size, Image.BILINEAR)
+    blended = Image.blend(image.convert('RGB'), heat, alpha)
+    buffer = io.BytesIO()
+    blended.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_overlay(cam, image, activation, class_idx, resize=256, image_size=224):
+    """Lazily build the overlay for a stored prediction; returns (png_bytes, elapsed_ms)."""
+    start = time.perf_counter()
+    png = overlay(model_view(image, resize, image_size), cam.heatmap(activation, class_idx))
+    return png, (time.perf_counter() - start) * 1000
+
+
+def benchmark(image_path, model_name='efficientnet', runs=20):
+    """Report per-scan saliency overhead against a plain prediction."""
+    from models import MODEL_SPECS, build_transform, load_model
+
+    spec = MODEL_SPECS[model_name]
+    model = load_model(model_name)
+    image = Image.open(image_path).convert('RGB')
+    tensor = build_transform(model_name)(image).unsqueeze(0)
+
+    def timed(fn):
+        fn()
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        return float(np.median(samples) * 1000)
+
+    with torch.no_grad():
+        plain = timed(lambda: model(tensor))
+        cam = GradCAM(model)
+        hooked = timed(lambda: model(tensor))
+        model(tensor)
+        activation = cam.pop_activation()
+        class_idx = int(model(tensor).argmax())
+        capture = timed(lambda: (model(tensor), cam.pop_activation()))
+    heat = timed(lambda: cam.heatmap(activation, class_idx))
+    render = timed(lambda: render_overlay(cam, image, activation, class_idx, spec['resize'], spec['image_size']))
+
+    print(f"Forward pass:                {plain:8.2f} ms")
+    print(f"Forward pass with hook:      {hooked:8.2f} ms")
+    print(f"Forward + activation copy:   {capture:8.2f} ms")
+    print(f"Heatmap from activation:     {heat:8.2f} ms")
+    print(f"Heatmap + overlay PNG:       {render:8.2f} ms")
+    print(f"Stored activation size:      {activation.nbytes / 1024:8.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Grad-CAM overhead per scan")
+    parser.add_argument('image')
+    parser.add_argument('--model', default='efficientnet')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+    benchmark(args.image, args.model, args.runs)
+
+
+if __name__ == '__main__':
+    main()
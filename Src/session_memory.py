@@ -0,0 +1,123 @@
+"""
+Bounded per-session memory for the Streamlit app.
+Images are kept as downscaled, losslessly compressed PNG bytes instead of
+full-resolution PIL objects, chat history is capped, and each session's
+tracked state is held under a byte budget by evicting what can be recomputed.
+Memory per server therefore grows with the number of sessions times the budget.
+"""
+
+import io
+import os
+
+from PIL import Image
+
+from metrics import SESSION_EVICTIONS_TOTAL
+
+# Longest side kept for stored images; larger than every model's resize, so predictions are unchanged
+IMAGE_MAX_SIDE = int(os.getenv("SESSION_IMAGE_MAX_SIDE", 512))
+# Messages kept per conversation (user and assistant messages both count)
+CHAT_HISTORY_LIMIT = int(os.getenv("CHAT_HISTORY_LIMIT", 20))
+SESSION_BUDGET_BYTES = int(os.getenv("SESSION_MEMORY_BUDGET_KB", 1024)) * 1024
+
+# Evicted in this order. The app re-renders the overlay from the activation and recomputes an evicted
+# activation (listed in state['evicted_results']) from the stored image, which is never evicted.
+# Similar cases are a few hundred bytes, so they are counted but kept.
+EVICTION_ORDER = ['saliency_overlay', 'last_activation']
+
+
+def compress_image(image, max_side=IMAGE_MAX_SIDE):
+    """Downscale an image to max_side and encode it as PNG (grayscale when the scan is grayscale)."""
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+    if image.mode == 'RGB' and _is_grayscale(image):
+        image = image.convert('L')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def _is_grayscale(image):
+    r, g, b = image.split()
+    return r.tobytes() == g.tobytes() == b.tobytes()
+
+
+def decompress_image(data):
+    """Decode stored image bytes back into an RGB PIL image."""
+    return Image.open(io.BytesIO(data)).convert('RGB')
+
+
+def trim_history(history, limit=CHAT_HISTORY_LIMIT):
+    """Drop the oldest messages in place so at most `limit` remain."""
+    if len(history) > limit:
+        del history[:len(history) - limit]
+    return history
+
+
+def _history_bytes(history):
+    return sum(len(msg['content'].encode('utf-8')) for msg in history or [])
+
+
+def _value_bytes(key, value):
+    if value is None:
+        return 0
+    if key == 'saliency_overlay':
+        return len(value[0])
+    if key == 'last_activation':
+        return value.nbytes
+    if key == 'similar_cases':
+        return sum(len(case['path']) + 64 for case in value)
+    return len(value)
+
+
+def _chatbot_bytes(chatbot):
+    if chatbot is None:
+        return 0
+    return _history_bytes(chatbot.chat_history) + len(chatbot.summary.text.encode('utf-8'))
+
+
+def session_bytes(state, chatbot=None):
+    """Approximate bytes held by the tracked keys of one session and its chatbot's history and summary."""
+    sizes = {key: _value_bytes(key, state.get(key)) for key in ['stored_image', 'similar_cases'] + EVICTION_ORDER}
+    sizes['chat_history'] = _history_bytes(state.get('chat_history'))
+    sizes['chatbot'] = _chatbot_bytes(chatbot)
+    return sizes
+
+
+def enforce_budget(state, budget=SESSION_BUDGET_BYTES, chatbot=None):
+    """Cap chat history and evict analysis results, then old chat, until the session fits its budget."""
+    history = state.get('chat_history')
+    if history is not None:
+        trim_history(history)
+    if chatbot is not None:
+        # Through the chatbot, so dropped turns are folded into its rolling summary
+        chatbot.trim_history(CHAT_HISTORY_LIMIT)
+
+    total = sum(session_bytes(state, chatbot).values())
+    for key in EVICTION_ORDER:
+        if total <= budget:
+            return total
+        size = _value_bytes(key, state.get(key))
+        if size:
+            state[key] = None
+            state['evicted_results'] = list(state.get('evicted_results') or []) + [key]
+            total -= size
+            SESSION_EVICTIONS_TOTAL.labels(key).inc()
+
+    # Still over budget: drop the oldest exchanges (the chatbot's folded into its summary), keeping the latest
+    # one, then the oldest summary lines
+    while total > budget:
+        if history and len(history) > 2:
+            del history[:2]
+            SESSION_EVICTIONS_TOTAL.labels('chat_history').inc()
+        elif chatbot is not None and len(chatbot.chat_history) > 2:
+            chatbot.trim_history(len(chatbot.chat_history) - 2)
+            SESSION_EVICTIONS_TOTAL.labels('chatbot_history').inc()
+        elif chatbot is not None and chatbot.summary.lines:
+            chatbot.summary.drop_oldest()
+            SESSION_EVICTIONS_TOTAL.labels('chatbot_summary').inc()
+        else:
+            break
+        total = sum(session_bytes(state, chatbot).values())
+    return total
@@ -0,0 +1,192 @@
+"""
+Server-side login sessions with signed tokens.
+A token is "<session id>.<HMAC signature>". Validating one is a constant-time
+signature check plus a dict lookup, so page loads and browser refreshes never
+repeat the password check. Sessions live in an in-memory TTL store and can be
+persisted to SQLite (SESSION_PERSIST) so they survive a server restart. When
+persisted, a cached session is also confirmed by a primary-key lookup, so a
+logout handled by another server process takes effect everywhere, and so does
+revoking all of a user's sessions after a password change. Expired
+sessions are swept from a heap in memory and through an index on expires_at in
+the database.
+"""
+
+import base64
+import hashlib
+import heapq
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+SESSION_TTL = float(os.getenv("SESSION_TTL_HOURS", 12)) * 3600
+SESSION_PERSIST = os.getenv("SESSION_PERSIST", "true").lower() in ("1", "true", "yes")
+SWEEP_INTERVAL = 300  # seconds between expiry sweeps
+
+_secret = os.getenv("SESSION_SECRET")
+if not _secret:
+    print("⚠️ SESSION_SECRET not set: sessions will not survive a server restart")
+    _secret = secrets.token_hex(32)
+SECRET = _secret.encode()
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        user_id INTEGER REFERENCES users(id),
+        user_data TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at);
+    CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id);
+'''
+
+
+def _sign(session_id):
+    digest = hmac.new(SECRET, session_id.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:24]).decode().rstrip('=')
+
+
+def _unpack(token):
+    """Session id of a correctly signed token, else None."""
+    session_id, _, signature = (token or '').partition('.')
+    if not session_id or not hmac.compare_digest(signature, _sign(session_id)):
+        return None
+    return session_id
+
+
+class SessionStore:
+    """In-memory TTL store of logged-in users, optionally written through to SQLite."""
+
+    def __init__(self, ttl=SESSION_TTL, db_path=None):
+        self.ttl = ttl
+        self.db_path = db_path
+        self._sessions = {}  # id -> (user_data, expires_at)
+        self._expiry = []  # heap of (expires_at, id); stale entries are skipped
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        if db_path:
+            conn = sqlite3.connect(db_path)
+            conn.executescript(SCHEMA)
+            conn.close()
+
+    def issue(self, user_data):
+        """Create a session for a logged-in user and return its signed token."""
+        session_id = secrets.token_urlsafe(24)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._sessions[session_id] = (user_data, expires_at)
+            heapq.heappush(self._expiry, (expires_at, session_id))
+        if self.db_path:
+            self._write('INSERT INTO sessions (id, user_id, user_data, expires_at) VALUES (?, ?, ?, ?)',
+                        (session_id, user_data.get('id'), json.dumps(user_data), expires_at))
+        self._maybe_sweep()
+        return f"{session_id}.{_sign(session_id)}"
+
+    def validate(self, token):
+        """User data for a valid, unexpired token, else None."""
+        session_id = _unpack(token)
+        if session_id is None:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        if entry is not None and self.db_path and not self._exists(session_id):
+            # Revoked by another server process: its row is gone even though this cache still has it
+            with self._lock:
+                self._sessions.pop(session_id, None)
+            return None
+        if entry is None and self.db_path:
+            entry = self._load(session_id)
+        if entry is None or entry[1] <= now:
+            return None
+        return entry[0]
+
+    def _exists(self, session_id):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute('SELECT 1 FROM sessions WHERE id = ?', (session_id,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def _load(self, session_id):
+        # After a restart: primary-key lookup, then cached in memory
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute('SELECT user_data, expires_at FROM sessions WHERE id = ? AND expires_at > ?',
+                               (session_id, time.time())).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        entry = (json.loads(row[0]), row[1])
+        with self._lock:
+            self._sessions[session_id] = entry
+            heapq.heappush(self._expiry, (entry[1], session_id))
+        return entry
+
+    def revoke(self, token):
+        """End the session behind a token (logout)."""
+        session_id = _unpack(token)
+        if session_id is None:
+            return
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.db_path:
+            self._write('DELETE FROM sessions WHERE id = ?', (session_id,))
+
+    def revoke_user(self, user_id, keep_token=None):
+        """End every session of a user (after a password change), except keep_token's."""
+        keep = _unpack(keep_token) if keep_token else None
+        with self._lock:
+            for session_id, (user_data, _) in list(self._sessions.items()):
+                if user_data.get('id') == user_id and session_id != keep:
+                    del self._sessions[session_id]
+        if self.db_path:
+            self._write('DELETE FROM sessions WHERE user_id = ? AND id IS NOT ?', (user_id, keep))
+
+    def _write(self, sql, params):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                conn.execute(sql, params)
+        finally:
+            conn.close()
+
+    def _maybe_sweep(self):
+        if time.time() - self._last_sweep >= SWEEP_INTERVAL:
+            self.sweep()
+
+    def sweep(self):
+        """Drop expired sessions; returns how many were removed from memory."""
+        now = time.time()
+        removed = 0
+        with self._lock:
+            self._last_sweep = now
+            while self._expiry and self._expiry[0][0] <= now:
+                expires_at, session_id = heapq.heappop(self._expiry)
+                entry = self._sessions.get(session_id)
+                if entry is not None and entry[1] == expires_at:
+                    del self._sessions[session_id]
+                    removed += 1
+        if self.db_path:
+            self._write('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+        return removed
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store(db_path=None):
+    """Process-wide session store (persisted to db_path when SESSION_PERSIST is on)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore(db_path=db_path if SESSION_PERSIST else None)
+        return _store
@@ -0,0 +1,85 @@
+"""
+Single-flight coalescing of identical in-flight calls.
+The first caller for a key (the leader) runs the call; callers that arrive with
+the same key while it is running wait for and share its result or exception
+instead of issuing their own. Each key carries its own deadline: followers stop
+waiting at the deadline, and a call still running past it no longer accepts
+new followers, so one hung request cannot stall every later one.
+"""
+
+import threading
+import time
+
+from metrics import LLM_COALESCED_TOTAL
+
+
+class _Call:
+    def __init__(self, timeout):
+        self.done = threading.Event()
+        self.deadline = time.monotonic() + timeout
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Process-wide registry of in-flight calls keyed by request identity."""
+
+    def __init__(self, default_timeout=30.0):
+        self.default_timeout = default_timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.followers = 0
+        self.timeouts = 0
+
+    def do(self, key, fn, timeout=None, label='default'):
+        """Run fn() once for all concurrent callers of `key` and return its result to each.
+
+        Raises:
+            TimeoutError: if this caller was a follower and the shared call did
+            not finish within the key's timeout
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None or time.monotonic() >= call.deadline:
+                call = self._calls[key] = _Call(timeout)
+                leader = True
+                self.leaders += 1
+            else:
+                call.followers += 1
+                leader = False
+                self.followers += 1
+
+        if leader:
+            LLM_COALESCED_TOTAL.labels(label, 'leader').inc()
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    if self._calls.get(key) is call:
+                        del self._calls[key]
+                call.done.set()
+        else:
+            LLM_COALESCED_TOTAL.labels(label, 'follower').inc()
+            if not call.done.wait(max(call.deadline - time.monotonic(), 0)):
+                with self._lock:
+                    self.timeouts += 1
+                LLM_COALESCED_TOTAL.labels(label, 'timeout').inc()
+                raise TimeoutError(f"Shared request did not finish within {timeout:.0f}s")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def coalescing_ratio(self):
+        """Fraction of calls that were served by another caller's request."""
+        total = self.leaders + self.followers
+        return self.followers / total if total else 0.0
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,289 @@
+"""
+Parallel hyperparameter sweeps over the notebook's training setup.
+Trials for ResNet-50, EfficientNet-B0 and DeiT are sampled from a seeded search
+space and run in a process pool sized to the machine, each trial getting an
+equal share of the cores. After every epoch a trial writes its validation
+metrics to a local SQLite store. Once past the warm-up epochs, a trial whose
+accuracy falls below the median of the other trials of the same model at the
+same epoch is stopped (median pruning). The store records every trial, so
+re-running the same sweep skips finished trials, restarts interrupted ones and
+only runs what is left.
+
+Usage:
+    python Src/sweep.py run --name lr-search --models resnet50 efficientnet --trials 12 --epochs 10
+    python Src/sweep.py show --name lr-search
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from multiprocessing import get_context
+
+from metrics import DB_OPERATION_SECONDS, observe_seconds
+
+SWEEP_DB = os.path.join('cache', 'sweeps.db')
+
+# Learning rate is sampled log-uniformly, the rest uniformly from the listed choices
+SEARCH_SPACE = {
+    'resnet50': {'lr': (1e-4, 1e-2), 'batch_size': [16, 32, 64]},
+    'efficientnet': {'lr': (1e-4, 3e-3), 'batch_size': [16, 32, 64]},
+    'deit': {'lr': (1e-5, 1e-3), 'batch_size': [16, 32]},
+}
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS trials (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sweep TEXT NOT NULL,
+        number INTEGER NOT NULL,
+        model TEXT NOT NULL,
+        params TEXT NOT NULL,
+        max_epochs INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        epochs_done INTEGER NOT NULL DEFAULT 0,
+        best_accuracy REAL,
+        best_epoch INTEGER,
+        error TEXT,
+        started_at TEXT,
+        finished_at TEXT,
+        UNIQUE (sweep, number)
+    );
+    CREATE TABLE IF NOT EXISTS trial_epochs (
+        trial_id INTEGER NOT NULL REFERENCES trials(id),
+        epoch INTEGER NOT NULL,
+        train_loss REAL NOT NULL,
+        val_loss REAL NOT NULL,
+        val_accuracy REAL NOT NULL,
+        seconds REAL NOT NULL,
+        PRIMARY KEY (trial_id, epoch)
+    );
+    CREATE INDEX IF NOT EXISTS idx_trials_sweep_status ON trials(sweep, status);
+'''
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _connect(db_path):
+    # Trial processes write concurrently; WAL keeps readers unblocked and the timeout absorbs lock waits
+    conn = sqlite3.connect(db_path, timeout=60)
+    conn.execute('PRAGMA journal_mode=WAL')
+    return conn
+
+
+def init_store(db_path=SWEEP_DB):
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    conn = _connect(db_path)
+    try:
+        conn.executescript(SCHEMA)
+    finally:
+        conn.close()
+
+
+def sample_params(model, rng):
+    """One configuration from a model's search space."""
+    space = SEARCH_SPACE[model]
+    low, high = space['lr']
+    return {
+        'lr': float(f"{math.exp(rng.uniform(math.log(low), math.log(high))):.3g}"),
+        'batch_size': rng.choice(space['batch_size']),
+    }
+
+
+def create_trials(name, models, trials, epochs, seed=0, db_path=SWEEP_DB):
+    """Register a sweep's trials; configurations are seeded, so re-running adds nothing twice."""
+    rng = random.Random(seed)
+    rows = []
+    for number in range(trials * len(models)):
+        model = models[number % len(models)]
+        rows.append((name, number, model, json.dumps(sample_params(model, rng)), epochs))
+    conn = _connect(db_path)
+    try:
+        with conn:
+            conn.executemany('''
+                INSERT OR IGNORE INTO trials (sweep, number, model, params, max_epochs) VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            # Trials left 'running' by an interrupted run start over
+            stale = [row[0] for row in conn.execute(
+                "SELECT id FROM trials WHERE sweep = ? AND status = 'running'", (name,))]
+            conn.executemany('DELETE FROM trial_epochs WHERE trial_id = ?', [(i,) for i in stale])
+            conn.executemany("UPDATE trials SET status = 'pending', epochs_done = 0, best_accuracy = NULL, "
+                             "best_epoch = NULL WHERE id = ?", [(i,) for i in stale])
+        return [row[0] for row in conn.execute(
+            "SELECT id FROM trials WHERE sweep = ? AND status = 'pending' ORDER BY number", (name,))]
+    finally:
+        conn.close()
+
+
+def should_prune(conn, trial_id, epoch, accuracy, warmup_epochs=2, min_trials=3):
+    """Median rule: stop if accuracy is below the median of the other trials of the same model at this epoch."""
+    if epoch <= warmup_epochs:
+        return False
+    others = [row[0] for row in conn.execute('''
+        SELECT e.val_accuracy FROM trial_epochs e JOIN trials t ON t.id = e.trial_id
+        WHERE e.epoch = ? AND e.trial_id != ?
+          AND (t.sweep, t.model) = (SELECT sweep, model FROM trials WHERE id = ?)
+        ORDER BY e.val_accuracy
+    ''', (epoch, trial_id, trial_id))]
+    if len(others) < min_trials:
+        return False
+    middle = len(others) // 2
+    median = others[middle] if len(others) % 2 else (others[middle - 1] + others[middle]) / 2
+    return accuracy < median
+
+
+def run_trial(trial_id, db_path=SWEEP_DB, threads=1, warmup_epochs=2, min_trials=3, num_workers=0):
+    """Train one trial in this process, reporting each epoch and stopping early when pruned."""
+    import torch
+    from torch import nn
+
+    from data import load_splits, make_loader, train_transform
+    from models import MODEL_SPECS, build_transform
+    from train import build_for_training, make_optimizer, train_one_epoch, validate
+
+    conn = _connect(db_path)
+    try:
+        model_name, params, max_epochs, number = conn.execute(
+            'SELECT model, params, max_epochs, number FROM trials WHERE id = ?', (trial_id,)).fetchone()
+        params = json.loads(params)
+        with conn:
+            conn.execute("UPDATE trials SET status = 'running', started_at = ? WHERE id = ?", (_now(), trial_id))
+
+        torch.set_num_threads(threads)
+        torch.manual_seed(number)
+        device = torch.device('cpu')
+        train_dataset, _ = load_splits(train_transform(MODEL_SPECS[model_name]['image_size']))
+        _, val_dataset = load_splits(build_transform(model_name))
+        trainloader = make_loader(train_dataset, params['batch_size'], shuffle=True, num_workers=num_workers)
+        valloader = make_loader(val_dataset, params['batch_size'], num_workers=num_workers)
+        model = build_for_training(model_name).to(device)
+        criterion = nn.CrossEntropyLoss()
+        optimizer = make_optimizer(model, params['lr'])
+
+        status, best = 'complete', (None, None)
+        for epoch in range(1, max_epochs + 1):
+            start = time.perf_counter()
+            train_loss = train_one_epoch(model, trainloader, criterion, optimizer, device)
+            val_loss, accuracy = validate(model, valloader, criterion, device)
+            if best[0] is None or accuracy > best[0]:
+                best = (accuracy, epoch)
+            with observe_seconds(DB_OPERATION_SECONDS.labels('sweep_report')), conn:
+                conn.execute('INSERT OR REPLACE INTO trial_epochs VALUES (?, ?, ?, ?, ?, ?)',
+                             (trial_id, epoch, train_loss, val_loss, accuracy, time.perf_counter() - start))
+                conn.execute('UPDATE trials SET epochs_done = ?, best_accuracy = ?, best_epoch = ? WHERE id = ?',
+                             (epoch, best[0], best[1], trial_id))
+            if epoch < max_epochs and should_prune(conn, trial_id, epoch, accuracy, warmup_epochs, min_trials):
+                status = 'pruned'
+                break
+        with conn:
+            conn.execute('UPDATE trials SET status = ?, finished_at = ? WHERE id = ?', (status, _now(), trial_id))
+        return trial_id, status, best[0]
+    except Exception as e:
+        with conn:
+            conn.execute("UPDATE trials SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                         (f"{type(e).__name__}: {e}", _now(), trial_id))
+        return trial_id, 'failed', None
+    finally:
+        conn.close()
+
+
+def run(name, models, trials=8, epochs=10, parallel=None, threads=None, warmup_epochs=2, min_trials=3,
+        seed=0, num_workers=0, db_path=SWEEP_DB):
+    """Run (or resume) a sweep across a process pool; returns the leaderboard rows."""
+    init_store(db_path)
+    pending = create_trials(name, models, trials, epochs, seed, db_path)
+    cores = os.cpu_count() or 1
+    parallel = parallel or max(1, min(len(pending), cores // (threads or 1)))
+    threads = threads or max(1, cores // parallel)
+    print(f"Sweep '{name}': {len(pending)} trials to run, {parallel} at a time with {threads} threads each")
+
+    if pending:
+        with ProcessPoolExecutor(parallel, mp_context=get_context('spawn')) as pool:
+            futures = [pool.submit(run_trial, trial_id, db_path, threads, warmup_epochs, min_trials, num_workers)
+                       for trial_id in pending]
+            for future in as_completed(futures):
+                try:
+                    trial_id, status, accuracy = future.result()
+                except BrokenProcessPool:
+                    # A worker died (usually out of memory); its trials stay 'running' and restart on resume
+                    print(f"❌ A trial process was killed; lower --parallel and re-run sweep '{name}' to resume")
+                    break
+                shown = f"{100 * accuracy:.2f}%" if accuracy is not None else '-'
+                print(f"{'✅' if status == 'complete' else '✂️' if status == 'pruned' else '❌'} "
+                      f"trial {trial_id} {status}, best accuracy {shown}")
+    return show(name, db_path=db_path)
+
+
+def show(name, top=10, db_path=SWEEP_DB):
+    """Print a sweep's best trials and how much training pruning saved."""
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute('''
+            SELECT id, model, params, status, epochs_done, max_epochs, best_accuracy, best_epoch, error
+            FROM trials WHERE sweep = ? ORDER BY best_accuracy IS NULL, best_accuracy DESC
+        ''', (name,)).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        print(f"No trials recorded for sweep '{name}'")
+        return []
+
+    print(f"\n{'trial':>6}  {'model':<13}{'lr':>9}{'batch':>7}  {'status':<9}{'epochs':>8}{'best acc':>10}{'at':>4}")
+    for trial_id, model, params, status, done, max_epochs, accuracy, best_epoch, _ in rows[:top]:
+        params = json.loads(params)
+        shown = f"{accuracy:.4f}" if accuracy is not None else '-'
+        print(f"{trial_id:>6}  {model:<13}{params['lr']:>9.2e}{params['batch_size']:>7}  {status:<9}"
+              f"{f'{done}/{max_epochs}':>8}{shown:>10}{best_epoch or '-':>4}")
+
+    counts = {}
+    for row in rows:
+        counts[row[3]] = counts.get(row[3], 0) + 1
+    run_epochs = sum(row[4] for row in rows)
+    full_epochs = sum(row[5] for row in rows)
+    print(f"\n{', '.join(f'{n} {status}' for status, n in sorted(counts.items()))}; "
+          f"{run_epochs}/{full_epochs} epochs trained ({run_epochs / full_epochs:.0%} of a full grid)")
+    for row in rows:
+        if row[8]:
+            print(f"❌ trial {row[0]}: {row[8]}")
+
+    best = rows[0]
+    if best[6] is not None:
+        params = json.loads(best[2])
+        print(f"Best: python Src/train.py --model {best[1]} --lr {params['lr']} "
+              f"--batch-size {params['batch_size']} --epochs {best[7]}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweeps with median pruning")
+    parser.add_argument('command', choices=['run', 'show'])
+    parser.add_argument('--name', required=True, help="Sweep name; re-running the same name resumes it")
+    parser.add_argument('--models', nargs='+', choices=list(SEARCH_SPACE), default=['resnet50', 'efficientnet'])
+    parser.add_argument('--trials', type=int, default=8, help="Trials per model")
+    parser.add_argument('--epochs', type=int, default=10, help="Maximum epochs per trial")
+    parser.add_argument('--parallel', type=int, default=None, help="Concurrent trials (default: fit to cores)")
+    parser.add_argument('--threads', type=int, default=None, help="Torch threads per trial")
+    parser.add_argument('--warmup-epochs', type=int, default=2, help="Epochs before a trial can be pruned")
+    parser.add_argument('--min-trials', type=int, default=3, help="Reports needed at an epoch before pruning")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--num-workers', type=int, default=0, help="DataLoader workers per trial")
+    parser.add_argument('--db', default=SWEEP_DB)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run(args.name, args.models, args.trials, args.epochs, args.parallel, args.threads, args.warmup_epochs,
+            args.min_trials, args.seed, args.num_workers, args.db)
+    else:
+        init_store(args.db)
+        show(args.name, db_path=args.db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,426 @@
+"""
+Training entry point for the models explored in the notebook
+(ResNet-50, EfficientNet-B0 and DeiT), using the same loss, optimizer and loop.
+With --workers above 1 (or under torchrun), training is data-parallel over the
+gloo backend. Each process trains on its own shard of train/ through a
+DistributedSampler, and DistributedDataParallel averages gradients across
+processes after every backward pass. Only rank 0 prints and writes the
+checkpoint. --batch-size is per process, so the global batch is batch size
+times the number of processes.
+
+Training state is checkpointed periodically and after every epoch (written on a
+background thread, see train_state.py); --resume continues from the latest
+checkpoint, and --fresh starts over after setting existing checkpoints aside
+(without either, train.py refuses to start over a previous run). Training stops
+early once validation loss stops improving, and the checkpoint with the lowest
+validation loss is the one saved for the app.
+
+Usage:
+    python Src/train.py --model efficientnet --epochs 10 --lr 0.001
+    python Src/train.py --model efficientnet --epochs 10 --resume
+    python Src/train.py --model efficientnet --epochs 10 --fresh
+    python Src/train.py --model deit --workers 8
+    # Two hosts with 8 processes each (run on every host with its own --node-rank)
+    python Src/train.py --model deit --workers 8 --nnodes 2 --node-rank 0 --master-addr 10.0.0.1
+    # Throughput at 1, 2, 4 and 8 processes on this host
+    python Src/train.py --model deit --scaling 1 2 4 8
+"""
+
+import argparse
+import math
+import os
+import socket
+import time
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch import nn, optim
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data.distributed import DistributedSampler
+from torchvision import models
+
+from data import SPLIT_SEED, load_splits, make_loader, train_transform
+from models import MODEL_SPECS, NUM_CLASSES, build_model, build_transform, checkpoint_path
+from profiling import profiled_request, stage
+from train_state import (BEST_NAME, CHECKPOINT_ROOT, AsyncCheckpointer, EarlyStopping, ResumableSampler,
+                         archive_checkpoints, capture_rng, checkpoint_name, existing_checkpoints, latest_checkpoint,
+                         load_checkpoint, restore_rng)
+
+
+def build_for_training(name):
+    """ImageNet-initialized model set up exactly like the notebook."""
+    if name == 'resnet50':
+        model = models.resnet50(weights=models.ResNet50_Weights.IMAGENET1K_V1)
+        # Only the new classification layer is trained
+        for param in model.parameters():
+            param.requires_grad = False
+        model.fc = nn.Linear(model.fc.in_features, NUM_CLASSES)
+        return model
+    if name == 'efficientnet':
+        from efficientnet_pytorch import EfficientNet
+        return EfficientNet.from_pretrained('efficientnet-b0', num_classes=NUM_CLASSES)
+    if name == 'deit':
+        import timm
+        return timm.create_model('deit_base_patch16_224', pretrained=True)
+    if name in MODEL_SPECS:
+        return build_model(name)
+    raise ValueError(f"Unknown model: {name}")
+
+
+def make_optimizer(model, lr):
+    """Adam over the trainable parameters (only the head for the frozen ResNet)."""
+    return optim.Adam([p for p in model.parameters() if p.requires_grad], lr=lr)
+
+
+def train_one_epoch(model, loader, criterion, optimizer, device, start_step=0, running_loss=0.0, on_step=None):
+    """One pass over the training loader; returns the mean training loss.
+
+    When resuming part-way through an epoch, the loader yields only the remaining
+    batches; start_step and running_loss carry over the batches already trained.
+    on_step(step, running_loss) is called after every optimizer step.
+    """
+    model.train()
+    batches = iter(loader)
+
+    for step in range(start_step + 1, start_step + len(loader) + 1):
+        with profiled_request('train_step'):
+            with stage('data'):
+                inputs, labels = next(batches)
+                inputs, labels = inputs.to(device), labels.to(device)
+
+            optimizer.zero_grad()
+
+            with stage('forward'):
+                outputs = model(inputs)
+                loss = criterion(outputs, labels)
+
+            with stage('backward'):
+                loss.backward()
+
+            with stage('optimizer_step'):
+                optimizer.step()
+
+            running_loss += loss.item()
+
+        if on_step is not None:
+            on_step(step, running_loss)
+
+    return running_loss / (start_step + len(loader))
+
+
+def validate(model, loader, criterion, device, distributed=False):
+    """Returns (mean validation loss, accuracy), reduced over all processes when distributed."""
+    model.eval()
+    val_loss = 0.0
+    correct = 0
+    total = 0
+    with torch.no_grad():
+        for inputs, labels in loader:
+            inputs, labels = inputs.to(device), labels.to(device)
+            outputs = model(inputs)
+            loss = criterion(outputs, labels)
+            val_loss += loss.item()
+            _, predicted = torch.max(outputs.data, 1)
+            total += labels.size(0)
+            correct += (predicted == labels).sum().item()
+    batches = len(loader)
+    if distributed:
+        # Sum of each shard's totals (DistributedSampler pads the last shard with a few repeated images)
+        totals = torch.tensor([val_loss, batches, correct, total], dtype=torch.float64)
+        dist.all_reduce(totals)
+        val_loss, batches, correct, total = totals.tolist()
+    return val_loss / batches, correct / total
+
+
+def init_distributed(rank, world_size, master_addr='127.0.0.1', master_port=29500, local_workers=1):
+    """Join the gloo process group and split this host's cores between its processes."""
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_workers))
+    if 'MASTER_ADDR' in os.environ and 'WORLD_SIZE' in os.environ:
+        dist.init_process_group('gloo', init_method='env://', rank=rank, world_size=world_size)
+    else:
+        dist.init_process_group('gloo', init_method=f'tcp://{master_addr}:{master_port}',
+                                rank=rank, world_size=world_size)
+
+
+def _build_once_per_host(name, rank, distributed):
+    # Rank 0 downloads the ImageNet weights first so the other processes read them from the cache
+    if distributed and rank != 0:
+        dist.barrier()
+    model = build_for_training(name)
+    if distributed and rank == 0:
+        dist.barrier()
+    return model
+
+
+def train(name, epochs=10, lr=0.001, batch_size=32, num_workers=0, output=None, rank=0, world_size=1,
+          checkpoint_dir=None, checkpoint_every=200, resume=False, fresh=False, patience=4, lr_patience=0):
+    """Train a registered model and save its best state_dict where the app loads it from.
+
+    Training state is checkpointed every checkpoint_every steps and after every epoch;
+    with resume=True it continues from the latest checkpoint in checkpoint_dir. Starting
+    over when checkpoint_dir already holds a run needs fresh=True, which moves that run's
+    checkpoints into a timestamped subdirectory; nothing is deleted. Training
+    stops after patience epochs without a lower validation loss. With lr_patience > 0
+    the learning rate also drops tenfold after that many such epochs; by default it
+    stays fixed, as in the notebook (0 disables either).
+    With world_size > 1 this is one process of a data-parallel run; the process
+    group must already be initialized (see init_distributed).
+    """
+    distributed = world_size > 1
+    # gloo all-reduces CPU tensors, so distributed runs train on CPU
+    device = torch.device("cuda:0" if torch.cuda.is_available() and not distributed else "cpu")
+    spec = MODEL_SPECS[name]
+    log = print if rank == 0 else (lambda *args, **kwargs: None)
+    torch.manual_seed(SPLIT_SEED + rank)
+
+    checkpoint_dir = checkpoint_dir or os.path.join(CHECKPOINT_ROOT, name)
+    if not resume and rank == 0 and existing_checkpoints(checkpoint_dir):
+        if not fresh:
+            raise ValueError(f"{checkpoint_dir} holds checkpoints from a previous run; pass --resume to continue it "
+                             f"or --fresh to set them aside and start over")
+        log(f"📦 Moved the previous run's checkpoints to {archive_checkpoints(checkpoint_dir)}")
+
+    train_dataset, _ = load_splits(train_transform(spec['image_size']))
+    _, val_dataset = load_splits(build_transform(name))
+    # The shuffle order is a function of (seed, epoch), so a resumed run sees the same batches
+    train_sampler = ResumableSampler(train_dataset, world_size, rank)
+    val_sampler = DistributedSampler(val_dataset, world_size, rank, shuffle=False) if distributed else None
+    loader_generator = torch.Generator().manual_seed(SPLIT_SEED)
+    trainloader = make_loader(train_dataset, batch_size, num_workers=num_workers, sampler=train_sampler,
+                              generator=loader_generator)
+    valloader = make_loader(val_dataset, batch_size, num_workers=num_workers, sampler=val_sampler)
+
+    model = _build_once_per_host(name, rank, distributed).to(device)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = make_optimizer(model, lr)
+    scheduler = None
+    if lr_patience > 0:
+        scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, factor=0.1, patience=lr_patience)
+    stopper = EarlyStopping(patience)
+
+    start_epoch, start_step, running_loss = 0, 0, 0.0
+    state = None
+    latest = latest_checkpoint(checkpoint_dir) if resume and rank == 0 else None
+    if latest:
+        state = load_checkpoint(latest)
+    if resume and distributed:
+        # Only rank 0 writes checkpoints, so every other rank (possibly on another host) takes the
+        # resume point from it; the weights follow when DistributedDataParallel broadcasts rank 0's
+        shared = [{key: value for key, value in state.items() if key != 'model'} if state else None]
+        dist.broadcast_object_list(shared, src=0)
+        state = state if rank == 0 else shared[0]
+    if state:
+        if (state['batch_size'], state['world_size']) != (batch_size, world_size):
+            raise ValueError(f"The checkpoint was written with batch size {state['batch_size']} and "
+                             f"{state['world_size']} processes; resume with the same settings")
+        if 'model' in state:
+            model.load_state_dict(state['model'])
+        optimizer.load_state_dict(state['optimizer'])
+        if scheduler is not None and state['scheduler'] is not None:
+            scheduler.load_state_dict(state['scheduler'])
+        stopper.load_state_dict(state['early_stopping'])
+        if rank == 0:
+            # The saved RNG state is rank 0's; other ranks keep their own seeding
+            restore_rng(state['rng'], loader_generator)
+        start_epoch, start_step, running_loss = state['epoch'], state['step'], state['running_loss']
+        log(f"▶️ Resuming from {latest}: epoch {start_epoch + 1}, step {start_step}")
+    elif resume:
+        log(f"⚠️ No checkpoint in {checkpoint_dir}, starting from scratch")
+
+    raw_model = model
+    if distributed:
+        # Broadcasts rank 0's weights, then averages gradients during every backward pass
+        model = DistributedDataParallel(model)
+    checkpointer = AsyncCheckpointer(checkpoint_dir) if rank == 0 else None
+    steps_per_epoch = math.ceil(train_sampler.num_samples / batch_size)
+
+    def save_state(epoch, step, loss_so_far):
+        checkpointer.save({
+            'model': raw_model.state_dict(), 'optimizer': optimizer.state_dict(),
+            'scheduler': scheduler.state_dict() if scheduler else None, 'early_stopping': stopper.state_dict(),
+            'rng': capture_rng(loader_generator), 'epoch': epoch, 'step': step, 'running_loss': loss_so_far,
+            'batch_size': batch_size, 'world_size': world_size,
+        }, checkpoint_name(epoch, step))
+
+    for epoch in range(start_epoch, epochs):
+        if stopper.should_stop:
+            break
+        train_sampler.set_epoch(epoch)
+        train_sampler.start_index = start_step * batch_size
+
+        def on_step(step, loss_so_far, epoch=epoch):
+            if checkpointer and checkpoint_every > 0 and step % checkpoint_every == 0 and step < steps_per_epoch:
+                save_state(epoch, step, loss_so_far)
+
+        train_loss = train_one_epoch(model, trainloader, criterion, optimizer, device,
+                                     start_step, running_loss, on_step)
+        start_step, running_loss = 0, 0.0
+        log(f"Epoch {epoch+1}, Loss: {train_loss}")
+        val_loss, accuracy = validate(model, valloader, criterion, device, distributed)
+        log(f'Validation Loss: {val_loss}, Accuracy: {100 * accuracy}%')
+
+        if scheduler is not None:
+            scheduler.step(val_loss)
+        improved = stopper.step(val_loss, epoch)
+        if checkpointer:
+            if improved:
+                checkpointer.save(raw_model.state_dict(), BEST_NAME)
+            save_state(epoch + 1, 0, 0.0)
+
+    if stopper.should_stop:
+        log(f"⏹️ Stopped early: no lower validation loss for {patience} epochs "
+            f"(best {stopper.best:.4f} after epoch {stopper.best_epoch + 1})")
+
+    if rank == 0:
+        checkpointer.wait()
+        checkpointer.close()
+        best = os.path.join(checkpoint_dir, BEST_NAME)
+        if os.path.exists(best):
+            raw_model.load_state_dict(load_checkpoint(best))
+        output = output or checkpoint_path(name)
+        torch.save(raw_model.state_dict(), output)
+        print(f"Model saved to {output}")
+        if checkpointer.saved:
+            print(f"💾 {checkpointer.saved} checkpoints in {checkpoint_dir}: "
+                  f"{1000 * checkpointer.stall_seconds / checkpointer.saved:.0f} ms per save on the training thread, "
+                  f"{1000 * checkpointer.write_seconds / checkpointer.saved:.0f} ms written in the background")
+    if distributed:
+        dist.barrier()
+    return raw_model
+
+
+def _checkpoint_args(args):
+    return {'checkpoint_dir': args.checkpoint_dir, 'checkpoint_every': args.checkpoint_every,
+            'resume': args.resume, 'fresh': args.fresh, 'patience': args.patience, 'lr_patience': args.lr_patience}
+
+
+def _train_worker(local_rank, args):
+    rank = args.node_rank * args.workers + local_rank
+    world_size = args.nnodes * args.workers
+    init_distributed(rank, world_size, args.master_addr, args.master_port, args.workers)
+    try:
+        train(args.model, args.epochs, args.lr, args.batch_size, args.num_workers, args.output, rank, world_size,
+              **_checkpoint_args(args))
+    finally:
+        dist.destroy_process_group()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _throughput_worker(rank, name, world_size, port, steps, batch_size, results):
+    init_distributed(rank, world_size, master_port=port, local_workers=world_size)
+    try:
+        spec = MODEL_SPECS[name]
+        train_dataset, _ = load_splits(train_transform(spec['image_size']))
+        sampler = DistributedSampler(train_dataset, world_size, rank, shuffle=True, seed=SPLIT_SEED)
+        loader = make_loader(train_dataset, batch_size, sampler=sampler)
+        epoch, batches = 0, iter(loader)
+        # Random weights: throughput does not depend on them, and nothing is downloaded
+        model = DistributedDataParallel(build_model(name))
+        criterion = nn.CrossEntropyLoss()
+        optimizer = make_optimizer(model, 1e-4)
+        model.train()
+
+        def step():
+            nonlocal epoch, batches
+            try:
+                inputs, labels = next(batches)
+            except StopIteration:
+                # Small shards run out before warm-up plus timed steps; start the next epoch
+                epoch += 1
+                sampler.set_epoch(epoch)
+                batches = iter(loader)
+                inputs, labels = next(batches)
+            optimizer.zero_grad()
+            criterion(model(inputs), labels).backward()
+            optimizer.step()
+
+        for _ in range(3):
+            step()
+        dist.barrier()
+        start = time.perf_counter()
+        for _ in range(steps):
+            step()
+        dist.barrier()
+        if rank == 0:
+            results.put(steps * batch_size * world_size / (time.perf_counter() - start))
+    finally:
+        dist.destroy_process_group()
+
+
+def scaling_report(name, worker_counts=(1, 2, 4, 8), steps=20, batch_size=32, output='reports/ddp_scaling.txt'):
+    """Training images/sec with 1..N local gloo processes (data loading, forward, backward, all-reduce)."""
+    results = mp.get_context('spawn').SimpleQueue()
+    rows = []
+    for workers in worker_counts:
+        mp.spawn(_throughput_worker, args=(name, workers, _free_port(), steps, batch_size, results), nprocs=workers)
+        rows.append((workers, results.get()))
+        print(f"{workers} workers: {rows[-1][1]:.1f} images/s")
+
+    base = rows[0][1] / rows[0][0]
+    lines = [f"{MODEL_SPECS[name]['display_name']}: data-parallel training on {os.cpu_count()} cores, "
+             f"batch {batch_size} per worker, {steps} timed steps",
+             f"{'workers':>8}{'images/s':>10}{'speedup':>9}{'efficiency':>12}"]
+    for workers, rate in rows:
+        lines.append(f"{workers:>8}{rate:>10.1f}{rate / rows[0][1]:>8.2f}x{rate / (base * workers):>12.0%}")
+    print('\n' + '\n'.join(lines))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    print(f"\nReport written to {output}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train one of the Alzheimer's detection models")
+    parser.add_argument('--model', default='efficientnet', choices=['resnet50', 'efficientnet', 'deit'])
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--lr', type=float, default=0.001)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--num-workers', type=int, default=0)
+    parser.add_argument('--output', default=None, help="Checkpoint path (defaults to the app's Src/ location)")
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help="Where training state is checkpointed (default: checkpoints/<model>)")
+    parser.add_argument('--checkpoint-every', type=int, default=200, help="Steps between mid-epoch checkpoints")
+    start = parser.add_mutually_exclusive_group()
+    start.add_argument('--resume', action='store_true', help="Continue from the latest checkpoint")
+    start.add_argument('--fresh', action='store_true',
+                       help="Start over, moving existing checkpoints into a timestamped subdirectory")
+    parser.add_argument('--patience', type=int, default=4,
+                        help="Stop after this many epochs without a lower validation loss (0 disables)")
+    parser.add_argument('--lr-patience', type=int, default=0,
+                        help="Divide the learning rate by 10 after this many such epochs (default 0: fixed lr)")
+    parser.add_argument('--workers', type=int, default=1, help="Data-parallel training processes on this host")
+    parser.add_argument('--nnodes', type=int, default=1, help="Number of hosts taking part")
+    parser.add_argument('--node-rank', type=int, default=0, help="Index of this host (0 on the master)")
+    parser.add_argument('--master-addr', default='127.0.0.1', help="Address of the host with node rank 0")
+    parser.add_argument('--master-port', type=int, default=29500)
+    parser.add_argument('--scaling', nargs='+', type=int, default=None,
+                        help="Only measure images/sec at these worker counts")
+    parser.add_argument('--steps', type=int, default=20, help="Timed steps per worker count (--scaling)")
+    args = parser.parse_args()
+
+    if args.scaling:
+        scaling_report(args.model, args.scaling, args.steps, args.batch_size)
+    elif 'RANK' in os.environ and 'WORLD_SIZE' in os.environ:
+        # Launched by torchrun: one process per rank, rendezvous from the environment
+        init_distributed(int(os.environ['RANK']), int(os.environ['WORLD_SIZE']),
+                         local_workers=int(os.environ.get('LOCAL_WORLD_SIZE', 1)))
+        try:
+            train(args.model, args.epochs, args.lr, args.batch_size, args.num_workers, args.output,
+                  int(os.environ['RANK']), int(os.environ['WORLD_SIZE']), **_checkpoint_args(args))
+        finally:
+            dist.destroy_process_group()
+    elif args.workers * args.nnodes > 1:
+        mp.spawn(_train_worker, args=(args,), nprocs=args.workers)
+    else:
+        train(args.model, args.epochs, args.lr, args.batch_size, args.num_workers, args.output,
+              **_checkpoint_args(args))
+
+
+if __name__ == '__main__':
+    main()
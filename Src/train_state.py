@@ -0,0 +1,203 @@
+"""
+Resumable training state for train.py.
+A checkpoint holds the model, optimizer, LR scheduler and early-stopping state,
+the RNG states and the position in the training data (epoch and batch within it).
+On the training thread, saving only copies the tensors to CPU memory. Serialising
+and writing the file happen on a background thread, so the training step is not
+held up by disk I/O. Files are written to a temporary name, fsynced, then swapped
+in atomically, so a crash mid-write never leaves a truncated checkpoint.
+"""
+
+import atexit
+import glob
+import itertools
+import math
+import os
+import queue
+import random
+import threading
+import time
+
+import torch
+from torch.utils.data.distributed import DistributedSampler
+
+from data import SPLIT_SEED
+
+CHECKPOINT_ROOT = 'checkpoints'
+BEST_NAME = 'best.pt'
+
+
+class ResumableSampler(DistributedSampler):
+    """Seeded per-epoch shuffle, sharded when distributed, that can start part-way through an epoch."""
+
+    def __init__(self, dataset, num_replicas=1, rank=0, seed=SPLIT_SEED):
+        super().__init__(dataset, num_replicas, rank, shuffle=True, seed=seed)
+        self.start_index = 0
+
+    def __iter__(self):
+        return itertools.islice(super().__iter__(), self.start_index, None)
+
+    def __len__(self):
+        return self.num_samples - self.start_index
+
+
+class EarlyStopping:
+    """Stops training once validation loss has not improved by min_delta for `patience` epochs (0 disables)."""
+
+    def __init__(self, patience=4, min_delta=0.0):
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best = math.inf
+        self.best_epoch = None
+        self.bad_epochs = 0
+
+    def step(self, val_loss, epoch):
+        """Record an epoch's validation loss; returns True when it is a new best."""
+        if val_loss < self.best - self.min_delta:
+            self.best, self.best_epoch, self.bad_epochs = val_loss, epoch, 0
+            return True
+        self.bad_epochs += 1
+        return False
+
+    @property
+    def should_stop(self):
+        return self.patience > 0 and self.bad_epochs >= self.patience
+
+    def state_dict(self):
+        return {'best': self.best, 'best_epoch': self.best_epoch, 'bad_epochs': self.bad_epochs}
+
+    def load_state_dict(self, state):
+        self.best, self.best_epoch, self.bad_epochs = state['best'], state['best_epoch'], state['bad_epochs']
+
+
+def capture_rng(loader_generator=None):
+    """RNG states that drive weight updates (dropout) and augmentation."""
+    state = {'python': random.getstate(), 'torch': torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    if loader_generator is not None:
+        state['loader'] = loader_generator.get_state()
+    return state
+
+
+def restore_rng(state, loader_generator=None):
+    random.setstate(state['python'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+    if loader_generator is not None and 'loader' in state:
+        loader_generator.set_state(state['loader'])
+
+
+def _to_cpu(value):
+    # The training step keeps updating the live tensors, so the writer gets its own copy
+    if isinstance(value, torch.Tensor):
+        return value.detach().to('cpu', copy=True)
+    if isinstance(value, dict):
+        return {key: _to_cpu(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_to_cpu(item) for item in value)
+    return value
+
+
+def checkpoint_name(epoch, step):
+    """File name that sorts in training order: the state before `step` of 0-based `epoch`."""
+    return f'epoch{epoch:04d}-step{step:07d}.pt'
+
+
+def latest_checkpoint(directory):
+    """Newest resumable checkpoint in directory, or None."""
+    paths = sorted(glob.glob(os.path.join(directory, 'epoch*-step*.pt')))
+    return paths[-1] if paths else None
+
+
+def existing_checkpoints(directory):
+    """A previous run's resumable and best checkpoints in directory."""
+    return sorted(glob.glob(os.path.join(directory, 'epoch*-step*.pt'))) + glob.glob(os.path.join(directory, BEST_NAME))
+
+
+def archive_checkpoints(directory):
+    """Move a previous run's checkpoints into a timestamped subdirectory; returns it (None if there were none)."""
+    paths = existing_checkpoints(directory)
+    if not paths:
+        return None
+    archive = os.path.join(directory, f"run-{time.strftime('%Y%m%d-%H%M%S')}")
+    os.makedirs(archive, exist_ok=True)
+    for path in paths:
+        os.replace(path, os.path.join(archive, os.path.basename(path)))
+    return archive
+
+
+def load_checkpoint(path):
+    return torch.load(path, map_location='cpu', weights_only=True)
+
+
+class AsyncCheckpointer:
+    """Writes checkpoints on a background thread and keeps the newest `keep` resumable ones."""
+
+    def __init__(self, directory, keep=2):
+        self.directory = directory
+        self.keep = keep
+        self.saved = 0
+        self.stall_seconds = 0.0
+        self.write_seconds = 0.0
+        self._error = None
+        self._closed = False
+        os.makedirs(directory, exist_ok=True)
+        # At most one snapshot waits for the writer, so a slow disk slows saving down instead of piling up copies
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def save(self, state, name):
+        """Copy state to CPU and queue it for writing as directory/name; returns the path."""
+        self._raise_failed()
+        start = time.perf_counter()
+        self._queue.put((name, _to_cpu(state)))
+        self.stall_seconds += time.perf_counter() - start
+        return os.path.join(self.directory, name)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except Exception as e:
+                self._error = e
+                print(f"❌ Checkpoint write failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, name, state):
+        start = time.perf_counter()
+        path = os.path.join(self.directory, name)
+        with open(path + '.tmp', 'wb') as f:
+            torch.save(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        if name != BEST_NAME:
+            for old in sorted(glob.glob(os.path.join(self.directory, 'epoch*-step*.pt')))[:-self.keep]:
+                os.remove(old)
+        self.write_seconds += time.perf_counter() - start
+        self.saved += 1
+
+    def _raise_failed(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(f"Checkpoint write failed: {error}") from error
+
+    def wait(self):
+        """Block until every queued checkpoint is on disk."""
+        self._queue.join()
+        self._raise_failed()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
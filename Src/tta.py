@@ -0,0 +1,153 @@
+"""
+Batched test-time augmentation (TTA).
+Builds K augmented views of a preprocessed scan (flips and small rotations, as in
+the notebook's training transforms) and classifies them in a single forward pass.
+K is chosen adaptively so the expected latency stays within a budget.
+
+Benchmark usage:
+    python Src/tta.py --model efficientnet --views 1 2 4 8
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+import torch
+from torchvision.transforms import functional as F
+
+DEFAULT_BUDGET_MS = 300.0
+# Latency budget the app serves with (TTA_ENABLED=true)
+TTA_BUDGET_MS = float(os.getenv("TTA_BUDGET_MS", DEFAULT_BUDGET_MS))
+EMA_DECAY = 0.8
+
+# Ordered by usefulness: the first K views are used when K views fit in the budget
+VIEWS = [
+    ('identity', lambda x: x),
+    ('hflip', F.hflip),
+    ('vflip', F.vflip),
+    ('rot+5', lambda x: F.rotate(x, 5)),
+    ('rot-5', lambda x: F.rotate(x, -5)),
+    ('hvflip', lambda x: F.vflip(F.hflip(x))),
+    ('rot+10', lambda x: F.rotate(x, 10)),
+    ('rot-10', lambda x: F.rotate(x, -10)),
+]
+MAX_VIEWS = len(VIEWS)
+
+
+def make_views(image, k):
+    """Stack the first k views of a preprocessed [1, C, H, W] tensor into a [k, C, H, W] batch."""
+    k = max(1, min(k, MAX_VIEWS))
+    return torch.cat([fn(image) for _, fn in VIEWS[:k]], dim=0)
+
+
+class TTAPredictor:
+    """Average softmax probabilities over K views, with K picked to fit a latency budget."""
+
+    def __init__(self, model, budget_ms=DEFAULT_BUDGET_MS, max_views=MAX_VIEWS):
+        self.model = model
+        self.budget_ms = budget_ms
+        self.max_views = max(1, min(max_views, MAX_VIEWS))
+        self.latency_ms = {}  # K -> exponential moving average of the batched forward time
+
+    def calibrate(self, image):
+        """Time one view and the full view batch so the first real request has an estimate."""
+        for k in sorted({1, self.max_views}):
+            self._forward(image, k)
+
+    def estimate_ms(self, k):
+        """Expected latency for K views, interpolated linearly from the measured batch sizes."""
+        if k in self.latency_ms:
+            return self.latency_ms[k]
+        if not self.latency_ms:
+            return 0.0
+        measured = sorted(self.latency_ms)
+        if len(measured) == 1:
+            k0 = measured[0]
+            return self.latency_ms[k0] * k / k0
+        # Fixed per-call overhead plus a per-view cost
+        lo, hi = measured[0], measured[-1]
+        per_view = (self.latency_ms[hi] - self.latency_ms[lo]) / (hi - lo)
+        return self.latency_ms[lo] + per_view * (k - lo)
+
+    def choose_k(self):
+        """Largest K whose estimated latency fits the budget (at least one view)."""
+        for k in range(self.max_views, 0, -1):
+            if self.estimate_ms(k) <= self.budget_ms:
+                return k
+        return 1
+
+    def _forward(self, image, k):
+        batch = make_views(image, k)
+        start = time.perf_counter()
+        with torch.no_grad():
+            output = self.model(batch)
+        elapsed = (time.perf_counter() - start) * 1000
+        previous = self.latency_ms.get(k)
+        self.latency_ms[k] = elapsed if previous is None else EMA_DECAY * previous + (1 - EMA_DECAY) * elapsed
+        return output
+
+    def predict(self, image):
+        """
+        Classify a preprocessed [1, C, H, W] tensor with TTA.
+
+        Returns:
+            tuple: (label_idx, probabilities, k) with probabilities averaged over k views
+        """
+        k = self.choose_k()
+        output = self._forward(image, k)
+        probabilities = torch.nn.functional.softmax(output, dim=1).mean(dim=0)
+        return int(probabilities.argmax()), probabilities.numpy(), k
+
+
+def benchmark(model, image, view_counts, runs=20):
+    """Compare one batched forward pass of K views against K single-view calls."""
+    rows = []
+    with torch.no_grad():
+        model(make_views(image, MAX_VIEWS))  # warm-up
+        for k in view_counts:
+            batch = make_views(image, k)
+            singles = [batch[i:i + 1] for i in range(k)]
+
+            batched, sequential = [], []
+            for _ in range(runs):
+                start = time.perf_counter()
+                model(batch)
+                batched.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                for view in singles:
+                    model(view)
+                sequential.append(time.perf_counter() - start)
+
+            rows.append({
+                'views': k,
+                'batched_ms': float(np.median(batched) * 1000),
+                'sequential_ms': float(np.median(sequential) * 1000),
+            })
+
+    print(f"\n{'views':>6}{'batched ms':>13}{'K calls ms':>13}{'speedup':>10}")
+    for row in rows:
+        print(f"{row['views']:>6}{row['batched_ms']:>13.1f}{row['sequential_ms']:>13.1f}"
+              f"{row['sequential_ms'] / row['batched_ms']:>9.2f}x")
+    return rows
+
+
+def main():
+    from models import MODEL_SPECS, load_model
+
+    parser = argparse.ArgumentParser(description="Benchmark batched TTA against repeated single calls")
+    parser.add_argument('--model', default='efficientnet', choices=list(MODEL_SPECS))
+    parser.add_argument('--views', nargs='+', type=int, default=[1, 2, 4, 8])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=None, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    spec = MODEL_SPECS[args.model]
+    image = torch.randn(1, spec['in_channels'], spec['image_size'], spec['image_size'])
+    benchmark(load_model(args.model), image, args.views, args.runs)
+
+
+if __name__ == '__main__':
+    main()
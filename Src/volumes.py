@@ -0,0 +1,424 @@
+"""
+3D MRI volume support: NIfTI files and DICOM series.
+Volumes are never loaded whole. NIfTI data is memory-mapped through nibabel's
+array proxy and DICOM series are indexed from their headers alone, so only the
+selected axial slices are read, a batch at a time, and run through the same
+transform as 2D uploads. Per-slice probabilities are averaged into one
+per-subject prediction.
+
+Usage:
+    python Src/volumes.py synth --out cache/synthetic_volumes
+    python Src/volumes.py predict cache/synthetic_volumes --model efficientnet
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import tempfile
+import zipfile
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+from PIL import Image
+
+from ingest import check_upload_size
+from model_specs import CLASS_NAMES, LABELS, MODEL_SPECS
+
+try:
+    import nibabel as nib
+    NIBABEL_AVAILABLE = True
+except ImportError:
+    NIBABEL_AVAILABLE = False
+
+try:
+    import pydicom
+    from pydicom.errors import InvalidDicomError
+    PYDICOM_AVAILABLE = True
+except ImportError:
+    PYDICOM_AVAILABLE = False
+
+NIFTI_SUFFIXES = ('.nii', '.nii.gz')
+DICOM_ARCHIVE_SUFFIXES = ('.zip',)
+
+DEFAULT_SLICES = 32
+DEFAULT_BATCH_SIZE = 8
+# Central fraction of the axial extent sampled; the ends are mostly skull and neck
+COVERAGE = 0.6
+# Slices with less than this fraction of foreground voxels are skipped
+MIN_FOREGROUND = 0.05
+
+# DICOM zips are checked from the central directory before any member is read
+ZIP_MAX_MEMBERS = int(os.getenv("VOLUME_ZIP_MAX_FILES", 2000))
+ZIP_MAX_UNCOMPRESSED_BYTES = int(float(os.getenv("VOLUME_ZIP_MAX_MB", 1024)) * 1024 * 1024)
+
+REPORT_PATH = os.path.join('reports', 'volume_predictions.csv')
+
+
+class VolumeError(ValueError):
+    """Raised when a volume cannot be read or has no usable slices."""
+
+
+def is_volume(name):
+    """True for file names handled here rather than as 2D images."""
+    name = name.lower()
+    return name.endswith(NIFTI_SUFFIXES + DICOM_ARCHIVE_SUFFIXES)
+
+
+class NiftiVolume:
+    """Memory-mapped NIfTI volume read one axial slice at a time."""
+
+    def __init__(self, path):
+        if not NIBABEL_AVAILABLE:
+            raise VolumeError("NIfTI support requires nibabel: pip install nibabel")
+        # .nii is memory-mapped; .nii.gz is decompressed as a stream up to the requested slice
+        self.image = nib.load(path, mmap=True)
+        self.ornt = nib.io_orientation(self.image.affine)
+        # Array axis that runs inferior-superior in world space
+        self.axis = int(np.flatnonzero(self.ornt[:, 0] == 2)[0])
+        self.depth = self.image.shape[self.axis]
+
+    def read_slice(self, index):
+        """Return one axial slice as float32 [H, W], anterior at the top."""
+        proxy = self.image.dataobj
+        slicer = [slice(None)] * 3 + [0] * (len(proxy.shape) - 3)  # first frame of 4D series
+        slicer[self.axis] = index
+        plane = np.asarray(proxy[tuple(slicer)], dtype=np.float32)
+
+        in_plane = [a for a in range(3) if a != self.axis]
+        if self.ornt[in_plane[0], 0] != 0:  # put left-right first
+            plane = plane.T
+            in_plane.reverse()
+        for dim, axis in enumerate(in_plane):
+            if self.ornt[axis, 1] < 0:
+                plane = np.flip(plane, dim)
+        return np.rot90(plane)
+
+    def close(self):
+        self.image = None
+
+
+class DicomSeries:
+    """DICOM series (directory or zip) indexed from headers; pixel data is read per slice."""
+
+    def __init__(self, path):
+        if not PYDICOM_AVAILABLE:
+            raise VolumeError("DICOM support requires pydicom: pip install pydicom")
+        self.archive = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+        if self.archive is not None:
+            infos = [info for info in self.archive.infolist() if not info.is_dir()]
+            uncompressed = sum(info.file_size for info in infos)
+            if len(infos) > ZIP_MAX_MEMBERS or uncompressed > ZIP_MAX_UNCOMPRESSED_BYTES:
+                self.archive.close()
+                raise VolumeError(f"Archive holds {len(infos)} files and {uncompressed / 1024 / 1024:.0f} MB "
+                                  f"uncompressed; the limits are {ZIP_MAX_MEMBERS} files and "
+                                  f"{ZIP_MAX_UNCOMPRESSED_BYTES / 1024 / 1024:.0f} MB")
+            members = [info.filename for info in infos]
+        else:
+            members = [os.path.join(root, f) for root, _, files in os.walk(path) for f in files]
+
+        headers = []
+        for member in members:
+            try:
+                header = pydicom.dcmread(self._open(member), stop_before_pixels=True)
+            except InvalidDicomError:
+                continue
+            if 'ImagePositionPatient' in header or 'InstanceNumber' in header:
+                headers.append((member, header))
+        if not headers:
+            raise VolumeError(f"No DICOM images found in {path}")
+
+        # Keep the largest series if several were bundled together
+        series = {}
+        for member, header in headers:
+            series.setdefault(header.get('SeriesInstanceUID'), []).append((member, header))
+        headers = max(series.values(), key=len)
+        headers.sort(key=lambda item: self._position(item[1]))
+        self.members = [member for member, _ in headers]
+        self.depth = len(self.members)
+
+    def _open(self, member):
+        return self.archive.open(member) if self.archive is not None else member
+
+    @staticmethod
+    def _position(header):
+        if 'ImagePositionPatient' in header and 'ImageOrientationPatient' in header:
+            orientation = np.array(header.ImageOrientationPatient, dtype=float)
+            normal = np.cross(orientation[:3], orientation[3:])
+            return float(np.dot(normal, np.array(header.ImagePositionPatient, dtype=float)))
+        return float(header.get('InstanceNumber', 0))
+
+    def read_slice(self, index):
+        """Return one slice as float32 [H, W] with the modality rescale applied."""
+        dataset = pydicom.dcmread(self._open(self.members[index]))
+        plane = dataset.pixel_array.astype(np.float32)
+        return plane * float(dataset.get('RescaleSlope', 1)) + float(dataset.get('RescaleIntercept', 0))
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+
+@contextmanager
+def open_volume(source, name=None):
+    """Open a NIfTI file or DICOM series from a path or an uploaded file object.
+
+    Uploads are checked against the upload byte budget (UploadRejected), then
+    spooled to a temporary file so they can be memory-mapped, and removed when
+    the block exits.
+    """
+    tmpdir = None
+    if not isinstance(source, (str, os.PathLike)):
+        check_upload_size(source)
+        tmpdir = tempfile.mkdtemp(prefix='volume_')
+        path = os.path.join(tmpdir, os.path.basename(name or getattr(source, 'name', 'upload')))
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(source, f)
+    else:
+        path = str(source)
+
+    volume = None
+    try:
+        if path.lower().endswith(NIFTI_SUFFIXES):
+            volume = NiftiVolume(path)
+        elif os.path.isdir(path) or path.lower().endswith(DICOM_ARCHIVE_SUFFIXES):
+            volume = DicomSeries(path)
+        else:
+            raise VolumeError(f"Unsupported volume format: {path}")
+        yield volume
+    finally:
+        if volume is not None:
+            volume.close()
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def select_slices(depth, num_slices=DEFAULT_SLICES, coverage=COVERAGE):
+    """Evenly spaced slice indices over the central `coverage` of the volume."""
+    margin = depth * (1 - coverage) / 2
+    start, stop = int(margin), max(int(depth - margin) - 1, int(margin))
+    return sorted(set(np.linspace(start, stop, min(num_slices, depth)).round().astype(int).tolist()))
+
+
+def slice_to_image(plane):
+    """Window a slice to its 0.5-99.5 percentile range and return an RGB image, or None if empty."""
+    low, high = np.percentile(plane, [0.5, 99.5])
+    if high <= low:
+        return None
+    scaled = np.clip((plane - low) / (high - low), 0, 1)
+    if (scaled > 0.1).mean() < MIN_FOREGROUND:
+        return None
+    return Image.fromarray((scaled * 255).astype(np.uint8)).convert('RGB')
+
+
+def iter_batches(volume, transform, indices, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield (indices, images, [B, C, H, W] tensor) for the usable slices, batch_size at a time."""
+    import torch
+
+    batch_indices, images = [], []
+    for index in indices:
+        image = slice_to_image(volume.read_slice(index))
+        if image is None:
+            continue
+        batch_indices.append(index)
+        images.append(image)
+        if len(images) == batch_size:
+            yield batch_indices, images, torch.stack([transform(im) for im in images])
+            batch_indices, images = [], []
+    if images:
+        yield batch_indices, images, torch.stack([transform(im) for im in images])
+
+
+def model_predictor(model, lock=None, hooks=()):
+    """predict_batch function for a plain classifier: [B, C, H, W] -> probabilities [B, classes]."""
+    import torch
+
+    def predict_batch(batch):
+        with lock or nullcontext():
+            with torch.no_grad():
+                probs = torch.nn.functional.softmax(model(batch), dim=1).numpy()
+            # Release whatever the app's Grad-CAM / embedding hooks captured from this batch
+            for pop in hooks:
+                pop()
+        return probs
+
+    return predict_batch
+
+
+def predict_volume(volume, predict_batch, transform, num_slices=DEFAULT_SLICES, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream selected slices through the model and aggregate them into one prediction.
+
+    Returns:
+        dict: label_idx, probabilities (mean over slices), slice_indices,
+        slice_probabilities [N, C], agreement (fraction of slices voting for
+        label_idx) and preview (the middle analyzed slice as a PIL image)
+    """
+    indices = select_slices(volume.depth, num_slices)
+    middle = indices[len(indices) // 2] if indices else None
+    used, collected, preview = [], [], None
+    for batch_indices, images, batch in iter_batches(volume, transform, indices, batch_size):
+        collected.append(predict_batch(batch))
+        used.extend(batch_indices)
+        if preview is None or middle in batch_indices:
+            preview = images[batch_indices.index(middle)] if middle in batch_indices else images[0]
+    if not collected:
+        raise VolumeError("No slice of the volume contains enough brain tissue to analyze")
+
+    slice_probs = np.concatenate(collected)
+    probs = slice_probs.mean(axis=0)
+    label_idx = int(probs.argmax())
+    return {
+        'label_idx': label_idx,
+        'probabilities': probs,
+        'slice_indices': used,
+        'slice_probabilities': slice_probs,
+        'agreement': float((slice_probs.argmax(axis=1) == label_idx).mean()),
+        'preview': preview,
+    }
+
+
+def find_volumes(paths):
+    """Expand the given paths into NIfTI files and DICOM series (directories of .dcm files or zips)."""
+    found = []
+    for path in paths:
+        if os.path.isfile(path) and is_volume(path):
+            found.append(path)
+        elif os.path.isdir(path):
+            entries = sorted(os.listdir(path))
+            if any(e.lower().endswith('.dcm') for e in entries):
+                found.append(path)
+            else:
+                found.extend(find_volumes([os.path.join(path, e) for e in entries]))
+    return found
+
+
+def synthesize(out_dir, data_dir='train', per_class=2, depth=48, seed=0):
+    """Stack training slices of one class into NIfTI and DICOM test volumes, with blank slices at both ends."""
+    rng = np.random.default_rng(seed)
+    written = []
+    for class_name in CLASS_NAMES:
+        class_dir = os.path.join(data_dir, class_name)
+        files = sorted(f for f in os.listdir(class_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+        for subject in range(per_class):
+            chosen = rng.choice(files, size=depth // 2, replace=False)
+            planes = [np.asarray(Image.open(os.path.join(class_dir, f)).convert('L'), dtype=np.int16) for f in chosen]
+            blank = np.zeros_like(planes[0])
+            planes = [blank] * (depth // 4) + planes + [blank] * (depth - depth // 4 - len(planes))
+
+            target = os.path.join(out_dir, class_name)
+            os.makedirs(target, exist_ok=True)
+            if NIBABEL_AVAILABLE:
+                # Array axes are (x, y, z) in RAS; undo the display rotation applied when reading
+                volume = np.stack([np.rot90(p, k=-1) for p in planes], axis=2)
+                for suffix in NIFTI_SUFFIXES:
+                    path = os.path.join(target, f'subject_{subject:02d}{suffix}')
+                    nib.save(nib.Nifti1Image(volume, np.eye(4)), path)
+                    written.append(path)
+            if PYDICOM_AVAILABLE:
+                path = os.path.join(target, f'subject_{subject:02d}_dicom')
+                _write_dicom_series(path, planes, f'{class_name}-{subject:02d}')
+                written.append(path)
+    if not written:
+        raise VolumeError("Install nibabel and/or pydicom to write synthetic volumes")
+    print(f"✅ Wrote {len(written)} synthetic volumes to {out_dir}")
+    return written
+
+
+def _write_dicom_series(path, planes, patient_id):
+    from pydicom.dataset import FileDataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, MRImageStorage, generate_uid
+
+    os.makedirs(path, exist_ok=True)
+    study_uid, series_uid = generate_uid(), generate_uid()
+    order = np.random.default_rng(0).permutation(len(planes))  # files deliberately out of slice order
+    for file_number, i in enumerate(order):
+        meta = FileMetaDataset()
+        meta.MediaStorageSOPClassUID = MRImageStorage
+        meta.MediaStorageSOPInstanceUID = generate_uid()
+        meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        filename = os.path.join(path, f'IM{file_number:04d}.dcm')
+        dataset = FileDataset(filename, {}, file_meta=meta, preamble=b'\0' * 128)
+        dataset.is_little_endian, dataset.is_implicit_VR = True, False
+        dataset.SOPClassUID, dataset.SOPInstanceUID = MRImageStorage, meta.MediaStorageSOPInstanceUID
+        dataset.StudyInstanceUID, dataset.SeriesInstanceUID = study_uid, series_uid
+        dataset.Modality, dataset.PatientID = 'MR', patient_id
+        dataset.InstanceNumber = int(i) + 1
+        dataset.ImagePositionPatient = [0.0, 0.0, float(i)]
+        dataset.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+        dataset.PixelSpacing, dataset.SliceThickness = [1, 1], 1
+        dataset.Rows, dataset.Columns = planes[i].shape
+        dataset.SamplesPerPixel, dataset.PhotometricInterpretation = 1, 'MONOCHROME2'
+        dataset.BitsAllocated, dataset.BitsStored, dataset.HighBit, dataset.PixelRepresentation = 16, 16, 15, 0
+        dataset.PixelData = planes[i].astype(np.uint16).tobytes()
+        dataset.save_as(filename)
+
+
+def predict_paths(paths, model_name='efficientnet', num_slices=DEFAULT_SLICES, batch_size=DEFAULT_BATCH_SIZE,
+                  output=REPORT_PATH):
+    """Batch-predict every volume under `paths` and write one CSV row per subject."""
+    from models import build_transform, load_model
+
+    transform = build_transform(model_name)
+    predict_batch = model_predictor(load_model(model_name))
+    rows = []
+    for path in find_volumes(paths):
+        try:
+            with open_volume(path) as volume:
+                result = predict_volume(volume, predict_batch, transform, num_slices, batch_size)
+        except VolumeError as e:
+            print(f"⚠️ Skipped {path}: {e}")
+            continue
+        parent = os.path.basename(os.path.dirname(os.path.normpath(path)))
+        row = {
+            'path': path,
+            'expected': LABELS[CLASS_NAMES.index(parent)] if parent in CLASS_NAMES else '',
+            'prediction': LABELS[result['label_idx']],
+            'confidence': float(result['probabilities'].max()),
+            'slices': len(result['slice_indices']),
+            'agreement': result['agreement'],
+        }
+        row.update({label: float(p) for label, p in zip(LABELS, result['probabilities'])})
+        rows.append(row)
+        print(f"{path}: {row['prediction']} ({row['confidence']:.1%}, {row['slices']} slices, "
+              f"{row['agreement']:.0%} agree)")
+
+    if rows:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        labelled = [r for r in rows if r['expected']]
+        if labelled:
+            accuracy = sum(r['expected'] == r['prediction'] for r in labelled) / len(labelled)
+            print(f"\nSubject-level accuracy: {accuracy:.2%} over {len(labelled)} volumes")
+        print(f"Predictions written to {output}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict on NIfTI volumes / DICOM series, or write synthetic ones")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    synth = subparsers.add_parser('synth', help="Build test volumes from 2D training slices")
+    synth.add_argument('--out', default=os.path.join('cache', 'synthetic_volumes'))
+    synth.add_argument('--data-dir', default='train')
+    synth.add_argument('--per-class', type=int, default=2)
+    synth.add_argument('--depth', type=int, default=48)
+
+    predict = subparsers.add_parser('predict', help="Per-subject predictions for volumes under the given paths")
+    predict.add_argument('paths', nargs='+')
+    predict.add_argument('--model', default='efficientnet', choices=list(MODEL_SPECS))
+    predict.add_argument('--slices', type=int, default=DEFAULT_SLICES)
+    predict.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    predict.add_argument('--output', default=REPORT_PATH)
+
+    args = parser.parse_args()
+    if args.command == 'synth':
+        synthesize(args.out, args.data_dir, args.per_class, args.depth)
+    else:
+        predict_paths(args.paths, args.model, args.slices, args.batch_size, args.output)
+
+
+if __name__ == '__main__':
+    main()
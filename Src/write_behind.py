@@ -0,0 +1,111 @@
+"""
+Write-behind SQLite writer shared by the audit log and the analysis history.
+Requests only enqueue rows; one background thread per database drains the
+queue every flush interval and writes batches in single transactions, so
+requests never wait for SQLite's write lock. The database runs in WAL mode,
+so readers are not blocked by the writer. A batch whose transaction fails is
+kept and written first by the next flush instead of being dropped.
+"""
+
+import atexit
+import queue
+import sqlite3
+import threading
+
+from metrics import DB_OPERATION_SECONDS, observe_seconds
+
+FLUSH_INTERVAL = 1.0  # seconds between flushes when the queue is not full
+BATCH_SIZE = 500
+
+
+class WriteBehindWriter:
+    """Queue of rows drained into SQLite in batched transactions by one background thread.
+
+    Subclasses set `schema`, `name` (thread name and log prefix) and `operation`
+    (DB_OPERATION_SECONDS label), and implement `_write_batch(conn, rows)`.
+    """
+
+    schema = ''
+    name = 'write'
+    operation = 'write_flush'
+
+    def __init__(self, db_path, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.SimpleQueue()
+        self._failed = []  # rows of a batch whose transaction was rolled back
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        conn = sqlite3.connect(db_path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(self.schema)
+        conn.close()
+
+        self._thread = threading.Thread(target=self._run, name=f'{self.name}-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _write_batch(self, conn, rows):
+        raise NotImplementedError
+
+    def _next_batch(self):
+        rows, self._failed = self._failed, []
+        while len(rows) < self.batch_size:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def flush(self):
+        """Write every queued row; returns how many were written.
+
+        Raises sqlite3.Error when a batch fails; its rows are kept for the next flush.
+        """
+        written = 0
+        with self._flush_lock:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                while rows := self._next_batch():
+                    try:
+                        with observe_seconds(DB_OPERATION_SECONDS.labels(self.operation)), conn:
+                            self._write_batch(conn, rows)
+                    except sqlite3.Error:
+                        self._failed = rows
+                        raise
+                    written += len(rows)
+            finally:
+                conn.close()
+        return written
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"❌ {self.name.capitalize()} flush failed, {len(self._failed)} rows kept for retry: {e}")
+
+    def close(self):
+        """Stop the writer and flush what is left."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            print(f"❌ {self.name.capitalize()} rows not written at shutdown "
+                  f"({len(self._failed) + self._queue.qsize()}): {e}")
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(cls, db_path):
+    """Process-wide writer of a given class for a database (one writer thread per file)."""
+    with _writers_lock:
+        if (cls, db_path) not in _writers:
+            _writers[(cls, db_path)] = cls(db_path)
+        return _writers[(cls, db_path)]